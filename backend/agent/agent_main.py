@@ -11,9 +11,9 @@ from tool.agent_talk import AgentTalker
 
 
 async def main():
-    config = await basic_tool.load_config()
+    # 配置由 config_service 缓存，文件变化后自动重新加载
+    config = await basic_tool.get_config()
     print("Config loaded:", config)
-    # TODO: 每次调用模型的时候load config
 
 
 if __name__ == "__main__":
@@ -1,18 +1,40 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, MutableMapping, Sequence
+from typing import Any, Dict, List, MutableMapping, Optional, Sequence
 
 from .base import BaseTool, ToolError, ToolResult
+from .cache import ScanCache
 from .nmap import NmapTool
+from .process import ManagedProcess, ProcessUsage
+from .progress import ToolProgress, progress_reporter, report_progress
+from .resolver import DnsResolver, get_resolver
+from .result_store import FetchResultTool, ResultStore, get_result_store
 """工具列表"""
 
 
+CONTEXT_CHAR_LIMIT = 4000  # 工具结果进入模型上下文的字符预算
+
+
 
 class Tools:
     """工具容器，集中注册与调度可用工具"""
 
-    def __init__(self, *tools: BaseTool) -> None:
+    def __init__(
+        self,
+        *tools: BaseTool,
+        result_store: Optional[ResultStore] = None,
+        context_limit: int = CONTEXT_CHAR_LIMIT,
+    ) -> None:
+        """
+        Args:
+            tools: 要注册的工具实例。
+            result_store: 保存完整结果的旁路存储，未提供时使用进程内共享的默认存储。
+            context_limit: 工具结果视图的字符预算。
+        """
         self._tools: MutableMapping[str, BaseTool] = {}
+        self._openai_tools: Optional[List[Dict[str, Any]]] = None  # as_openai_tools 的缓存
+        self._result_store = result_store if result_store is not None else get_result_store()
+        self._context_limit = context_limit
         for tool in tools:
             self.register(tool)
 
@@ -21,6 +43,7 @@ class Tools:
         if tool.name in self._tools:
             raise ValueError(f"工具 {tool.name} 已被注册")
         self._tools[tool.name] = tool
+        self._openai_tools = None
 
     def has_tools(self) -> bool:
         """判断当前容器是否至少拥有一个可用工具。"""
@@ -33,15 +56,30 @@ class Tools:
         return self._tools[name]
 
     async def run(self, name: str, arguments: Dict[str, Any]) -> ToolResult:
-        """执行指定工具，并返回统一的 ToolResult。"""
+        """
+        执行指定工具，返回 content 为上下文视图的 ToolResult：视图与原始内容不同时，
+        完整内容存入结果存储，句柄写入 metadata["result_handle"] 并附在视图末尾。
+        """
         tool = self.get(name)
-        return await tool.run(**arguments)
+        result = await tool.run(**arguments)
+        view = tool.context_view(result, limit=self._context_limit)
+        if view == result.content:
+            return result
+        handle = self._result_store.put(result.name, result.content)
+        hint = f"result_handle={handle}"
+        if FetchResultTool.name in self._tools:
+            hint += "，需要完整数据时调用 fetch_result"
+        return ToolResult(
+            name=result.name,
+            content=f"{view}\n（精简视图，完整结果 {hint}）",
+            metadata={**(result.metadata or {}), "result_handle": handle},
+            data=result.data,
+        )
 
     def as_openai_tools(self) -> List[Dict[str, Any]]:
-        """把容器内工具转换为 OpenAI 函数调用所需的描述。"""
-        payload: List[Dict[str, Any]] = []
-        for tool in self._tools.values():
-            payload.append(
+        """把容器内工具转换为 OpenAI 函数调用所需的描述（结果被缓存共享，调用方不要修改）。"""
+        if self._openai_tools is None:
+            self._openai_tools = [
                 {
                     "type": "function",
                     "function": {
@@ -50,13 +88,19 @@ class Tools:
                         "parameters": tool.parameters,
                     },
                 }
-            )
-        return payload
+                for tool in self._tools.values()
+            ]
+        return self._openai_tools
 
     @classmethod
     def merge(cls, tool_sets: Sequence["Tools"]) -> "Tools":
         """把多个工具容器合并为一个新的容器。"""
-        merged = cls()
+        first = tool_sets[0] if tool_sets else None
+        merged = (
+            cls(result_store=first._result_store, context_limit=first._context_limit)
+            if first is not None
+            else cls()
+        )
         for tool_set in tool_sets:
             for name, tool in tool_set._tools.items():
                 if name in merged._tools:
@@ -75,5 +119,15 @@ __all__ = [
     "ToolResult",
     "Tools",
     "NmapTool",
+    "ScanCache",
+    "FetchResultTool",
+    "ResultStore",
+    "DnsResolver",
+    "get_resolver",
+    "ManagedProcess",
+    "ProcessUsage",
+    "ToolProgress",
+    "progress_reporter",
+    "report_progress",
 ]
 
@@ -17,6 +17,7 @@ class ToolResult:
     name: str
     content: str
     metadata: Optional[Dict[str, Any]] = None
+    data: Optional[Any] = None  # 结构化结果对象，供下游代码直接使用，不进入对话消息
 
     def to_chat_message_payload(self) -> Dict[str, Any]:
         """把工具结果转换为 ChatMessage 的格式"""
@@ -40,4 +41,10 @@ class BaseTool:
     async def run(self, **kwargs: Any) -> ToolResult:  # pragma: no cover - 接口定义
         raise NotImplementedError
 
+    def context_view(self, result: ToolResult, *, limit: int) -> str:
+        """返回放入模型上下文的结果视图，默认超过 limit 个字符时截断；子类可渲染更紧凑的格式。"""
+        if len(result.content) <= limit:
+            return result.content
+        return result.content[:limit] + "…（已截断）"
+
 
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+"""工具结果缓存：内存 LRU + 可选 SQLite 持久层，按模式设置过期时间"""
+
+
+DEFAULT_MODE_TTLS: Dict[str, float] = {
+    "host_discovery": 300.0,
+    "fast_scan": 900.0,
+    "top_ports": 900.0,
+    "service_version": 1800.0,
+    "os_detection": 3600.0,
+    "full_scan": 3600.0,
+}
+
+
+@dataclass
+class CacheEntry:
+    """一条缓存记录，value 必须可被 JSON 序列化。"""
+
+    key: str
+    value: Dict[str, Any]
+    stored_at: float
+    expires_at: float
+
+    def age(self, now: Optional[float] = None) -> float:
+        return max(0.0, (now if now is not None else time.time()) - self.stored_at)
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.time()) >= self.expires_at
+
+
+class ScanCache:
+    """以请求内容哈希为键的两级缓存，内存层 LRU 淘汰，磁盘层可跨会话复用。"""
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 512,
+        ttls: Optional[Mapping[str, float]] = None,
+        default_ttl: float = 600.0,
+        db_path: Optional[str | Path] = None,
+    ) -> None:
+        """
+        Args:
+            max_entries: 内存层最多保留的条目数，超出后淘汰最久未使用的条目。
+            ttls: 按模式覆盖的过期时间（秒），未配置的模式使用 DEFAULT_MODE_TTLS。
+            default_ttl: 未知模式的默认过期时间（秒）。
+            db_path: SQLite 文件路径，提供时启用磁盘层。
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries 必须大于 0")
+        self._max_entries = max_entries
+        self._ttls: Dict[str, float] = {**DEFAULT_MODE_TTLS, **(ttls or {})}
+        self._default_ttl = default_ttl
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path is not None:
+            self._db = self._open_db(Path(db_path))
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """把请求参数规范化后做哈希，得到内容寻址的缓存键。"""
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, mode: str) -> float:
+        return self._ttls.get(mode, self._default_ttl)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        """读取未过期的缓存，内存未命中时回落到磁盘层。"""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if not entry.expired(now):
+                self._memory.move_to_end(key)
+                return entry
+            del self._memory[key]
+
+        if self._db is None:
+            return None
+        entry = await asyncio.to_thread(self._db_get, key, now)
+        if entry is not None:
+            self._remember(entry)
+        return entry
+
+    async def set(self, key: str, value: Dict[str, Any], *, mode: str) -> CacheEntry:
+        now = time.time()
+        entry = CacheEntry(
+            key=key, value=value, stored_at=now, expires_at=now + self.ttl_for(mode)
+        )
+        self._remember(entry)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, entry)
+        return entry
+
+    async def invalidate(self, key: str) -> None:
+        self._memory.pop(key, None)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_delete, key)
+
+    async def clear(self) -> None:
+        self._memory.clear()
+        if self._db is not None:
+            await asyncio.to_thread(self._db_clear)
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, entry: CacheEntry) -> None:
+        self._memory[entry.key] = entry
+        self._memory.move_to_end(entry.key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    # ---- SQLite 磁盘层（在线程中执行，避免阻塞事件循环） ----
+    def _open_db(self, path: Path) -> sqlite3.Connection:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS scan_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+        return conn
+
+    def _db_get(self, key: str, now: float) -> Optional[CacheEntry]:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT value, stored_at, expires_at FROM scan_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] <= now:
+                self._db.execute("DELETE FROM scan_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+        return CacheEntry(
+            key=key, value=json.loads(row[0]), stored_at=row[1], expires_at=row[2]
+        )
+
+    def _db_set(self, entry: CacheEntry) -> None:
+        serialized = json.dumps(entry.value, ensure_ascii=False)
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO scan_cache (key, value, stored_at, expires_at)"
+                " VALUES (?, ?, ?, ?)",
+                (entry.key, serialized, entry.stored_at, entry.expires_at),
+            )
+            self._db.execute(
+                "DELETE FROM scan_cache WHERE expires_at <= ?", (entry.stored_at,)
+            )
+            self._db.commit()
+
+    def _db_delete(self, key: str) -> None:
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute("DELETE FROM scan_cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _db_clear(self) -> None:
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute("DELETE FROM scan_cache")
+            self._db.commit()
@@ -1,5 +1,28 @@
+from .connect_scan import ConnectProber, get_connect_prober
+from .inventory import (
+    HostInventory,
+    InventoryDelta,
+    InventoryHost,
+    InventoryPort,
+    inventory_scope,
+)
+from .parse_pool import ParsePool, configure_parse_pool, get_parse_pool
+from .result import HostRecord, PortRecord, ScanResult
 from .tool import NmapTool
 
-__all__ = ["NmapTool"]
-
-
+__all__ = [
+    "NmapTool",
+    "ConnectProber",
+    "get_connect_prober",
+    "HostRecord",
+    "PortRecord",
+    "ScanResult",
+    "HostInventory",
+    "InventoryDelta",
+    "InventoryHost",
+    "InventoryPort",
+    "inventory_scope",
+    "ParsePool",
+    "configure_parse_pool",
+    "get_parse_pool",
+]
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import asyncio
+import errno
+import ipaddress
+import resource
+import socket
+import struct
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ... import telemetry
+from ..base import ToolError
+from ..resolver import DnsResolver, get_resolver
+from .result import HostRecord, PortRecord
+from .scheduler import expand_targets
+
+"""进程内的 asyncio TCP connect 扫描：小端口集合与主机发现的快速路径，免去启动 nmap 的固定开销"""
+
+
+# nmap-services 中按出现频率排序的前 100 个 TCP 端口（即 nmap -F / --top-ports 100）及服务名
+TOP_TCP_PORTS: Tuple[Tuple[int, str], ...] = (
+    (80, "http"), (23, "telnet"), (443, "https"), (21, "ftp"), (22, "ssh"),
+    (25, "smtp"), (3389, "ms-wbt-server"), (110, "pop3"), (445, "microsoft-ds"),
+    (139, "netbios-ssn"), (143, "imap"), (53, "domain"), (135, "msrpc"),
+    (3306, "mysql"), (8080, "http-proxy"), (1723, "pptp"), (111, "rpcbind"),
+    (995, "pop3s"), (993, "imaps"), (5900, "vnc"), (1025, "NFS-or-IIS"),
+    (587, "submission"), (8888, "sun-answerbook"), (199, "smux"), (1720, "h323q931"),
+    (465, "smtps"), (548, "afp"), (113, "ident"), (81, "hosts2-ns"), (6001, "X11:1"),
+    (10000, "snet-sensor-mgmt"), (514, "shell"), (5060, "sip"), (179, "bgp"),
+    (1026, "LSA-or-nterm"), (2000, "cisco-sccp"), (8443, "https-alt"),
+    (8000, "http-alt"), (32768, "filenet-tms"), (554, "rtsp"), (26, "rsftp"),
+    (1433, "ms-sql-s"), (49152, "unknown"), (2001, "dc"), (515, "printer"),
+    (8008, "http"), (49154, "unknown"), (1027, "IIS"), (5666, "nrpe"), (646, "ldp"),
+    (5000, "upnp"), (5631, "pcanywheredata"), (631, "ipp"), (49153, "unknown"),
+    (8081, "blackice-icecap"), (2049, "nfs"), (88, "kerberos-sec"), (79, "finger"),
+    (5800, "vnc-http"), (106, "pop3pw"), (2121, "ccproxy-ftp"), (1110, "nfsd-status"),
+    (49155, "unknown"), (6000, "X11"), (513, "login"), (990, "ftps"),
+    (5357, "wsdapi"), (427, "svrloc"), (49156, "unknown"), (543, "klogin"),
+    (544, "kshell"), (5101, "admdog"), (144, "news"), (7, "echo"), (389, "ldap"),
+    (8009, "ajp13"), (3128, "squid-http"), (444, "snpp"), (9999, "abyss"),
+    (5009, "airport-admin"), (7070, "realserver"), (5190, "aol"), (3000, "ppp"),
+    (5432, "postgresql"), (1900, "upnp"), (3986, "mapper-ws_ethd"), (13, "daytime"),
+    (1029, "ms-lsa"), (9, "discard"), (5051, "ida-agent"), (6646, "unknown"),
+    (49157, "unknown"), (1028, "unknown"), (873, "rsync"), (1755, "wms"),
+    (2717, "pn-requester"), (4899, "radmin"), (9100, "jetdirect"), (119, "nntp"),
+    (37, "time"),
+)
+SERVICE_NAMES: Dict[int, str] = dict(TOP_TCP_PORTS)
+
+# 主机发现时依次尝试的端口：任意一个连接成功或被拒绝（RST）都说明主机在线
+DISCOVERY_PORTS: Tuple[int, ...] = (443, 80, 22, 445, 3389)
+
+DEFAULT_MAX_SOCKETS = 512  # 进程内同时打开的探测 socket 上限
+DEFAULT_HOST_CONCURRENCY = 32  # 单个主机同时进行的连接数
+DEFAULT_INITIAL_TIMEOUT = 1.0  # 尚无 RTT 样本时的连接超时（秒）
+MIN_TIMEOUT = 0.1
+MAX_TIMEOUT = 3.0
+FD_RESERVE = 128  # 为其他用途保留的文件描述符数
+
+CONNECT_SCAN_SECONDS = telemetry.registry.histogram(
+    "connect_scan_seconds", "进程内 TCP connect 扫描单个目标的耗时", ("mode", "outcome")
+)
+
+
+class RttEstimator:
+    """按 RFC 6298 维护平滑 RTT，超时取 srtt + 4 * rttvar 并限定在 [MIN_TIMEOUT, MAX_TIMEOUT]。"""
+
+    def __init__(self, initial_timeout: float = DEFAULT_INITIAL_TIMEOUT) -> None:
+        self._initial = initial_timeout
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+
+    def observe(self, rtt: float) -> None:
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+            return
+        self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+        self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    @property
+    def timeout(self) -> float:
+        if self.srtt is None:
+            return self._initial
+        return min(MAX_TIMEOUT, max(MIN_TIMEOUT, self.srtt + 4 * self.rttvar))
+
+
+def top_tcp_ports(count: int) -> List[int]:
+    """按频率取前 count 个 TCP 端口，超出内置列表时抛出 ValueError。"""
+    if count < 1 or count > len(TOP_TCP_PORTS):
+        raise ValueError(f"count 必须在 1 到 {len(TOP_TCP_PORTS)} 之间")
+    return [port for port, _ in TOP_TCP_PORTS[:count]]
+
+
+class ConnectProber:
+    """
+    asyncio TCP connect 扫描器。同一实例的所有扫描共享一个 socket 并发配额，
+    每个主机单独维护 RTT 估计，连接超时随已观测到的往返时间自适应收紧。
+    """
+
+    def __init__(
+        self,
+        *,
+        max_sockets: int = DEFAULT_MAX_SOCKETS,
+        host_concurrency: int = DEFAULT_HOST_CONCURRENCY,
+        initial_timeout: float = DEFAULT_INITIAL_TIMEOUT,
+        retries: int = 1,
+        resolver: Optional[DnsResolver] = None,
+    ) -> None:
+        """
+        Args:
+            max_sockets: 同时打开的 socket 上限，会再受进程文件描述符上限约束。
+            host_concurrency: 单个主机同时进行的连接数。
+            initial_timeout: 主机尚无 RTT 样本时的连接超时（秒）。
+            retries: 主机有响应时，对超时端口的重试次数（应对丢包）。
+            resolver: 域名目标的解析器，未提供时使用进程内共享的解析器。
+        """
+        if max_sockets < 1 or host_concurrency < 1:
+            raise ValueError("max_sockets 与 host_concurrency 必须大于 0")
+        self._max_sockets = min(max_sockets, _fd_budget())
+        self._host_concurrency = host_concurrency
+        self._initial_timeout = initial_timeout
+        self._retries = max(0, retries)
+        self._sockets = asyncio.Semaphore(self._max_sockets)
+        self._resolver = resolver if resolver is not None else get_resolver()
+
+    @property
+    def max_sockets(self) -> int:
+        return self._max_sockets
+
+    async def scan(self, target: str, *, mode: str, ports: Sequence[int]) -> List[HostRecord]:
+        """
+        扫描单个目标（IP、主机名或 CIDR），返回与 nmap 解析结果相同结构的主机记录。
+        mode 为 host_discovery 时只判断存活，不记录端口；其余模式只记录开放端口。
+        """
+        with telemetry.span("connect_scan", CONNECT_SCAN_SECONDS, mode=mode):
+            hosts = await self._resolve(target)
+            discovery = mode == "host_discovery"
+            probes = [
+                self._discover(ip, names)
+                if discovery
+                else self._probe_host(ip, names, ports)
+                for ip, names in hosts
+            ]
+            return list(await asyncio.gather(*probes))
+
+    async def _resolve(self, target: str) -> List[Tuple[str, List[str]]]:
+        """把目标展开为 (IP, 主机名列表)；主机名只取第一个地址，与 nmap 行为一致。"""
+        if "/" in target:
+            return [(ip, []) for ip in expand_targets([target])]
+        try:
+            return [(str(ipaddress.ip_address(target)), [])]
+        except ValueError:
+            pass
+        # 只取 IPv4 地址，与 nmap 默认只扫描 IPv4 一致；结果走共享的 DNS 缓存
+        addresses = await self._resolver.resolve(target, family=socket.AF_INET)
+        return [(addresses[0], [target])]
+
+    async def _discover(self, ip: str, names: List[str]) -> HostRecord:
+        rtt = RttEstimator(self._initial_timeout)
+        tasks = [
+            asyncio.create_task(self._connect(ip, port, rtt)) for port in DISCOVERY_PORTS
+        ]
+        alive = False
+        try:
+            for finished in asyncio.as_completed(tasks):
+                if await finished in ("open", "closed"):
+                    alive = True
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return HostRecord(ip=ip, alive=alive, hostnames=list(names))
+
+    async def _probe_host(
+        self, ip: str, names: List[str], ports: Sequence[int]
+    ) -> HostRecord:
+        rtt = RttEstimator(self._initial_timeout)
+        states: Dict[int, str] = {}
+        slots = asyncio.Semaphore(self._host_concurrency)
+
+        async def _probe(port: int) -> None:
+            async with slots:
+                states[port] = await self._connect(ip, port, rtt)
+
+        pending = list(ports)
+        for attempt in range(self._retries + 1):
+            await asyncio.gather(*(_probe(port) for port in pending))
+            # 主机没有任何响应时重试没有意义；有响应时超时多半是丢包，按收敛后的超时再试
+            if rtt.srtt is None:
+                break
+            pending = [port for port in pending if states[port] == "timeout"]
+            if not pending:
+                break
+
+        responded = any(state in ("open", "closed") for state in states.values())
+        return HostRecord(
+            ip=ip,
+            alive=responded,
+            hostnames=list(names),
+            ports=[
+                PortRecord(port=port, state="open", service=SERVICE_NAMES.get(port))
+                for port in sorted(states)
+                if states[port] == "open"
+            ],
+        )
+
+    async def _connect(self, ip: str, port: int, rtt: RttEstimator) -> str:
+        """尝试一次连接，返回 open/closed/filtered/timeout，并把 RTT 样本计入估计器。"""
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        loop = asyncio.get_running_loop()
+        async with self._sockets:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), rtt.timeout)
+            except asyncio.TimeoutError:
+                return "timeout"
+            except ConnectionRefusedError:
+                rtt.observe(time.perf_counter() - started)
+                return "closed"
+            except OSError as exc:
+                if exc.errno in (errno.EMFILE, errno.ENFILE):
+                    raise ToolError(f"文件描述符耗尽，无法继续探测：{exc}") from exc
+                # 不可达等其他错误都说明没有拿到目标的 SYN/ACK 或 RST
+                return "filtered"
+            else:
+                rtt.observe(time.perf_counter() - started)
+                # SO_LINGER=0：关闭时直接发送 RST，不在本机留下 TIME_WAIT
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                return "open"
+            finally:
+                sock.close()
+
+
+def _fd_budget() -> int:
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return DEFAULT_MAX_SOCKETS
+    return max(1, soft - FD_RESERVE)
+
+
+_default_prober: Optional[ConnectProber] = None
+
+
+def get_connect_prober() -> ConnectProber:
+    """进程内共享的默认扫描器，所有 NmapTool 实例共用同一个 socket 配额。"""
+    global _default_prober
+    if _default_prober is None:
+        _default_prober = ConnectProber()
+    return _default_prober
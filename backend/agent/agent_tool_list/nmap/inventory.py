@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .result import HostRecord, PortRecord, ScanResult
+
+"""主机清单：跨模式、跨多次扫描按 IP/端口合并结果，支持只对增量端口做后续探测"""
+
+
+@dataclass(slots=True)
+class InventoryPort:
+    """清单中的单个端口，记录最新状态与各模式累积得到的服务信息。"""
+
+    port: int
+    protocol: str = "tcp"
+    state: str = "open"
+    service: Optional[str] = None
+    version: Optional[str] = None
+    modes: Set[str] = field(default_factory=set)  # 探测过该端口的扫描模式
+    first_seen: float = 0.0
+    last_seen: float = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == "open"
+
+    def merge(self, record: PortRecord, *, mode: str, now: float) -> None:
+        """合并一次扫描记录：状态以最新为准，服务/版本只在新结果给出时覆盖。"""
+        self.state = record.state
+        if record.service:
+            self.service = record.service
+        if record.version:
+            self.version = record.version
+        self.modes.add(mode)
+        self.last_seen = now
+
+    def to_record(self) -> PortRecord:
+        return PortRecord(
+            port=self.port,
+            protocol=self.protocol,
+            state=self.state,
+            service=self.service,
+            version=self.version,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "port": self.port,
+            "protocol": self.protocol,
+            "state": self.state,
+            "service": self.service,
+            "version": self.version,
+            "modes": sorted(self.modes),
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "InventoryPort":
+        return cls(
+            port=int(data["port"]),
+            protocol=data.get("protocol", "tcp"),
+            state=data.get("state", "open"),
+            service=data.get("service"),
+            version=data.get("version"),
+            modes=set(data.get("modes") or ()),
+            first_seen=float(data.get("first_seen", 0.0)),
+            last_seen=float(data.get("last_seen", 0.0)),
+        )
+
+
+@dataclass(slots=True)
+class InventoryHost:
+    """清单中的单个主机，端口按 (port, protocol) 建立索引。"""
+
+    ip: str
+    alive: bool = False
+    hostnames: List[str] = field(default_factory=list)
+    ports: Dict[Tuple[int, str], InventoryPort] = field(default_factory=dict)
+    modes: Set[str] = field(default_factory=set)
+    first_seen: float = 0.0
+    last_seen: float = 0.0
+
+    def open_ports(self, protocol: Optional[str] = None) -> List[int]:
+        return sorted(
+            item.port
+            for item in self.ports.values()
+            if item.is_open and (protocol is None or item.protocol == protocol)
+        )
+
+    def to_record(self) -> HostRecord:
+        return HostRecord(
+            ip=self.ip,
+            alive=self.alive,
+            hostnames=list(self.hostnames),
+            ports=[
+                item.to_record()
+                for _, item in sorted(self.ports.items())
+            ],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ip": self.ip,
+            "alive": self.alive,
+            "hostnames": list(self.hostnames),
+            "ports": [item.to_dict() for _, item in sorted(self.ports.items())],
+            "modes": sorted(self.modes),
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "InventoryHost":
+        host = cls(
+            ip=data["ip"],
+            alive=bool(data.get("alive", False)),
+            hostnames=list(data.get("hostnames") or []),
+            modes=set(data.get("modes") or ()),
+            first_seen=float(data.get("first_seen", 0.0)),
+            last_seen=float(data.get("last_seen", 0.0)),
+        )
+        for item in data.get("ports") or []:
+            port = InventoryPort.from_dict(item)
+            host.ports[(port.port, port.protocol)] = port
+        return host
+
+
+@dataclass
+class InventoryDelta:
+    """一次合并带来的变化：新主机、新开放端口、已关闭的端口（按 IP 分组）。"""
+
+    new_hosts: List[str] = field(default_factory=list)
+    opened: Dict[str, List[int]] = field(default_factory=dict)
+    closed: Dict[str, List[int]] = field(default_factory=dict)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.new_hosts or self.opened or self.closed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "new_hosts": list(self.new_hosts),
+            "opened": {ip: list(ports) for ip, ports in self.opened.items()},
+            "closed": {ip: list(ports) for ip, ports in self.closed.items()},
+        }
+
+
+class HostInventory:
+    """
+    按 IP -> (port, protocol) 索引的主机清单。扫描结果不断合并进来，
+    同时记录扫描目标（域名/IP）到 IP 的映射，便于后续按目标查询增量端口。
+    """
+
+    def __init__(self) -> None:
+        self._hosts: Dict[str, InventoryHost] = {}
+        self._targets: Dict[str, Set[str]] = {}  # 扫描目标（小写） -> IP 集合
+        self._names: Dict[str, Set[str]] = {}  # 主机名（小写） -> IP 集合，随 merge 更新
+
+    def __len__(self) -> int:
+        return len(self._hosts)
+
+    def __iter__(self) -> Iterator[InventoryHost]:
+        return iter(self._hosts.values())
+
+    def __contains__(self, ip: object) -> bool:
+        return ip in self._hosts
+
+    def get(self, ip: str) -> Optional[InventoryHost]:
+        return self._hosts.get(ip)
+
+    def hosts_for(self, target: str) -> List[InventoryHost]:
+        """返回某个扫描目标（IP、域名或扫描时使用的目标串）对应的已知主机。"""
+        key = target.lower()
+        ips = self._targets.get(key, set()) | self._names.get(key, set())
+        if target in self._hosts:
+            ips.add(target)
+        return [self._hosts[ip] for ip in sorted(ips)]
+
+    def merge(self, result: ScanResult, *, now: Optional[float] = None) -> InventoryDelta:
+        """把一次扫描结果合并进清单，返回本次带来的变化。"""
+        now = time.time() if now is None else now
+        delta = InventoryDelta()
+        for host in result.hosts:
+            current = self._hosts.get(host.ip)
+            if current is None:
+                current = InventoryHost(ip=host.ip, first_seen=now)
+                self._hosts[host.ip] = current
+                delta.new_hosts.append(host.ip)
+            current.alive = host.alive or bool(host.open_ports())
+            for name in host.hostnames:
+                if name not in current.hostnames:
+                    current.hostnames.append(name)
+                    self._names.setdefault(name.lower(), set()).add(host.ip)
+            current.modes.add(result.mode)
+            current.last_seen = now
+
+            for record in host.ports:
+                key = (record.port, record.protocol)
+                port = current.ports.get(key)
+                was_open = port is not None and port.is_open
+                if port is None:
+                    port = InventoryPort(
+                        port=record.port, protocol=record.protocol, first_seen=now
+                    )
+                    current.ports[key] = port
+                port.merge(record, mode=result.mode, now=now)
+                if port.is_open and not was_open:
+                    delta.opened.setdefault(host.ip, []).append(record.port)
+                elif was_open and not port.is_open:
+                    delta.closed.setdefault(host.ip, []).append(record.port)
+
+            for target in result.targets:
+                self._targets.setdefault(target.lower(), set()).add(host.ip)
+        return delta
+
+    def ports_without(self, target: str, mode: str) -> Optional[List[int]]:
+        """
+        返回目标已知的开放 TCP 端口中尚未被 mode 探测过的端口（升序）。
+        清单中没有该目标的端口信息时返回 None，表示需要完整扫描。
+        """
+        hosts = self.hosts_for(target)
+        if not any(host.ports for host in hosts):
+            return None
+        pending: Set[int] = set()
+        for host in hosts:
+            for item in host.ports.values():
+                if item.is_open and item.protocol == "tcp" and mode not in item.modes:
+                    pending.add(item.port)
+        return sorted(pending)
+
+    def known_ports(self, target: str, mode: str) -> Dict[str, List[int]]:
+        """返回目标中已被 mode 探测过的开放端口，按 IP 分组。"""
+        known: Dict[str, List[int]] = {}
+        for host in self.hosts_for(target):
+            ports = sorted(
+                item.port
+                for item in host.ports.values()
+                if item.is_open and mode in item.modes
+            )
+            if ports:
+                known[host.ip] = ports
+        return known
+
+    def to_scan_result(self, target: Optional[str] = None, *, mode: str = "inventory") -> ScanResult:
+        """把清单（或其中某个目标）导出为 ScanResult。"""
+        hosts = self.hosts_for(target) if target is not None else list(self._hosts.values())
+        return ScanResult(
+            mode=mode,
+            targets=[target] if target is not None else [],
+            hosts=[host.to_record() for host in hosts],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "hosts": [host.to_dict() for host in self._hosts.values()],
+            "targets": {key: sorted(ips) for key, ips in self._targets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HostInventory":
+        inventory = cls()
+        for item in data.get("hosts") or []:
+            host = InventoryHost.from_dict(item)
+            inventory._hosts[host.ip] = host
+            for name in host.hostnames:
+                inventory._names.setdefault(name.lower(), set()).add(host.ip)
+        for key, ips in (data.get("targets") or {}).items():
+            inventory._targets[key] = set(ips)
+        return inventory
+
+
+_scoped_inventory: ContextVar[Optional[HostInventory]] = ContextVar(
+    "nmap_scoped_inventory", default=None
+)
+
+
+@contextmanager
+def inventory_scope(inventory: HostInventory) -> Iterator[HostInventory]:
+    """
+    在当前上下文（及之后创建的子任务）中让 NmapTool 使用指定的主机清单，
+    使共享同一工具实例的不同会话、任务各自维护清单，互不影响增量探测。
+    """
+    token = _scoped_inventory.set(inventory)
+    try:
+        yield inventory
+    finally:
+        _scoped_inventory.reset(token)
+
+
+def scoped_inventory() -> Optional[HostInventory]:
+    """当前上下文指定的主机清单，未指定时为 None。"""
+    return _scoped_inventory.get()
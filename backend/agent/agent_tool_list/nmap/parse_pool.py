@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from .parser import NmapStreamParser
+from .result import HostRecord
+
+"""nmap XML 解析卸载：超过阈值的输出分片交给线程池解析，避免阻塞事件循环"""
+
+
+# 小于该字节数的数据直接在事件循环中解析。expat 解析时不释放 GIL，线程池没有并行收益，
+# 因此阈值远高于 NmapTool 每次读取的分片（16 KiB，解析约 2-3ms），只有调用方一次喂入大块数据时才卸载
+DEFAULT_INLINE_THRESHOLD = 256 * 1024
+
+
+class ParsePool:
+    """
+    解析卸载池。增量解析的 NmapStreamParser 带有状态，只能在同一进程的线程池中续喂，
+    因此只提供线程池；执行器在首次使用时才创建。
+    """
+
+    def __init__(
+        self,
+        *,
+        max_workers: Optional[int] = None,
+        inline_threshold: int = DEFAULT_INLINE_THRESHOLD,
+    ) -> None:
+        """
+        Args:
+            max_workers: 线程池的最大线程数，None 使用标准库默认值。
+            inline_threshold: 数据量（字节）低于该值时直接在事件循环中解析，0 表示总是卸载。
+        """
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers 必须大于 0")
+        if inline_threshold < 0:
+            raise ValueError("inline_threshold 不能为负数")
+        self._max_workers = max_workers
+        self._inline_threshold = inline_threshold
+        self._lock = threading.Lock()
+        self._threads: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def inline_threshold(self) -> int:
+        return self._inline_threshold
+
+    def should_offload(self, size: int) -> bool:
+        return size >= self._inline_threshold
+
+    async def feed(self, parser: NmapStreamParser, data: bytes | str) -> List[HostRecord]:
+        """向增量解析器喂入一段输出，数据较大时在线程池中执行；直接解析后让出一次事件循环。"""
+        if not self.should_offload(len(data)):
+            hosts = parser.feed(data)
+            # 输出已在缓冲区时读取不会挂起，连续的分片会一直占住事件循环
+            await asyncio.sleep(0)
+            return hosts
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._thread_pool(), parser.feed, data)
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        """关闭已创建的线程池，之后再次使用会重新创建。"""
+        with self._lock:
+            threads, self._threads = self._threads, None
+        if threads is not None:
+            threads.shutdown(wait=wait)
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="nmap-parse"
+                )
+            return self._threads
+
+
+_default_pool: Optional[ParsePool] = None
+
+
+def get_parse_pool() -> ParsePool:
+    """获取进程内共享的默认解析池。"""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = ParsePool()
+    return _default_pool
+
+
+def configure_parse_pool(
+    *,
+    max_workers: Optional[int] = None,
+    inline_threshold: int = DEFAULT_INLINE_THRESHOLD,
+) -> ParsePool:
+    """替换默认解析池（关闭旧池），只影响之后创建的 NmapTool。"""
+    global _default_pool
+    pool = ParsePool(max_workers=max_workers, inline_threshold=inline_threshold)
+    if _default_pool is not None:
+        _default_pool.shutdown(wait=False)
+    _default_pool = pool
+    return pool
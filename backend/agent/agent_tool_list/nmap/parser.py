@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional
+
+from .result import HostRecord, PortRecord
+
+"""nmap XML 增量解析"""
+
+
+class NmapStreamParser:
+    """
+    增量解析 nmap XML，每当一个 <host> 闭合即产出主机记录并释放其元素；
+    --stats-every 输出的 <taskprogress>/<taskend> 进度暂存起来，由 pop_progress 取走。
+    """
+
+    def __init__(self) -> None:
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root: Optional[ET.Element] = None
+        self._depth = 0
+        self._broken = False
+        self._progress: List[Dict[str, Any]] = []
+
+    @property
+    def broken(self) -> bool:
+        """XML 是否已出现格式错误（之后的数据会被忽略）。"""
+        return self._broken
+
+    def pop_progress(self) -> List[Dict[str, Any]]:
+        """取走自上次调用以来解析到的进度记录（task/percent/remaining/etc）。"""
+        progress, self._progress = self._progress, []
+        return progress
+
+    def feed(self, data: bytes | str) -> List[HostRecord]:
+        """喂入一段输出，返回本段内闭合的主机记录。"""
+        if self._broken:
+            return []
+        try:
+            self._parser.feed(data)
+        except ET.ParseError:
+            self._broken = True
+        return self._drain()
+
+    def close(self) -> List[HostRecord]:
+        """输出结束时调用，返回剩余的主机记录。"""
+        if not self._broken:
+            try:
+                self._parser.close()
+            except ET.ParseError:
+                self._broken = True
+        return self._drain()
+
+    def _drain(self) -> List[HostRecord]:
+        hosts: List[HostRecord] = []
+        try:
+            for event, elem in self._parser.read_events():
+                if event == "start":
+                    if self._root is None:
+                        self._root = elem
+                    self._depth += 1
+                    continue
+                self._depth -= 1
+                if elem.tag == "host":
+                    record = parse_host(elem)
+                    if record is not None:
+                        hosts.append(record)
+                elif elem.tag in ("taskprogress", "taskend"):
+                    self._progress.append(parse_task_progress(elem))
+                if self._depth == 1 and self._root is not None:
+                    # 释放已处理完的顶层元素，保证内存占用与主机数量无关
+                    elem.clear()
+                    self._root.remove(elem)
+        except ET.ParseError:
+            self._broken = True
+        return hosts
+
+
+def parse_task_progress(elem: ET.Element) -> Dict[str, Any]:
+    """把 <taskprogress>/<taskend> 元素整理为进度字典，taskend 视为 100%。"""
+    finished = elem.tag == "taskend"
+    return {
+        "task": elem.get("task", ""),
+        "percent": 100.0 if finished else _to_float(elem.get("percent")),
+        "remaining": 0.0 if finished else _to_float(elem.get("remaining")),
+        "etc": None if finished else _to_float(elem.get("etc")),
+    }
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_host(host: ET.Element) -> Optional[HostRecord]:
+    """把单个 <host> 元素整理为 HostRecord，缺少地址信息时返回 None。"""
+    ip: Optional[str] = None
+    for addrtype in ("ipv4", "ipv6"):
+        address = host.find(f'address[@addrtype="{addrtype}"]')
+        if address is not None and address.get("addr"):
+            ip = address.get("addr")
+            break
+    if ip is None:
+        return None
+
+    status = host.find("status")
+    record = HostRecord(
+        ip=ip,
+        alive=status is not None and status.get("state") == "up",
+        hostnames=[
+            item.get("name", "")
+            for item in host.findall("hostnames/hostname")
+            if item.get("name")
+        ],
+    )
+
+    for port in host.findall("ports/port"):
+        try:
+            portid = int(port.get("portid", ""))
+        except ValueError:
+            continue
+        state_elem = port.find("state")
+        service_elem = port.find("service")
+        service: Optional[str] = None
+        version: Optional[str] = None
+        if service_elem is not None:
+            service = service_elem.get("name")
+            parts = [
+                service_elem.get(attr)
+                for attr in ("product", "version", "extrainfo")
+                if service_elem.get(attr)
+            ]
+            version = " ".join(parts) or None  # type: ignore[arg-type]
+        record.add_port(
+            PortRecord(
+                port=portid,
+                protocol=port.get("protocol", "tcp"),
+                state=state_elem.get("state", "unknown")
+                if state_elem is not None
+                else "unknown",
+                service=service,
+                version=version,
+            )
+        )
+    return record
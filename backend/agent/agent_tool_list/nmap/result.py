@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+"""nmap 扫描结果模型：紧凑的主机/端口记录与按 IP 的索引"""
+
+
+@dataclass(slots=True)
+class PortRecord:
+    """单个端口的扫描记录。"""
+
+    port: int
+    protocol: str = "tcp"
+    state: str = "open"
+    service: Optional[str] = None
+    version: Optional[str] = None  # product/version/extrainfo 拼接而成
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == "open"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "port": self.port,
+            "protocol": self.protocol,
+            "state": self.state,
+            "service": self.service,
+            "version": self.version,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PortRecord":
+        return cls(
+            port=int(data["port"]),
+            protocol=data.get("protocol", "tcp"),
+            state=data.get("state", "open"),
+            service=data.get("service"),
+            version=data.get("version"),
+        )
+
+
+@dataclass(slots=True)
+class HostRecord:
+    """单个主机的扫描记录，端口按 (port, protocol) 建立索引。"""
+
+    ip: str
+    alive: bool = False
+    hostnames: List[str] = field(default_factory=list)
+    ports: List[PortRecord] = field(default_factory=list)
+    _port_index: Dict[Tuple[int, str], int] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        ports, self.ports = self.ports, []
+        for record in ports:
+            self.add_port(record)
+
+    def add_port(self, record: PortRecord) -> None:
+        """添加端口记录，同一 (port, protocol) 已存在时覆盖。"""
+        key = (record.port, record.protocol)
+        idx = self._port_index.get(key)
+        if idx is None:
+            self._port_index[key] = len(self.ports)
+            self.ports.append(record)
+        else:
+            self.ports[idx] = record
+
+    def update(self, other: "HostRecord") -> None:
+        """合并同一主机的另一份记录（如按端口分片扫描的结果）：端口与主机名取并集。"""
+        self.alive = self.alive or other.alive
+        for name in other.hostnames:
+            if name not in self.hostnames:
+                self.hostnames.append(name)
+        for record in other.ports:
+            self.add_port(record)
+
+    def get_port(self, port: int, protocol: str = "tcp") -> Optional[PortRecord]:
+        idx = self._port_index.get((port, protocol))
+        return None if idx is None else self.ports[idx]
+
+    def is_open(self, port: int, protocol: str = "tcp") -> bool:
+        record = self.get_port(port, protocol)
+        return record is not None and record.is_open
+
+    def open_ports(self, protocol: Optional[str] = None) -> List[int]:
+        """返回升序排列的开放端口号，可按协议过滤。"""
+        return sorted(
+            record.port
+            for record in self.ports
+            if record.is_open and (protocol is None or record.protocol == protocol)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ip": self.ip,
+            "alive": self.alive,
+            "hostnames": list(self.hostnames),
+            "alive_port": self.open_ports(),
+            "ports": [record.to_dict() for record in self.ports],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HostRecord":
+        return cls(
+            ip=data["ip"],
+            alive=bool(data.get("alive", False)),
+            hostnames=list(data.get("hostnames") or []),
+            ports=[PortRecord.from_dict(item) for item in data.get("ports") or []],
+        )
+
+
+@dataclass(slots=True)
+class ScanResult:
+    """一次扫描（可覆盖多个主机）的完整结果，按 IP 建立索引。"""
+
+    mode: str
+    targets: List[str] = field(default_factory=list)
+    hosts: List[HostRecord] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)  # 失败目标 -> 错误信息
+    cache_age: Optional[float] = None  # 来自缓存时，距离原始扫描的秒数
+    known_ports: Dict[str, List[int]] = field(default_factory=dict)  # 清单中已探测过、本次跳过的端口
+    _host_index: Dict[str, int] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        hosts, self.hosts = self.hosts, []
+        for host in hosts:
+            self.add_host(host)
+
+    def add_host(self, host: HostRecord) -> None:
+        """添加主机记录，同一 IP 已存在时覆盖。"""
+        idx = self._host_index.get(host.ip)
+        if idx is None:
+            self._host_index[host.ip] = len(self.hosts)
+            self.hosts.append(host)
+        else:
+            self.hosts[idx] = host
+
+    def merge_host(self, host: HostRecord) -> None:
+        """添加主机记录，同一 IP 已存在时合并端口而不是覆盖。"""
+        existing = self.get(host.ip)
+        if existing is None:
+            self.add_host(host)
+        else:
+            existing.update(host)
+
+    def get(self, ip: str) -> Optional[HostRecord]:
+        idx = self._host_index.get(ip)
+        return None if idx is None else self.hosts[idx]
+
+    def open_ports(self, ip: str, protocol: Optional[str] = None) -> List[int]:
+        host = self.get(ip)
+        return [] if host is None else host.open_ports(protocol)
+
+    def alive_hosts(self) -> List[HostRecord]:
+        return [host for host in self.hosts if host.alive]
+
+    def __iter__(self) -> Iterator[HostRecord]:
+        return iter(self.hosts)
+
+    def __len__(self) -> int:
+        return len(self.hosts)
+
+    def __contains__(self, ip: object) -> bool:
+        return ip in self._host_index
+
+    def to_dict(self) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "mode": self.mode,
+            "targets": list(self.targets),
+            "hosts": [host.to_dict() for host in self.hosts],
+        }
+        if self.errors:
+            payload["errors"] = dict(self.errors)
+        if self.known_ports:
+            payload["known_ports"] = {ip: list(ports) for ip, ports in self.known_ports.items()}
+        if self.cache_age is not None:
+            payload["cache_age_seconds"] = round(self.cache_age, 1)
+        return payload
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ScanResult":
+        return cls(
+            mode=data.get("mode", ""),
+            targets=list(data.get("targets") or []),
+            hosts=[HostRecord.from_dict(item) for item in data.get("hosts") or []],
+            errors=dict(data.get("errors") or {}),
+            known_ports={
+                ip: list(ports) for ip, ports in (data.get("known_ports") or {}).items()
+            },
+        )
+
+    @classmethod
+    def merge(
+        cls, results: Sequence["ScanResult"], *, mode: Optional[str] = None
+    ) -> "ScanResult":
+        """把多个扫描结果合并为一个，后出现的同 IP 主机覆盖先出现的。"""
+        merged = cls(mode=mode or (results[0].mode if results else ""))
+        for result in results:
+            merged.targets.extend(result.targets)
+            merged.errors.update(result.errors)
+            merged.known_ports.update(result.known_ports)
+            for host in result.hosts:
+                merged.add_host(host)
+        return merged
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from ..base import ToolError
+from .result import ScanResult
+
+"""多目标扫描调度：目标展开 + 有界并发执行"""
+
+
+MAX_BATCH_TARGETS = 4096  # 单次批量扫描允许展开的最大目标数
+
+
+@dataclass
+class ScanOutcome:
+    """单个目标的扫描结果，成功时 result 有值，失败时 error 有值。"""
+
+    target: str
+    result: Optional[ScanResult] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "target": self.target,
+            "elapsed": round(self.elapsed, 3),
+        }
+        if self.result is not None:
+            payload["result"] = self.result.to_dict()
+        else:
+            payload["error"] = self.error
+        return payload
+
+
+def expand_targets(
+    targets: Sequence[str], *, max_targets: int = MAX_BATCH_TARGETS
+) -> List[str]:
+    """展开 CIDR 网段并按原始顺序去重，超过上限时抛出异常。"""
+    expanded: List[str] = []
+    seen: set[str] = set()
+
+    def _push(item: str) -> None:
+        if item in seen:
+            return
+        if len(expanded) >= max_targets:
+            raise ToolError(f"批量目标数量超过上限 {max_targets}")
+        seen.add(item)
+        expanded.append(item)
+
+    for target in targets:
+        if "/" not in target:
+            _push(target)
+            continue
+        try:
+            network = ipaddress.ip_network(target, strict=False)
+        except ValueError:
+            _push(target)
+            continue
+        if network.num_addresses > max_targets + 2:
+            raise ToolError(f"网段 {target} 过大，超过上限 {max_targets}")
+        hosts = list(network.hosts()) or [network.network_address]
+        for host in hosts:
+            _push(str(host))
+    return expanded
+
+
+class ScanScheduler:
+    """有界并发的扫描调度器，同一实例内的所有批量任务共享并发配额。"""
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 8,
+        host_timeout: Optional[float] = None,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency 必须大于 0")
+        self._max_concurrency = max_concurrency
+        self._host_timeout = host_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    async def iter_scan(
+        self,
+        targets: Sequence[str],
+        scan: Callable[[str], Awaitable[ScanResult]],
+    ) -> AsyncIterator[ScanOutcome]:
+        """并发扫描所有目标，按完成先后顺序产出 ScanOutcome。"""
+        if not targets:
+            return
+
+        done: asyncio.Queue[ScanOutcome] = asyncio.Queue()
+
+        async def _worker(target: str) -> None:
+            async with self._slots:
+                outcome = await self._scan_one(target, scan)
+            done.put_nowait(outcome)
+
+        tasks = [asyncio.create_task(_worker(target)) for target in targets]
+        try:
+            for _ in range(len(tasks)):
+                yield await done.get()
+        finally:
+            # 调用方提前退出或被取消时，回收仍在执行的扫描
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _scan_one(
+        self,
+        target: str,
+        scan: Callable[[str], Awaitable[ScanResult]],
+    ) -> ScanOutcome:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            result = await asyncio.wait_for(scan(target), self._host_timeout)
+        except asyncio.TimeoutError:
+            return ScanOutcome(
+                target=target,
+                error=f"扫描超时（{self._host_timeout}s）",
+                elapsed=loop.time() - started,
+            )
+        except ToolError as exc:
+            return ScanOutcome(
+                target=target, error=str(exc), elapsed=loop.time() - started
+            )
+        except Exception as exc:
+            # 任何异常都要产出结果，否则 iter_scan 会一直等待该目标；CancelledError 照常向上传播
+            return ScanOutcome(
+                target=target,
+                error=f"{type(exc).__name__}: {exc}",
+                elapsed=loop.time() - started,
+            )
+        return ScanOutcome(
+            target=target, result=result, elapsed=loop.time() - started
+        )
@@ -2,12 +2,92 @@ from __future__ import annotations
 
 import asyncio
 import json
-import shlex
-import xml.etree.ElementTree as ET
-from typing import Any, Dict, List, Sequence
+import os
+import re
+import socket
+import time
+from contextvars import ContextVar
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 from urllib.parse import urlparse
 
+from ... import telemetry
 from ..base import BaseTool, ToolError, ToolResult
+from ..cache import ScanCache
+from ..process import ManagedProcess, ProcessUsage
+from ..progress import ToolProgress, report_progress
+from ..resolver import DnsResolver, get_resolver
+from .connect_scan import TOP_TCP_PORTS, ConnectProber, get_connect_prober, top_tcp_ports
+from .inventory import HostInventory, scoped_inventory
+from .parse_pool import ParsePool, get_parse_pool
+from .parser import NmapStreamParser
+from .result import HostRecord, ScanResult
+from .scheduler import ScanOutcome, ScanScheduler, expand_targets
+from .view import render_scan_result
+
+_usage_sink: ContextVar[Optional[List[ProcessUsage]]] = ContextVar(
+    "nmap_usage_sink", default=None
+)
+
+NMAP_SCAN_SECONDS = telemetry.registry.histogram(
+    "nmap_scan_seconds", "NmapTool 单次调用耗时（含缓存命中与批量扫描）", ("mode", "outcome")
+)
+NMAP_PROCESS_SECONDS = telemetry.registry.histogram(
+    "nmap_process_seconds", "单个 nmap 子进程从启动到退出的耗时", ("mode", "outcome")
+)
+NMAP_PARSE_SECONDS = telemetry.registry.histogram(
+    "nmap_parse_seconds", "单个 nmap 子进程输出的 XML 累计解析耗时", ("mode",)
+)
+
+MAX_PORT = 65535
+MAX_FULL_SCAN_SHARDS = 16  # 自动分片时单个目标最多拆成的 nmap 进程数
+
+ProgressHandler = Callable[[Dict[str, Any]], None]
+
+# 需要预先解析的目标：至少含一个字母的域名（排除 IP、CIDR 与 10.0.0.1-5 这类 nmap 地址范围）
+_HOSTNAME_RE = re.compile(r"^(?=.*[A-Za-z])[A-Za-z0-9_-]+(\.[A-Za-z0-9_-]+)*\.?$")
+# 由调用方自行控制 DNS 行为的 nmap 参数，出现时不做预解析
+_DNS_ARGS = ("-n", "-R", "--dns-servers", "--system-dns", "--resolve-all")
+
+
+class _ShardProgress:
+    """把各端口分片的 nmap 进度汇总为整体进度：百分比取平均，剩余时间与预计完成时间取最大。"""
+
+    def __init__(self, tool: str, target: str, count: int) -> None:
+        self._tool = tool
+        self._target = target
+        self._percent = [0.0] * count
+        self._remaining: List[Optional[float]] = [None] * count
+        self._etc: List[Optional[float]] = [None] * count
+
+    def update(self, index: int, item: Dict[str, Any]) -> None:
+        if item.get("percent") is not None:
+            self._percent[index] = item["percent"]
+        if item.get("remaining") is not None:
+            self._remaining[index] = item["remaining"]
+        if item.get("etc") is not None:
+            self._etc[index] = item["etc"]
+        remaining = [value for value in self._remaining if value is not None]
+        etc = [value for value in self._etc if value is not None]
+        report_progress(
+            ToolProgress(
+                tool=self._tool,
+                target=self._target,
+                task=f"{item.get('task', '')}（{len(self._percent)} 个端口分片）",
+                percent=round(sum(self._percent) / len(self._percent), 2),
+                remaining=max(remaining) if remaining else None,
+                etc=max(etc) if etc else None,
+            )
+        )
 
 
 class NmapTool(BaseTool):
@@ -16,6 +96,7 @@ class NmapTool(BaseTool):
     name = "nmap"
     description = (
         "使用 nmap 执行常见扫描模式，支持主机发现、快速扫描、版本探测等。"
+        "传入 targets 时对多个目标（可含 CIDR 网段）并发批量扫描。"
     )
 
     parameters: Dict[str, Any] = {
@@ -25,6 +106,11 @@ class NmapTool(BaseTool):
                 "type": "string",
                 "description": "需要扫描的 IP 或域名，可带 http(s) 前缀。",
             },
+            "targets": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "批量扫描的目标列表，支持 CIDR 网段（如 10.0.0.0/24），与 target 二选一。",
+            },
             "mode": {
                 "type": "string",
                 "enum": [
@@ -49,11 +135,32 @@ class NmapTool(BaseTool):
                 "items": {"type": "string"},
                 "description": "附加的 nmap 参数（谨慎使用）。",
             },
+            "only_new_ports": {
+                "type": "boolean",
+                "default": False,
+                "description": "service_version 模式下只探测主机清单中尚未做过版本识别的开放端口，已识别的端口列在 known_ports 中；"
+                "清单中的端口可能只来自 fast_scan 等小范围扫描，需要完整覆盖时保持默认 false。",
+            },
+            "engine": {
+                "type": "string",
+                "enum": ["auto", "nmap", "connect"],
+                "default": "auto",
+                "description": "扫描引擎：auto 与 nmap 相同；connect 为进程内 TCP 连接探测，需显式指定，"
+                "只支持 host_discovery、fast_scan 与 100 个以内的 top_ports，大批量主机时明显更快。"
+                "connect 只把有端口响应的主机判为在线（nmap 的 -Pn 模式会全部视为在线），结果与 nmap 不完全一致。",
+            },
+            "refresh": {
+                "type": "boolean",
+                "default": False,
+                "description": "为 true 时忽略缓存与主机清单强制重新扫描；结果中的 cache_age_seconds 表示缓存数据的陈旧秒数。",
+            },
         },
-        "required": ["target", "mode"],
+        "required": ["mode"],
         "additionalProperties": False,
     }
 
+    READ_CHUNK_SIZE = 16 * 1024  # 每次从 nmap stdout 读取并在事件循环中解析的字节数
+
     MODE_FLAGS: Dict[str, Sequence[str]] = {
         "host_discovery": ("-sn",),
         "fast_scan": ("-T4", "-F", "-Pn"),
@@ -63,36 +170,583 @@ class NmapTool(BaseTool):
         "full_scan": ("-sS", "-T4", "-Pn", "-p-",),
     }
 
+    # 各模式单个 nmap 进程的截止时间（秒），超时后结束整个进程组
+    MODE_TIMEOUTS: Dict[str, float] = {
+        "host_discovery": 300.0,
+        "fast_scan": 600.0,
+        "top_ports": 900.0,
+        "service_version": 1800.0,
+        "os_detection": 1200.0,
+        "full_scan": 7200.0,
+    }
+    MAX_OUTPUT_BYTES = 256 * 1024 * 1024  # 单个 nmap 进程 XML 输出的上限
+    DELTA_MODES = ("service_version",)  # 支持只探测增量端口的模式
+    ENGINES = ("auto", "nmap", "connect")
+    CONNECT_MODES = ("host_discovery", "fast_scan", "top_ports")  # connect 引擎支持的模式
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 8,
+        host_timeout: Optional[float] = None,
+        cache: Optional[ScanCache] = None,
+        enable_cache: bool = True,
+        parse_pool: Optional[ParsePool] = None,
+        stats_every: Optional[float] = 5.0,
+        timeouts: Optional[Mapping[str, float]] = None,
+        max_output_bytes: Optional[int] = MAX_OUTPUT_BYTES,
+        inventory: Optional[HostInventory] = None,
+        nmap_path: str = "nmap",
+        engine: str = "auto",
+        prober: Optional[ConnectProber] = None,
+        connect_concurrency: int = 256,
+        full_scan_shards: Optional[int] = None,
+        max_shard_processes: Optional[int] = None,
+        resolver: Optional[DnsResolver] = None,
+    ) -> None:
+        """
+        Args:
+            max_concurrency: 批量扫描时同时运行的 nmap 进程上限。
+            host_timeout: 批量扫描时单个目标的超时时间（秒），None 表示不限制。
+            cache: 扫描结果缓存，未提供时使用仅内存的默认缓存。
+            enable_cache: 为 False 时完全禁用缓存。
+            parse_pool: XML 解析卸载池，未提供时使用进程内共享的默认池。
+            stats_every: nmap 输出进度（--stats-every）的间隔秒数，None 表示不输出。
+            timeouts: 按模式覆盖 MODE_TIMEOUTS 中的进程截止时间（秒）。
+            max_output_bytes: 单个 nmap 进程的输出上限，None 表示不限制。
+            inventory: 扫描结果合并进的主机清单，未提供时使用工具自己的清单；
+                调用方可用 inventory_scope 按会话/任务临时指定清单。
+            nmap_path: nmap 可执行文件路径（基准测试时可替换为模拟程序）。
+            engine: 默认扫描引擎（auto/nmap/connect，auto 等同 nmap），调用时可用 engine 参数覆盖。
+            prober: connect 引擎使用的扫描器，未提供时使用进程内共享的扫描器（共享 socket 配额）。
+            connect_concurrency: connect 引擎批量扫描时同时探测的目标数上限。
+            full_scan_shards: full_scan 把 1-65535 端口拆成的分片数，每个分片一个 nmap 进程并行扫描；
+                None 时按 CPU 核数自动选择（最多 MAX_FULL_SCAN_SHARDS），1 表示不分片。
+            max_shard_processes: 所有分片共享的 nmap 进程并发上限，None 时为 CPU 核数。
+            resolver: 域名目标的异步解析器，未提供时使用进程内共享的解析器（共享 DNS 缓存）。
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"engine 必须是 {self.ENGINES} 之一")
+        cpus = os.cpu_count() or 1
+        if full_scan_shards is None:
+            full_scan_shards = min(cpus, MAX_FULL_SCAN_SHARDS)
+        if max_shard_processes is None:
+            max_shard_processes = cpus
+        if full_scan_shards < 1 or max_shard_processes < 1:
+            raise ValueError("full_scan_shards 与 max_shard_processes 必须大于 0")
+        self._scheduler = ScanScheduler(
+            max_concurrency=max_concurrency, host_timeout=host_timeout
+        )
+        self._cache: Optional[ScanCache] = None
+        if enable_cache:
+            self._cache = cache if cache is not None else ScanCache()
+        self._parse_pool = parse_pool if parse_pool is not None else get_parse_pool()
+        if stats_every is not None and stats_every <= 0:
+            raise ValueError("stats_every 必须大于 0")
+        self._stats_every = stats_every
+        self._timeouts: Dict[str, float] = {**self.MODE_TIMEOUTS, **(timeouts or {})}
+        self._max_output_bytes = max_output_bytes
+        self._inventory = inventory if inventory is not None else HostInventory()
+        self._nmap_path = nmap_path
+        self._engine = engine
+        self._prober = prober if prober is not None else get_connect_prober()
+        # connect 引擎的并发实际受 prober 的 socket 配额约束，目标并发可以远高于 nmap 进程数
+        self._connect_scheduler = ScanScheduler(
+            max_concurrency=connect_concurrency, host_timeout=host_timeout
+        )
+        self._full_scan_shards = full_scan_shards
+        self._shard_slots = asyncio.Semaphore(max_shard_processes)
+        self._resolver = resolver if resolver is not None else get_resolver()
+
+    @property
+    def inventory(self) -> HostInventory:
+        """当前上下文使用的主机清单：inventory_scope 指定的优先，否则为工具自己的清单。"""
+        scoped = scoped_inventory()
+        return scoped if scoped is not None else self._inventory
+
     async def run(
         self,
         *,
-        target: str,
         mode: str,
+        target: str | None = None,
+        targets: Sequence[str] | None = None,
         top_ports: int = 100,
         extra_args: Sequence[str] | None = None,
+        refresh: bool = False,
+        only_new_ports: bool = False,
+        engine: str | None = None,
     ) -> ToolResult:
+        if (target is None) == (not targets):
+            raise ToolError("target 与 targets 必须且只能提供一个")
+        self._get_flags(mode)
+        engine = self._select_engine(
+            engine or self._engine, mode=mode, top_ports=top_ports, extra_args=extra_args
+        )
+
+        with telemetry.span("nmap_scan", NMAP_SCAN_SECONDS, mode=mode):
+            # 收集本次调用中每个 nmap 进程的资源占用（批量扫描的并发子任务会继承该上下文）
+            usages: List[ProcessUsage] = []
+            token = _usage_sink.set(usages)
+            try:
+                if targets:
+                    expanded = self._expand(targets)
+                    outcomes = {
+                        outcome.target: outcome
+                        async for outcome in self._iter_expanded(
+                            expanded,
+                            mode=mode,
+                            top_ports=top_ports,
+                            extra_args=extra_args,
+                            refresh=refresh,
+                            only_new_ports=only_new_ports,
+                            engine=engine,
+                        )
+                    }
+                    # 汇总结果按输入顺序排列，保证输出稳定
+                    ordered = [outcomes[item] for item in expanded]
+                    summary: Dict[str, Any] = {
+                        "mode": mode,
+                        "engine": engine,
+                        "results": [outcome.to_dict() for outcome in ordered],
+                    }
+                    result = ScanResult.merge(
+                        [outcome.result for outcome in ordered if outcome.result is not None],
+                        mode=mode,
+                    )
+                    result.targets = list(expanded)
+                    result.errors = {
+                        outcome.target: outcome.error or ""
+                        for outcome in ordered
+                        if not outcome.ok
+                    }
+                    cached_ages = [
+                        outcome.result.cache_age
+                        for outcome in ordered
+                        if outcome.result is not None and outcome.result.cache_age is not None
+                    ]
+                    summary["cache"] = {
+                        "hits": len(cached_ages),
+                        "total": len(ordered),
+                        "max_age_seconds": round(max(cached_ages), 1) if cached_ages else None,
+                    }
+                else:
+                    result = await self._scan_target(
+                        self._normalize_target(target or ""),
+                        mode=mode,
+                        top_ports=top_ports,
+                        extra_args=extra_args,
+                        refresh=refresh,
+                        only_new_ports=only_new_ports,
+                        engine=engine,
+                    )
+                    summary = result.to_dict()
+                    summary["engine"] = engine
+                    summary["cache"] = {
+                        "hit": result.cache_age is not None,
+                        "age_seconds": (
+                            round(result.cache_age, 1) if result.cache_age is not None else None
+                        ),
+                    }
+            finally:
+                _usage_sink.reset(token)
+        content = json.dumps(summary, ensure_ascii=False)
+        metadata = summary
+        if usages:
+            metadata = {**summary, "resources": [usage.to_dict() for usage in usages]}
+        return ToolResult(
+            name=self.name, content=content, metadata=metadata, data=result
+        )
+
+    def context_view(self, result: ToolResult, *, limit: int) -> str:
+        """按服务分组、端口区间化渲染扫描结果，完整 JSON 留在结果存储中。"""
+        if not isinstance(result.data, ScanResult):
+            return super().context_view(result, limit=limit)
+        cache = (result.metadata or {}).get("cache")
+        return render_scan_result(result.data, limit=limit, cache=cache)
+
+    async def stream(
+        self,
+        *,
+        target: str,
+        mode: str,
+        top_ports: int = 100,
+        extra_args: Sequence[str] | None = None,
+    ) -> AsyncIterator[HostRecord]:
+        """边扫描边产出主机记录，每个 <host> 完成即返回，无需等待 nmap 退出。"""
         normalized_target = self._normalize_target(target)
+        address = await self._resolve_target(normalized_target, extra_args=extra_args)
+        cmd = self._build_cmd(
+            address or normalized_target,
+            mode=mode,
+            top_ports=top_ports,
+            extra_args=extra_args,
+            no_dns=address is not None,
+        )
+        async for host in self._stream_cmd(cmd, target=normalized_target, mode=mode):
+            if address is not None:
+                _attach_hostname(host, address, normalized_target)
+            yield host
+
+    async def iter_batch(
+        self,
+        targets: Sequence[str],
+        *,
+        mode: str,
+        top_ports: int = 100,
+        extra_args: Sequence[str] | None = None,
+        engine: str | None = None,
+    ) -> AsyncIterator[ScanOutcome]:
+        """并发扫描多个目标（CIDR 会被展开），按完成顺序逐个产出结果。"""
+        self._get_flags(mode)
+        async for outcome in self._iter_expanded(
+            self._expand(targets),
+            mode=mode,
+            top_ports=top_ports,
+            extra_args=extra_args,
+            engine=self._select_engine(
+                engine or self._engine, mode=mode, top_ports=top_ports, extra_args=extra_args
+            ),
+        ):
+            yield outcome
+
+    async def _iter_expanded(
+        self,
+        expanded: Sequence[str],
+        *,
+        mode: str,
+        top_ports: int,
+        extra_args: Sequence[str] | None,
+        refresh: bool = False,
+        only_new_ports: bool = False,
+        engine: str = "nmap",
+    ) -> AsyncIterator[ScanOutcome]:
+        async def _scan(item: str) -> ScanResult:
+            return await self._scan_target(
+                item,
+                mode=mode,
+                top_ports=top_ports,
+                extra_args=extra_args,
+                refresh=refresh,
+                only_new_ports=only_new_ports,
+                engine=engine,
+            )
+
+        # 批量目标中的域名先不受扫描并发限制地一次性并发解析，之后各扫描直接命中 DNS 缓存
+        names = [item for item in expanded if self._needs_resolution(item, extra_args)]
+        if names:
+            await self._resolver.resolve_many(names, family=_address_family(extra_args))
+
+        scheduler = self._connect_scheduler if engine == "connect" else self._scheduler
+        async for outcome in scheduler.iter_scan(expanded, _scan):
+            yield outcome
+
+    def _expand(self, targets: Sequence[str]) -> List[str]:
+        return expand_targets([self._normalize_target(item) for item in targets])
+
+    def _get_flags(self, mode: str) -> List[str]:
         flags = list(self.MODE_FLAGS.get(mode, ()))
         if not flags:
             raise ToolError(f"未知的模式：{mode}")
+        return flags
+
+    def _select_engine(
+        self,
+        engine: str,
+        *,
+        mode: str,
+        top_ports: int,
+        extra_args: Sequence[str] | None,
+    ) -> str:
+        """
+        确定实际使用的引擎：connect 的主机存活判定与 nmap 不同，只在显式指定时使用，auto 等同 nmap。
+        top_ports 模式下同时校验端口数量，非法值抛出 ToolError。
+        """
+        if engine not in self.ENGINES:
+            raise ToolError(f"未知的扫描引擎：{engine}")
+        valid_top_ports = isinstance(top_ports, int) and not isinstance(top_ports, bool)
+        if mode == "top_ports" and (not valid_top_ports or top_ports < 1):
+            raise ToolError(f"top_ports 必须是大于 0 的整数，实际为 {top_ports!r}")
+        if engine != "connect":
+            return "nmap"
+        supported = (
+            mode in self.CONNECT_MODES
+            and not extra_args
+            and (mode != "top_ports" or top_ports <= len(TOP_TCP_PORTS))
+        )
+        if not supported:
+            raise ToolError(
+                "connect 引擎只支持 host_discovery、fast_scan 与不超过 "
+                f"{len(TOP_TCP_PORTS)} 个端口的 top_ports，且不能附加 extra_args"
+            )
+        return "connect"
+
+    async def _scan_target(
+        self,
+        normalized_target: str,
+        *,
+        mode: str,
+        top_ports: int,
+        extra_args: Sequence[str] | None,
+        refresh: bool = False,
+        only_new_ports: bool = False,
+        engine: str = "nmap",
+    ) -> ScanResult:
+        """
+        对单个已规范化的目标执行一次扫描（nmap 或 connect 引擎）并解析结果，优先使用缓存；
+        结果合并进主机清单，only_new_ports 且未要求 refresh 时只探测清单中该模式尚未覆盖的开放端口。
+        """
+        inventory = self.inventory
+        ports: Optional[List[int]] = None
+        known: Dict[str, List[int]] = {}
+        # refresh 表示要求重新探测，不能用清单中的旧结果代替
+        if (
+            only_new_ports
+            and not refresh
+            and mode in self.DELTA_MODES
+            and not _has_port_spec(extra_args)
+        ):
+            ports = inventory.ports_without(normalized_target, mode)
+            if ports is not None:
+                known = inventory.known_ports(normalized_target, mode)
+                if not ports:
+                    # 已知端口都探测过，直接返回清单中的结果，不再启动 nmap
+                    snapshot = inventory.to_scan_result(normalized_target, mode=mode)
+                    snapshot.known_ports = known
+                    return snapshot
+
+        result = await self._scan_or_cached(
+            normalized_target,
+            mode=mode,
+            top_ports=top_ports,
+            extra_args=extra_args,
+            refresh=refresh,
+            ports=ports,
+            engine=engine,
+        )
+        result.known_ports = known
+        inventory.merge(result)
+        return result
+
+    async def _scan_or_cached(
+        self,
+        normalized_target: str,
+        *,
+        mode: str,
+        top_ports: int,
+        extra_args: Sequence[str] | None,
+        refresh: bool,
+        ports: Optional[Sequence[int]],
+        engine: str = "nmap",
+    ) -> ScanResult:
+        cache_key: Optional[str] = None
+        if self._cache is not None:
+            cache_key = self._cache_key(
+                normalized_target,
+                mode=mode,
+                top_ports=top_ports,
+                extra_args=extra_args,
+                ports=ports,
+                engine=engine,
+            )
+            if not refresh:
+                entry = await self._cache.get(cache_key)
+                if entry is not None:
+                    cached = ScanResult.from_dict(entry.value)
+                    cached.cache_age = entry.age()
+                    return cached
 
-        cmd = ["nmap", *flags]
+        # 缓存键按域名计算，命中缓存时不需要解析
+        address: Optional[str] = None
+        if engine != "connect":
+            address = await self._resolve_target(normalized_target, extra_args=extra_args)
+        shards = self._port_shards(mode, extra_args=extra_args, ports=ports)
+        if engine == "connect":
+            hosts = await self._prober.scan(
+                normalized_target,
+                mode=mode,
+                ports=top_tcp_ports(100 if mode == "fast_scan" else top_ports),
+            )
+            result = ScanResult(mode=mode, targets=[normalized_target], hosts=hosts)
+        elif shards:
+            result = await self._scan_shards(
+                normalized_target, shards, mode=mode, extra_args=extra_args, address=address
+            )
+        else:
+            cmd = self._build_cmd(
+                address or normalized_target,
+                mode=mode,
+                top_ports=top_ports,
+                extra_args=extra_args,
+                ports=ports,
+                no_dns=address is not None,
+            )
+            hosts = [
+                host
+                async for host in self._stream_cmd(cmd, target=normalized_target, mode=mode)
+            ]
+            result = ScanResult(mode=mode, targets=[normalized_target], hosts=hosts)
+        if address is not None:
+            # nmap 只见到 IP，把用户给出的域名补回对应主机
+            for host in result.hosts:
+                _attach_hostname(host, address, normalized_target)
+        # 部分分片失败的结果不完整，不写入缓存
+        if self._cache is not None and cache_key is not None and not result.errors:
+            await self._cache.set(cache_key, result.to_dict(), mode=mode)
+        return result
+
+    def _port_shards(
+        self,
+        mode: str,
+        *,
+        extra_args: Sequence[str] | None,
+        ports: Optional[Sequence[int]],
+    ) -> List[Tuple[int, int]]:
+        """full_scan 的端口分片（连续区间），不需要分片时返回空列表。"""
+        if (
+            mode != "full_scan"
+            or self._full_scan_shards <= 1
+            or ports is not None
+            or _has_port_spec(extra_args)
+        ):
+            return []
+        size = -(-MAX_PORT // self._full_scan_shards)
+        return [
+            (start, min(MAX_PORT, start + size - 1)) for start in range(1, MAX_PORT + 1, size)
+        ]
+
+    async def _scan_shards(
+        self,
+        normalized_target: str,
+        shards: Sequence[Tuple[int, int]],
+        *,
+        mode: str,
+        extra_args: Sequence[str] | None,
+        address: Optional[str] = None,
+    ) -> ScanResult:
+        """
+        每个端口分片启动一个 nmap 进程并行扫描，受所有分片共享的进程并发上限约束，
+        结果按主机合并端口。部分分片失败时返回其余分片的结果并在 errors 中说明，全部失败才抛出异常。
+        address 为预先解析出的 IP，提供时各分片直接扫描该 IP 并关闭 nmap 的 DNS 解析。
+        """
+        progress = _ShardProgress(self.name, normalized_target, len(shards))
+
+        async def _shard(index: int, port_range: Tuple[int, int]) -> List[HostRecord]:
+            cmd = self._build_cmd(
+                address or normalized_target,
+                mode=mode,
+                top_ports=0,
+                extra_args=extra_args,
+                port_range=port_range,
+                no_dns=address is not None,
+            )
+            async with self._shard_slots:
+                return [
+                    host
+                    async for host in self._stream_cmd(
+                        cmd,
+                        target=normalized_target,
+                        mode=mode,
+                        progress=lambda item: progress.update(index, item),
+                    )
+                ]
+
+        outcomes = await asyncio.gather(
+            *(_shard(index, port_range) for index, port_range in enumerate(shards)),
+            return_exceptions=True,
+        )
+        result = ScanResult(mode=mode, targets=[normalized_target])
+        failures: List[str] = []
+        for (start, end), outcome in zip(shards, outcomes):
+            if isinstance(outcome, ToolError):
+                failures.append(f"端口 {start}-{end}：{outcome}")
+                continue
+            if isinstance(outcome, BaseException):
+                raise outcome
+            for host in outcome:
+                result.merge_host(host)
+        if len(failures) == len(shards):
+            raise ToolError(failures[0])
+        if failures:
+            result.errors[normalized_target] = "部分端口分片失败：" + "；".join(failures)
+        return result
+
+    def _cache_key(
+        self,
+        normalized_target: str,
+        *,
+        mode: str,
+        top_ports: int,
+        extra_args: Sequence[str] | None,
+        ports: Optional[Sequence[int]] = None,
+        engine: str = "nmap",
+    ) -> str:
+        parts: Dict[str, Any] = {}
+        if engine != "nmap":
+            # nmap 引擎不写入该字段，保持已有缓存键不变
+            parts["engine"] = engine
+        return ScanCache.make_key(
+            tool=self.name,
+            target=normalized_target.lower(),
+            mode=mode,
+            top_ports=top_ports if mode == "top_ports" else None,
+            extra_args=list(extra_args or ()),
+            ports=list(ports) if ports is not None else None,
+            **parts,
+        )
+
+    def _build_cmd(
+        self,
+        normalized_target: str,
+        *,
+        mode: str,
+        top_ports: int,
+        extra_args: Sequence[str] | None,
+        ports: Optional[Sequence[int]] = None,
+        port_range: Optional[Tuple[int, int]] = None,
+        no_dns: bool = False,
+    ) -> List[str]:
+        flags = self._get_flags(mode)
+        if port_range is not None:
+            # 分片扫描用指定区间替换模式自带的 -p-
+            flags = [flag for flag in flags if flag != "-p-"]
+        cmd = [self._nmap_path, *flags]
         if mode == "top_ports":
             cmd.extend(["--top-ports", str(top_ports)])
+        if ports:
+            cmd.extend(["-p", ",".join(str(port) for port in ports)])
+        elif port_range is not None:
+            cmd.extend(["-p", f"{port_range[0]}-{port_range[1]}"])
+        if self._stats_every is not None:
+            cmd.extend(["--stats-every", f"{self._stats_every:g}s"])
+        if no_dns:
+            cmd.append("-n")
         if extra_args:
             cmd.extend(extra_args)
         cmd.append(normalized_target)
+        return cmd
 
-        stdout, stderr, returncode = await self._run_cmd(cmd)
-        if returncode != 0:
-            raise ToolError(
-                f"nmap 执行失败，返回码 {returncode}，stderr: {stderr.strip()}"
-            )
+    @staticmethod
+    def _needs_resolution(normalized_target: str, extra_args: Sequence[str] | None) -> bool:
+        if not _HOSTNAME_RE.match(normalized_target):
+            return False
+        return not any(arg.split("=", 1)[0] in _DNS_ARGS for arg in extra_args or ())
 
-        summary = self._parse_scan_result(stdout, normalized_target)
-        summary["mode"] = mode
-        content = json.dumps(summary, ensure_ascii=False)
-        return ToolResult(name=self.name, content=content, metadata=summary)
+    async def _resolve_target(
+        self, normalized_target: str, *, extra_args: Sequence[str] | None
+    ) -> Optional[str]:
+        """
+        预先解析域名目标，返回交给 nmap 的 IP（nmap 默认只扫描第一个地址）；
+        不需要解析或解析失败时返回 None，仍把域名交给 nmap，由其按原有方式处理与报错。
+        """
+        if not self._needs_resolution(normalized_target, extra_args):
+            return None
+        try:
+            addresses = await self._resolver.resolve(
+                normalized_target, family=_address_family(extra_args)
+            )
+        except ToolError:
+            return None
+        return addresses[0]
 
     @staticmethod
     def _normalize_target(target: str) -> str:
@@ -109,60 +763,99 @@ class NmapTool(BaseTool):
                 return parsed.hostname
         return cleaned.strip("/")
 
-    async def _run_cmd(self, cmd: Sequence[str]) -> tuple[str, str, int]:
+    async def _stream_cmd(
+        self,
+        cmd: Sequence[str],
+        *,
+        target: str,
+        mode: str,
+        progress: Optional[ProgressHandler] = None,
+    ) -> AsyncIterator[HostRecord]:
+        """运行 nmap 并增量解析 stdout 中的 XML，逐个产出主机记录，同时上报扫描进度。"""
         cmd = [*cmd, "-oX", "-"]
-        try:
-            proc = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-        except FileNotFoundError as exc:
-            raise ToolError("系统未安装 nmap，请先安装后再使用该工具。") from exc
-
-        stdout_bytes, stderr_bytes = await proc.communicate()
-        stdout = stdout_bytes.decode(errors="ignore")
-        stderr = stderr_bytes.decode(errors="ignore")
-        return stdout, stderr, proc.returncode
+        parser = NmapStreamParser()
+        started = time.perf_counter()
+        parse_time = 0.0
+        outcome = "error"
+        async with ManagedProcess(
+            cmd,
+            timeout=self._timeouts.get(mode),
+            max_output_bytes=self._max_output_bytes,
+        ) as proc:
+            try:
+                async for chunk in proc.iter_stdout(self.READ_CHUNK_SIZE):
+                    parse_started = time.perf_counter()
+                    hosts = await self._parse_pool.feed(parser, chunk)
+                    parse_time += time.perf_counter() - parse_started
+                    self._report_progress(parser, target, progress)
+                    for host in hosts:
+                        yield host
+                parse_started = time.perf_counter()
+                tail = parser.close()
+                parse_time += time.perf_counter() - parse_started
+                for host in tail:
+                    yield host
+                self._report_progress(parser, target, progress)
 
-    def _parse_scan_result(self, xml_text: str, fallback_target: str) -> Dict[str, Any]:
-        """把 nmap XML 输出整理为指定结构。"""
-        ip = fallback_target
-        alive = False
-        alive_ports: List[int] = []
+                returncode = await proc.wait()
+                if returncode != 0:
+                    raise ToolError(
+                        f"nmap 执行失败，返回码 {returncode}，stderr: {proc.stderr.strip()}"
+                    )
+                outcome = "ok"
+            except (asyncio.CancelledError, GeneratorExit):
+                outcome = "cancelled"
+                raise
+            finally:
+                # 调用方提前退出、超时或取消时 ManagedProcess 会结束整个进程组；
+                # 无论成功与否都记录本次运行的资源占用与耗时
+                usage = _usage_sink.get()
+                if usage is not None:
+                    usage.append(proc.usage)
+                self._record_process(
+                    mode,
+                    started=started,
+                    parse_time=parse_time,
+                    outcome=proc.usage.terminated or outcome,
+                )
 
-        try:
-            root = ET.fromstring(xml_text)
-        except ET.ParseError:
-            return {"ip": ip, "alive": alive, "alive_port": alive_ports}
+    @staticmethod
+    def _record_process(
+        mode: str, *, started: float, parse_time: float, outcome: str
+    ) -> None:
+        duration = time.perf_counter() - started
+        NMAP_PROCESS_SECONDS.observe(duration, mode=mode, outcome=outcome)
+        NMAP_PARSE_SECONDS.observe(parse_time, mode=mode)
+        telemetry.record_span(
+            "nmap_process", duration, started=started, labels={"mode": mode, "outcome": outcome}
+        )
+        telemetry.record_span("nmap_parse", parse_time, labels={"mode": mode})
 
-        host = root.find("host")
-        if host is None:
-            return {"ip": ip, "alive": alive, "alive_port": alive_ports}
+    def _report_progress(
+        self,
+        parser: NmapStreamParser,
+        target: str,
+        progress: Optional[ProgressHandler] = None,
+    ) -> None:
+        for item in parser.pop_progress():
+            if progress is not None:
+                progress(item)
+            else:
+                report_progress(ToolProgress(tool=self.name, target=target, **item))
 
-        address = host.find('address[@addrtype="ipv4"]') or host.find(
-            'address[@addrtype="ipv6"]'
-        )
-        if address is not None and address.get("addr"):
-            ip = address.get("addr", ip)
 
-        status = host.find("status")
-        if status is not None:
-            alive = status.get("state") == "up"
+def _has_port_spec(extra_args: Sequence[str] | None) -> bool:
+    """附加参数中是否已经指定了端口范围（此时不做增量端口替换）。"""
+    return any(
+        arg == "-p" or (arg.startswith("-p") and arg[2:3].isdigit()) or arg == "--top-ports"
+        for arg in extra_args or ()
+    )
 
-        ports = host.find("ports")
-        if ports is not None:
-            for port in ports.findall("port"):
-                state_elem = port.find("state")
-                if state_elem is None or state_elem.get("state") != "open":
-                    continue
-                portid = port.get("portid")
-                try:
-                    alive_ports.append(int(portid))
-                except (TypeError, ValueError):
-                    continue
 
-        alive_ports.sort()
-        return {"ip": ip, "alive": alive, "alive_port": alive_ports}
+def _address_family(extra_args: Sequence[str] | None) -> int:
+    return socket.AF_INET6 if "-6" in (extra_args or ()) else socket.AF_INET
 
 
+def _attach_hostname(host: HostRecord, address: str, hostname: str) -> None:
+    if host.ip == address and hostname not in host.hostnames:
+        host.hostnames.insert(0, hostname)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .result import HostRecord, ScanResult
+
+"""nmap 结果的上下文视图：端口区间化、按服务分组、按字符预算截断"""
+
+
+MAX_VERSIONS_PER_SERVICE = 3  # 同一服务最多列出的不同版本数
+MAX_RANGE_CHARS = 200  # 单个服务分组的端口区间文本上限
+
+
+def format_port_ranges(ports: Iterable[int]) -> str:
+    """把端口列表压缩为区间表示，如 [22, 80, 81, 82] -> "22,80-82"。"""
+    ordered = sorted(set(ports))
+    if not ordered:
+        return ""
+    parts: List[str] = []
+    start = prev = ordered[0]
+    for port in ordered[1:]:
+        if port == prev + 1:
+            prev = port
+            continue
+        parts.append(str(start) if start == prev else f"{start}-{prev}")
+        start = prev = port
+    parts.append(str(start) if start == prev else f"{start}-{prev}")
+    return ",".join(parts)
+
+
+def render_host(host: HostRecord) -> List[str]:
+    """渲染单个主机：首行为地址与状态，之后每行一个服务分组。"""
+    names = f" [{','.join(host.hostnames)}]" if host.hostnames else ""
+    lines = [f"{host.ip}{names} {'up' if host.alive else 'down'}"]
+
+    groups: Dict[Tuple[str, str], Tuple[List[int], List[str]]] = {}
+    for record in host.ports:
+        if not record.is_open:
+            continue
+        key = (record.service or "unknown", record.protocol)
+        ports, versions = groups.setdefault(key, ([], []))
+        ports.append(record.port)
+        if record.version and record.version not in versions:
+            versions.append(record.version)
+    for (service, protocol), (ports, versions) in sorted(
+        groups.items(), key=lambda item: min(item[1][0])
+    ):
+        proto = "" if protocol == "tcp" else f"/{protocol}"
+        ranges = format_port_ranges(ports)
+        if len(ranges) > MAX_RANGE_CHARS:
+            cut = ranges.rfind(",", 0, MAX_RANGE_CHARS)
+            ranges = f"{ranges[: cut if cut > 0 else MAX_RANGE_CHARS]}…（共 {len(ports)} 个端口）"
+        line = f"  {service}{proto}: {ranges}"
+        if versions:
+            shown = versions[:MAX_VERSIONS_PER_SERVICE]
+            more = len(versions) - len(shown)
+            line += f" ({' | '.join(shown)}{f'，另有 {more} 种' if more > 0 else ''})"
+        lines.append(line)
+    return lines
+
+
+def render_scan_result(
+    result: ScanResult, *, limit: int, cache: Optional[Dict[str, Any]] = None
+) -> str:
+    """渲染不超过 limit 个字符的紧凑文本视图，放不下的主机只给出数量。"""
+    alive = result.alive_hosts()
+    open_total = sum(len(host.open_ports()) for host in result.hosts)
+    header = (
+        f"nmap {result.mode}：{len(result.targets)} 个目标，"
+        f"{len(alive)}/{len(result.hosts)} 台主机存活，{open_total} 个开放端口"
+    )
+    if cache:
+        if "hit" in cache and cache["hit"]:
+            header += f"（缓存，{cache.get('age_seconds')}s 前）"
+        elif cache.get("hits"):
+            header += f"（缓存命中 {cache['hits']}/{cache.get('total')}）"
+    lines = [header]
+    used = len(header)
+
+    # 存活主机优先，开放端口多的排前面
+    hosts = sorted(
+        result.hosts, key=lambda host: (not host.alive, -len(host.open_ports()))
+    )
+    tail: List[str] = []
+    if result.known_ports:
+        known = "; ".join(
+            f"{ip}: {format_port_ranges(ports)}" for ip, ports in result.known_ports.items()
+        )
+        tail.append(f"已探测过未重复扫描: {known}")
+    if result.errors:
+        failed = "; ".join(f"{target}: {error}" for target, error in result.errors.items())
+        tail.append(f"失败目标: {failed}")
+    reserved = sum(len(line) + 1 for line in tail) + 40
+
+    for idx, host in enumerate(hosts):
+        block = render_host(host)
+        size = sum(len(line) + 1 for line in block)
+        if used + size + reserved > limit:
+            lines.append(f"…其余 {len(hosts) - idx} 台主机已省略")
+            break
+        lines.extend(block)
+        used += size
+    for line in tail:
+        if used + len(line) + 1 > limit:
+            line = line[: max(0, limit - used - 2)] + "…"
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join(lines)
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from .base import ToolError
+
+"""命令行工具的子进程管理：截止时间、取消时结束整个进程组、输出上限与资源统计"""
+
+
+DEFAULT_KILL_GRACE = 2.0  # 发送 SIGTERM 后等待进程自行退出的秒数，超时再 SIGKILL
+DEFAULT_STDERR_LIMIT = 64 * 1024  # stderr 最多保留的字节数（保留末尾）
+DEFAULT_SAMPLE_INTERVAL = 0.5  # 采样 /proc 资源占用的间隔（秒）
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+@dataclass
+class ProcessUsage:
+    """一次子进程运行的资源统计（CPU/内存只统计主进程），无法获取的项为 None。"""
+
+    command: str
+    wall_time: float = 0.0
+    cpu_time: Optional[float] = None  # 用户态 + 内核态 CPU 秒数
+    max_rss_kb: Optional[int] = None  # 峰值常驻内存（VmHWM）
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    returncode: Optional[int] = None
+    terminated: Optional[str] = None  # 被本进程结束的原因：timeout/output_limit/cancelled
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "command": self.command,
+            "wall_time": round(self.wall_time, 3),
+            "cpu_time": round(self.cpu_time, 3) if self.cpu_time is not None else None,
+            "max_rss_kb": self.max_rss_kb,
+            "stdout_bytes": self.stdout_bytes,
+            "stderr_bytes": self.stderr_bytes,
+            "returncode": self.returncode,
+            "terminated": self.terminated,
+        }
+
+
+class ManagedProcess:
+    """
+    在独立进程组中运行命令，以 async with 使用：离开上下文时（包括异常与取消）
+    若进程仍在运行则结束整个进程组，保证不会遗留子进程。
+    """
+
+    def __init__(
+        self,
+        cmd: Sequence[str],
+        *,
+        timeout: Optional[float] = None,
+        max_output_bytes: Optional[int] = None,
+        max_stderr_bytes: int = DEFAULT_STDERR_LIMIT,
+        kill_grace: float = DEFAULT_KILL_GRACE,
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+    ) -> None:
+        """
+        Args:
+            cmd: 要执行的命令及参数。
+            timeout: 从启动开始计算的截止时间（秒），None 表示不限制。
+            max_output_bytes: stdout 允许的最大字节数，超出后结束进程，None 表示不限制。
+            max_stderr_bytes: stderr 保留的最大字节数，超出部分只保留末尾。
+            kill_grace: 结束进程时 SIGTERM 与 SIGKILL 之间的等待秒数。
+            sample_interval: 资源占用的采样间隔（秒）。
+        """
+        if not cmd:
+            raise ValueError("cmd 不能为空")
+        self._cmd = list(cmd)
+        self._timeout = timeout
+        self._max_output_bytes = max_output_bytes
+        self._max_stderr_bytes = max_stderr_bytes
+        self._kill_grace = kill_grace
+        self._sample_interval = sample_interval
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._started = 0.0
+        self._deadline: Optional[float] = None
+        self._stderr = bytearray()
+        self._tasks: List[asyncio.Task[None]] = []
+        self.usage = ProcessUsage(command=os.path.basename(self._cmd[0]))
+
+    async def __aenter__(self) -> "ManagedProcess":
+        try:
+            self._proc = await asyncio.create_subprocess_exec(
+                *self._cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,  # 独立进程组，便于整体结束
+            )
+        except FileNotFoundError as exc:
+            raise ToolError(f"系统未安装 {self._cmd[0]}，请先安装后再使用该工具。") from exc
+        loop = asyncio.get_running_loop()
+        self._started = loop.time()
+        if self._timeout is not None:
+            self._deadline = self._started + self._timeout
+        # stderr 需要并发读取，防止管道写满导致子进程阻塞
+        self._tasks = [
+            asyncio.create_task(self._drain_stderr()),
+            asyncio.create_task(self._sample_usage()),
+        ]
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if self._proc is None:
+            return
+        if self._proc.returncode is None:
+            if self.usage.terminated is None:
+                cancelled = exc_type is not None and issubclass(
+                    exc_type, asyncio.CancelledError
+                )
+                self.usage.terminated = "cancelled" if cancelled else "aborted"
+            await self.terminate()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._finish()
+
+    @property
+    def stderr(self) -> str:
+        return self._stderr.decode(errors="ignore")
+
+    async def iter_stdout(self, chunk_size: int) -> AsyncIterator[bytes]:
+        """逐块读取 stdout，超过截止时间或输出上限时结束进程并抛出 ToolError。"""
+        assert self._proc is not None and self._proc.stdout is not None
+        while True:
+            try:
+                chunk = await asyncio.wait_for(
+                    self._proc.stdout.read(chunk_size), self._remaining()
+                )
+            except asyncio.TimeoutError:
+                await self._abort("timeout")
+                raise ToolError(f"{self.usage.command} 执行超时（{self._timeout}s），已结束进程")
+            if not chunk:
+                return
+            self.usage.stdout_bytes += len(chunk)
+            if (
+                self._max_output_bytes is not None
+                and self.usage.stdout_bytes > self._max_output_bytes
+            ):
+                await self._abort("output_limit")
+                raise ToolError(
+                    f"{self.usage.command} 输出超过上限 {self._max_output_bytes} 字节，已结束进程"
+                )
+            yield chunk
+
+    async def wait(self) -> int:
+        """等待进程退出并返回退出码，受截止时间约束。"""
+        assert self._proc is not None
+        try:
+            returncode = await asyncio.wait_for(self._proc.wait(), self._remaining())
+        except asyncio.TimeoutError:
+            await self._abort("timeout")
+            raise ToolError(f"{self.usage.command} 执行超时（{self._timeout}s），已结束进程")
+        # 读完剩余的 stderr 再返回
+        await asyncio.gather(self._tasks[0], return_exceptions=True)
+        self._finish()
+        return returncode
+
+    async def terminate(self) -> None:
+        """先 SIGTERM 整个进程组，等待 kill_grace 秒后仍未退出则 SIGKILL。"""
+        proc = self._proc
+        if proc is None or proc.returncode is not None:
+            return
+        self._signal_group(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(asyncio.shield(proc.wait()), self._kill_grace)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # 结束过程中再次被取消：立即强制结束后继续传播取消
+            self._signal_group(signal.SIGKILL)
+            raise
+        self._signal_group(signal.SIGKILL)
+        await proc.wait()
+
+    async def _abort(self, reason: str) -> None:
+        self.usage.terminated = reason
+        await self.terminate()
+
+    def _signal_group(self, sig: int) -> None:
+        assert self._proc is not None
+        if self._proc.returncode is not None and sig != signal.SIGKILL:
+            return
+        try:
+            os.killpg(self._proc.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _remaining(self) -> Optional[float]:
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - asyncio.get_running_loop().time())
+
+    def _finish(self) -> None:
+        assert self._proc is not None
+        self.usage.wall_time = asyncio.get_running_loop().time() - self._started
+        self.usage.returncode = self._proc.returncode
+
+    async def _drain_stderr(self) -> None:
+        assert self._proc is not None and self._proc.stderr is not None
+        while True:
+            chunk = await self._proc.stderr.read(64 * 1024)
+            if not chunk:
+                return
+            self.usage.stderr_bytes += len(chunk)
+            self._stderr.extend(chunk)
+            if len(self._stderr) > self._max_stderr_bytes:
+                del self._stderr[: len(self._stderr) - self._max_stderr_bytes]
+
+    async def _sample_usage(self) -> None:
+        # 子进程由事件循环回收，拿不到 wait4 的 rusage，只能在运行期间定期读取 /proc
+        assert self._proc is not None
+        pid = self._proc.pid
+        while self._proc.returncode is None:
+            sample = _read_proc_usage(pid)
+            if sample is not None:
+                cpu_time, max_rss_kb = sample
+                self.usage.cpu_time = cpu_time
+                if max_rss_kb is not None:
+                    self.usage.max_rss_kb = max(self.usage.max_rss_kb or 0, max_rss_kb)
+            await asyncio.sleep(self._sample_interval)
+
+
+def _read_proc_usage(pid: int) -> Optional[tuple[float, Optional[int]]]:
+    """读取 /proc/<pid> 中的 CPU 时间与峰值内存，非 Linux 或进程已退出时返回 None。"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read().decode(errors="ignore")
+        with open(f"/proc/{pid}/status", "rb") as f:
+            status = f.read().decode(errors="ignore")
+    except OSError:
+        return None
+    # 进程名可能包含空格，从最后一个 ')' 之后开始按字段切分
+    fields = stat[stat.rfind(")") + 2 :].split()
+    try:
+        cpu_time = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (IndexError, ValueError):
+        return None
+    max_rss_kb: Optional[int] = None
+    for line in status.splitlines():
+        if line.startswith("VmHWM:"):
+            max_rss_kb = int(line.split()[1])
+            break
+    return cpu_time, max_rss_kb
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional
+
+"""工具执行进度：长耗时工具通过上下文中的回调上报进度，调用方按需订阅"""
+
+
+@dataclass
+class ToolProgress:
+    """一次进度上报，percent/remaining/etc 缺失时为 None。"""
+
+    tool: str
+    target: str
+    task: str
+    percent: Optional[float] = None
+    remaining: Optional[float] = None  # 预计剩余秒数
+    etc: Optional[float] = None  # 预计完成时间（Unix 时间戳）
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tool": self.tool,
+            "target": self.target,
+            "task": self.task,
+            "percent": self.percent,
+            "remaining": self.remaining,
+            "etc": self.etc,
+        }
+
+
+ProgressCallback = Callable[[ToolProgress], None]
+
+_callback: ContextVar[Optional[ProgressCallback]] = ContextVar(
+    "tool_progress_callback", default=None
+)
+
+
+@contextmanager
+def progress_reporter(callback: ProgressCallback) -> Iterator[None]:
+    """
+    在当前上下文中订阅工具进度。上下文变量会被之后创建的子任务继承，
+    因此工具内部并发扫描产生的进度也会送到同一个回调；回调需保持轻量且不能阻塞。
+    """
+    token = _callback.set(callback)
+    try:
+        yield
+    finally:
+        _callback.reset(token)
+
+
+def report_progress(progress: ToolProgress) -> None:
+    """上报一次进度，当前上下文没有订阅者时直接忽略。"""
+    callback = _callback.get()
+    if callback is not None:
+        callback(progress)
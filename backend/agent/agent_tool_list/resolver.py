@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import socket
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .. import telemetry
+from .base import ToolError
+
+"""异步 DNS 解析：按记录 TTL 缓存结果、合并并发的相同查询，批量目标并发解析"""
+
+try:  # aiodns 能拿到记录的 TTL，未安装时回退到 getaddrinfo（使用默认 TTL）
+    import aiodns  # type: ignore
+
+    AIODNS_ENABLED = True
+except ImportError:  # pragma: no cover - 取决于运行环境
+    aiodns = None
+    AIODNS_ENABLED = False
+
+
+DEFAULT_TTL = 300.0  # 拿不到 TTL 时的缓存时间（秒）
+NEGATIVE_TTL = 30.0  # 解析失败结果的缓存时间（秒）
+MIN_TTL = 5.0
+MAX_TTL = 3600.0
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_CONCURRENCY = 64  # 同时进行的 DNS 查询上限
+
+CacheKey = Tuple[str, int]
+
+DNS_LOOKUPS = telemetry.registry.counter(
+    "dns_lookups_total", "目标名称解析次数，按是否命中缓存区分", ("result",)
+)
+DNS_QUERY_SECONDS = telemetry.registry.histogram(
+    "dns_query_seconds", "实际发出的 DNS 查询耗时（不含缓存命中）", ("outcome",)
+)
+
+
+@dataclass
+class DnsAnswer:
+    """一次解析的结果，失败时 addresses 为空、error 有值。"""
+
+    name: str
+    addresses: List[str] = field(default_factory=list)
+    expires: float = 0.0
+    error: Optional[str] = None
+
+    def expired(self, now: float) -> bool:
+        return now >= self.expires
+
+
+def is_ip_address(value: str) -> bool:
+    try:
+        ipaddress.ip_address(value)
+    except ValueError:
+        return False
+    return True
+
+
+class DnsResolver:
+    """带 TTL 缓存的异步解析器，同一名称的并发查询只发出一次。"""
+
+    def __init__(
+        self,
+        *,
+        default_ttl: float = DEFAULT_TTL,
+        negative_ttl: float = NEGATIVE_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        use_aiodns: Optional[bool] = None,
+    ) -> None:
+        """
+        Args:
+            default_ttl: 无法获得记录 TTL 时（getaddrinfo 回退路径）的缓存秒数。
+            negative_ttl: 解析失败结果的缓存秒数，避免反复查询不存在的名称。
+            max_entries: 缓存条目上限，超出后淘汰最久未使用的条目。
+            max_concurrency: 同时进行的查询上限。
+            use_aiodns: 是否使用 aiodns，None 时在已安装的情况下使用。
+        """
+        if max_entries < 1 or max_concurrency < 1:
+            raise ValueError("max_entries 与 max_concurrency 必须大于 0")
+        if use_aiodns and not AIODNS_ENABLED:
+            raise ValueError("未安装 aiodns")
+        self._default_ttl = default_ttl
+        self._negative_ttl = negative_ttl
+        self._max_entries = max_entries
+        self._use_aiodns = AIODNS_ENABLED if use_aiodns is None else use_aiodns
+        self._aiodns: Any = None  # 首次查询时在运行中的事件循环上创建
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._cache: "OrderedDict[CacheKey, DnsAnswer]" = OrderedDict()
+        self._inflight: Dict[CacheKey, "asyncio.Future[DnsAnswer]"] = {}
+
+    async def resolve(self, name: str, *, family: int = socket.AF_INET) -> List[str]:
+        """返回名称对应的地址列表（IP 字面量原样返回），解析失败时抛出 ToolError。"""
+        if is_ip_address(name):
+            return [name]
+        answer = await self._lookup(name, family)
+        if answer.error is not None:
+            raise ToolError(f"无法解析目标 {name}：{answer.error}")
+        return list(answer.addresses)
+
+    async def resolve_many(
+        self, names: Sequence[str], *, family: int = socket.AF_INET
+    ) -> Dict[str, List[str]]:
+        """并发解析一批名称，返回成功解析的名称到地址列表的映射（失败的名称不出现在结果中）。"""
+        pending = list(dict.fromkeys(name for name in names if not is_ip_address(name)))
+        answers = await asyncio.gather(
+            *(self._lookup(name, family) for name in pending), return_exceptions=True
+        )
+        return {
+            name: list(answer.addresses)
+            for name, answer in zip(pending, answers)
+            if isinstance(answer, DnsAnswer) and answer.error is None
+        }
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """清除某个名称（或全部）的缓存。"""
+        if name is None:
+            self._cache.clear()
+            return
+        for key in [key for key in self._cache if key[0] == name.lower()]:
+            del self._cache[key]
+
+    async def _lookup(self, name: str, family: int) -> DnsAnswer:
+        key = (name.lower(), family)
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached is not None:
+            if not cached.expired(now):
+                self._cache.move_to_end(key)
+                DNS_LOOKUPS.inc(result="hit" if cached.error is None else "negative_hit")
+                return cached
+            del self._cache[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            DNS_LOOKUPS.inc(result="coalesced")
+            return await asyncio.shield(inflight)
+
+        DNS_LOOKUPS.inc(result="miss")
+        future: "asyncio.Future[DnsAnswer]" = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            answer = await self._query(name, family)
+        except BaseException as exc:
+            # 发起方被取消时，等待同一查询的调用方收到 ToolError，下次调用会重新查询
+            future.set_exception(exc if isinstance(exc, Exception) else ToolError("DNS 查询被取消"))
+            future.exception()  # 已处理，避免无人等待时的告警
+            raise
+        else:
+            future.set_result(answer)
+            self._store(key, answer)
+            return answer
+        finally:
+            del self._inflight[key]
+
+    def _store(self, key: CacheKey, answer: DnsAnswer) -> None:
+        self._cache[key] = answer
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+
+    async def _query(self, name: str, family: int) -> DnsAnswer:
+        async with self._slots:
+            with telemetry.span("dns_resolve", DNS_QUERY_SECONDS) as labels:
+                try:
+                    if self._use_aiodns:
+                        try:
+                            addresses, ttl = await self._query_aiodns(name, family)
+                        except ToolError:
+                            # aiodns 不读 /etc/hosts 与 resolv.conf 的 search 域，失败时交给系统解析器
+                            addresses, ttl = await self._query_system(name, family)
+                    else:
+                        addresses, ttl = await self._query_system(name, family)
+                except (OSError, ToolError) as exc:
+                    addresses, ttl, error = [], 0.0, str(exc)
+                else:
+                    error = None if addresses else "没有可用的地址记录"
+                labels["outcome"] = "ok" if error is None else "error"
+            now = time.monotonic()
+            if error is not None:
+                return DnsAnswer(name=name, expires=now + self._negative_ttl, error=error)
+            ttl = min(MAX_TTL, max(MIN_TTL, ttl))
+            return DnsAnswer(name=name, addresses=addresses, expires=now + ttl)
+
+    async def _query_aiodns(self, name: str, family: int) -> Tuple[List[str], float]:
+        if self._aiodns is None:
+            self._aiodns = aiodns.DNSResolver()
+        qtype = "AAAA" if family == socket.AF_INET6 else "A"
+        try:
+            records = await self._aiodns.query(name, qtype)
+        except aiodns.error.DNSError as exc:
+            raise ToolError(str(exc.args[-1] if exc.args else exc)) from exc
+        addresses = list(dict.fromkeys(record.host for record in records))
+        ttl = min((float(record.ttl) for record in records), default=self._default_ttl)
+        return addresses, ttl
+
+    async def _query_system(self, name: str, family: int) -> Tuple[List[str], float]:
+        # getaddrinfo 不返回 TTL，只能使用默认缓存时间
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            name, None, family=family, type=socket.SOCK_STREAM
+        )
+        addresses = list(dict.fromkeys(str(info[4][0]) for info in infos))
+        return addresses, self._default_ttl
+
+
+_default_resolver: Optional[DnsResolver] = None
+
+
+def get_resolver() -> DnsResolver:
+    """进程内共享的默认解析器，所有工具共用同一份 DNS 缓存。"""
+    global _default_resolver
+    if _default_resolver is None:
+        _default_resolver = DnsResolver()
+    return _default_resolver
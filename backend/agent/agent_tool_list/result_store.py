@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .base import BaseTool, ToolError, ToolResult
+
+"""工具完整结果的旁路存储：上下文中只放精简视图，完整内容通过句柄按需取回"""
+
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+FETCH_DEFAULT_LIMIT = 4000  # fetch_result 单次返回的默认字符数
+FETCH_MAX_LIMIT = 20000
+
+
+@dataclass
+class StoredResult:
+    """一条完整的工具结果。"""
+
+    handle: str
+    tool: str
+    content: str
+    created_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.content.encode("utf-8"))
+
+
+class ResultStore:
+    """按句柄保存完整工具结果的 LRU 存储，条目数与总字节数双重上限。"""
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries 必须大于 0")
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: "OrderedDict[str, StoredResult]" = OrderedDict()
+        self._bytes = 0
+
+    def put(self, tool: str, content: str) -> str:
+        """保存完整内容并返回句柄。"""
+        handle = f"res_{uuid.uuid4().hex[:12]}"
+        entry = StoredResult(
+            handle=handle, tool=tool, content=content, created_at=time.time()
+        )
+        self._entries[handle] = entry
+        self._bytes += entry.size
+        while len(self._entries) > 1 and (
+            len(self._entries) > self._max_entries or self._bytes > self._max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+        return handle
+
+    def get(self, handle: str) -> Optional[StoredResult]:
+        entry = self._entries.get(handle)
+        if entry is not None:
+            self._entries.move_to_end(handle)
+        return entry
+
+
+_default_store: Optional[ResultStore] = None
+
+
+def get_result_store() -> ResultStore:
+    """进程内共享的默认结果存储。"""
+    global _default_store
+    if _default_store is None:
+        _default_store = ResultStore()
+    return _default_store
+
+
+class FetchResultTool(BaseTool):
+    """按句柄分段读取被精简过的工具完整结果。"""
+
+    name = "fetch_result"
+    description = (
+        "读取之前工具调用的完整结果。工具结果过长时上下文中只有精简视图，"
+        "并附带 result_handle，需要细节时用该句柄分段获取原始内容。"
+    )
+    parameters: Dict[str, Any] = {
+        "type": "object",
+        "properties": {
+            "handle": {
+                "type": "string",
+                "description": "精简视图中给出的 result_handle。",
+            },
+            "offset": {
+                "type": "integer",
+                "minimum": 0,
+                "default": 0,
+                "description": "从完整内容的第几个字符开始读取。",
+            },
+            "limit": {
+                "type": "integer",
+                "minimum": 1,
+                "maximum": FETCH_MAX_LIMIT,
+                "default": FETCH_DEFAULT_LIMIT,
+                "description": "本次最多返回的字符数。",
+            },
+        },
+        "required": ["handle"],
+        "additionalProperties": False,
+    }
+
+    def __init__(self, store: Optional[ResultStore] = None) -> None:
+        self._store = store if store is not None else get_result_store()
+
+    async def run(
+        self, *, handle: str, offset: int = 0, limit: int = FETCH_DEFAULT_LIMIT
+    ) -> ToolResult:
+        entry = self._store.get(handle)
+        if entry is None:
+            raise ToolError(f"结果 {handle} 不存在或已过期，请重新执行原工具")
+        offset = max(0, offset)
+        limit = max(1, min(limit, FETCH_MAX_LIMIT))
+        chunk = entry.content[offset : offset + limit]
+        end = offset + len(chunk)
+        metadata = {
+            "handle": handle,
+            "tool": entry.tool,
+            "offset": offset,
+            "end": end,
+            "total": len(entry.content),
+        }
+        header = f"[{entry.tool} 结果 {handle}，字符 {offset}-{end} / {len(entry.content)}]"
+        return ToolResult(name=self.name, content=f"{header}\n{chunk}", metadata=metadata)
+
+    def context_view(self, result: ToolResult, *, limit: int) -> str:
+        # 本身就是按 limit 分段的原始内容，不再精简，避免循环套娃
+        return result.content
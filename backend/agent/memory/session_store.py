@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+"""基于 SQLite(WAL) 的会话持久化：消息增量追加写入，恢复时只加载摘要与尾部消息"""
+
+
+DEFAULT_SESSION_DB = Path(__file__).resolve().parents[2] / "data" / "sessions.db"
+SUMMARY_NAME_SUFFIX = "_history_summary"  # 历史摘要消息的 name 后缀
+
+
+@dataclass
+class StoredMessage:
+    """从存储中读出的一条消息。"""
+
+    seq: int
+    pos: int
+    role: str
+    content: str
+    name: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class SessionSnapshot:
+    """恢复会话所需的最小数据：system、最新摘要与尾部消息。"""
+
+    session_id: str
+    agent_name: str
+    system: Optional[StoredMessage]
+    summary: Optional[StoredMessage]
+    messages: List[StoredMessage] = field(default_factory=list)
+    max_seq: int = -1
+    max_pos: int = -1
+
+
+# (seq, pos, role, name, content, metadata)
+MessageRow = Tuple[int, int, str, Optional[str], str, Optional[Dict[str, Any]]]
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions ("
+    " id TEXT PRIMARY KEY,"
+    " agent_name TEXT NOT NULL,"
+    " system_prompt TEXT NOT NULL,"
+    " state TEXT,"
+    " created_at REAL NOT NULL,"
+    " updated_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS messages ("
+    " session_id TEXT NOT NULL,"
+    " seq INTEGER NOT NULL,"
+    " pos INTEGER NOT NULL,"
+    " role TEXT NOT NULL,"
+    " name TEXT,"
+    " content TEXT NOT NULL,"
+    " metadata TEXT,"
+    " created_at REAL NOT NULL,"
+    " deleted INTEGER NOT NULL DEFAULT 0,"
+    " PRIMARY KEY (session_id, seq))",
+    "CREATE INDEX IF NOT EXISTS idx_messages_live"
+    " ON messages (session_id, deleted, pos)",
+)
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """
+    会话存储。写操作进入队列，由后台线程批量提交，不阻塞事件循环；
+    被压缩/删除的消息只做标记，完整记录仍保留在库中。
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_SESSION_DB) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._writer = threading.Thread(
+            target=self._write_loop, name="session-store-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self._path), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---- 写入（异步排队） ----
+    def ensure_session(
+        self, session_id: str, *, agent_name: str, system_prompt: str
+    ) -> None:
+        self._queue.put(("session", session_id, agent_name, system_prompt))
+
+    def append(
+        self,
+        session_id: str,
+        seq: int,
+        *,
+        pos: Optional[int] = None,
+        role: str,
+        content: str,
+        name: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """追加一条消息，pos 缺省与 seq 相同；metadata 在写线程中序列化，入队后调用方不得再修改。"""
+        self._queue.put(
+            (
+                "append",
+                session_id,
+                (seq, seq if pos is None else pos, role, name, content, metadata, time.time()),
+            )
+        )
+
+    def sync(
+        self,
+        session_id: str,
+        *,
+        inserts: Sequence[MessageRow] = (),
+        moves: Sequence[Tuple[int, int]] = (),
+        deleted: Sequence[int] = (),
+    ) -> None:
+        """
+        在删除/替换/压缩之后只同步变化的部分：
+        inserts 为新消息 (seq, pos, role, name, content, metadata)，moves 为位置变化的 (seq, pos)，
+        deleted 为移出历史的 seq（只做标记）。metadata 同样在写线程中序列化。
+        """
+        if inserts or moves or deleted:
+            self._queue.put(
+                ("sync", session_id, list(inserts), list(moves), list(deleted), time.time())
+            )
+
+    def save_state(self, session_id: str, state: Dict[str, Any]) -> None:
+        self._queue.put(("state", session_id, _dumps(state)))
+
+    def flush(self) -> None:
+        """阻塞直到队列中的写操作全部提交（在事件循环中请用 asyncio.to_thread 调用）。"""
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        try:
+            while True:
+                op = self._queue.get()
+                batch = [op]
+                # 合并已排队的写操作，一次提交
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = False
+                try:
+                    with conn:
+                        for item in batch:
+                            if item is _STOP:
+                                stop = True
+                                continue
+                            self._apply(conn, item)
+                except sqlite3.Error:  # 单批写入失败不能让写线程退出
+                    logger.exception("会话存储写入失败，本批次已回滚")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _apply(conn: sqlite3.Connection, op: Tuple[Any, ...]) -> None:
+        kind, session_id = op[0], op[1]
+        now = time.time()
+        if kind == "session":
+            conn.execute(
+                "INSERT INTO sessions (id, agent_name, system_prompt, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET system_prompt = excluded.system_prompt,"
+                " updated_at = excluded.updated_at",
+                (session_id, op[2], op[3], now, now),
+            )
+        elif kind == "append":
+            seq, pos, role, name, content, metadata, created_at = op[2]
+            conn.execute(
+                "INSERT OR REPLACE INTO messages"
+                " (session_id, seq, pos, role, name, content, metadata, created_at, deleted)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (session_id, seq, pos, role, name, content, _dumps(metadata), created_at),
+            )
+        elif kind == "sync":
+            inserts, moves, deleted, created_at = op[2:]
+            conn.executemany(
+                "UPDATE messages SET deleted = 1 WHERE session_id = ? AND seq = ?",
+                [(session_id, seq) for seq in deleted],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO messages"
+                " (session_id, seq, pos, role, name, content, metadata, created_at, deleted)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                [
+                    (session_id, seq, pos, role, name, content, _dumps(metadata), created_at)
+                    for seq, pos, role, name, content, metadata in inserts
+                ],
+            )
+            conn.executemany(
+                "UPDATE messages SET pos = ? WHERE session_id = ? AND seq = ?",
+                [(pos, session_id, seq) for seq, pos in moves],
+            )
+        elif kind == "state":
+            conn.execute(
+                "UPDATE sessions SET state = ? WHERE id = ?", (op[2], session_id)
+            )
+        conn.execute(
+            "UPDATE sessions SET updated_at = ? WHERE id = ?", (now, session_id)
+        )
+
+    # ---- 读取（同步，仅在恢复会话时调用） ----
+    def load_session(self, session_id: str, *, tail: int = 200) -> Optional[SessionSnapshot]:
+        """读取会话的 system、最新摘要与最近 tail 条消息，会话不存在时返回 None。"""
+        self.flush()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT agent_name FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            agent_name = row[0]
+            columns = "seq, pos, role, name, content, metadata"
+            system = conn.execute(
+                f"SELECT {columns} FROM messages WHERE session_id = ? AND deleted = 0"
+                " AND role = 'system' ORDER BY pos LIMIT 1",
+                (session_id,),
+            ).fetchone()
+            summary = conn.execute(
+                f"SELECT {columns} FROM messages WHERE session_id = ? AND deleted = 0"
+                " AND role != 'system' AND name GLOB ? ORDER BY pos DESC LIMIT 1",
+                (session_id, f"*{SUMMARY_NAME_SUFFIX}"),
+            ).fetchone()
+            tail_rows = conn.execute(
+                f"SELECT {columns} FROM messages WHERE session_id = ? AND deleted = 0"
+                " AND role != 'system' AND (name IS NULL OR name NOT GLOB ?)"
+                " ORDER BY pos DESC LIMIT ?",
+                (session_id, f"*{SUMMARY_NAME_SUFFIX}", tail),
+            ).fetchall()
+            max_seq, max_pos = conn.execute(
+                "SELECT COALESCE(MAX(seq), -1), COALESCE(MAX(pos), -1)"
+                " FROM messages WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        return SessionSnapshot(
+            session_id=session_id,
+            agent_name=agent_name,
+            system=_to_message(system),
+            summary=_to_message(summary),
+            messages=[_to_message(item) for item in reversed(tail_rows)],  # type: ignore[misc]
+            max_seq=max_seq,
+            max_pos=max_pos,
+        )
+
+    def load_state(self, session_id: str) -> Optional[Dict[str, Any]]:
+        self.flush()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT state FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+
+def _dumps(value: Optional[Dict[str, Any]]) -> Optional[str]:
+    if value is None:
+        return None
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _to_message(row: Optional[Tuple[Any, ...]]) -> Optional[StoredMessage]:
+    if row is None:
+        return None
+    seq, pos, role, name, content, metadata = row
+    return StoredMessage(
+        seq=seq,
+        pos=pos,
+        role=role,
+        name=name,
+        content=content,
+        metadata=json.loads(metadata) if metadata else None,
+    )
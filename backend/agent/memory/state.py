@@ -1,7 +1,23 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional, Dict, Any
 
+from agent.agent_tool_list.nmap.inventory import HostInventory
+
 @dataclass
 class State:
     target_ip_info_list: Optional[Dict[str, Any]] = None
-    
\ No newline at end of file
+    inventory: HostInventory = field(default_factory=HostInventory)  # 跨模式合并的主机/端口清单
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可 JSON 序列化的字典，供 SessionStore.save_state 持久化"""
+        return {
+            "target_ip_info_list": self.target_ip_info_list,
+            "inventory": self.inventory.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "State":
+        return cls(
+            target_ip_info_list=data.get("target_ip_info_list"),
+            inventory=HostInventory.from_dict(data.get("inventory") or {}),
+        )
@@ -2,6 +2,7 @@ from __future__ import annotations
 import asyncio
 import sys
 from pathlib import Path
+from typing import Dict, List, Optional
 
 # 确保可以在任意目录执行此脚本
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
@@ -9,7 +10,64 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
 from agent.tool.agent_talk import AgentTalker, ChatHistory, ChatMessage  # type: ignore  # noqa: E402
-from agent.agent_tool_list.nmap import NmapTool  # type: ignore  # noqa: E402
+from agent.agent_tool_list import FetchResultTool, Tools  # type: ignore  # noqa: E402
+from agent.agent_tool_list.nmap import HostInventory, NmapTool  # type: ignore  # noqa: E402
+from agent.memory.session_store import SessionStore  # type: ignore  # noqa: E402
+
+
+INFO_AGENT_NAME = "agent_info"
+INFO_AGENT_PROMPT = (
+    "你是一名信息收集 Agent，负责对授权目标进行资产与端口探测。"
+    "根据用户给出的目标选择合适的 nmap 扫描模式，先做主机发现与快速扫描，"
+    "再针对开放端口做服务版本探测，最后用简洁的中文汇总发现的资产、端口与服务。"
+)
+
+
+def create_info_agent(
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    *,
+    session_store: Optional[SessionStore] = None,
+    session_id: Optional[str] = None,
+) -> AgentTalker:
+    """创建信息收集 Agent 实例，提供 session_store 时可按 session_id 恢复历史。"""
+    return AgentTalker(
+        INFO_AGENT_NAME,
+        INFO_AGENT_PROMPT,
+        chat_history=chat_history,
+        session_store=session_store,
+        session_id=session_id,
+    )
+
+
+async def open_info_agent(
+    *, session_store: Optional[SessionStore], session_id: str
+) -> AgentTalker:
+    """异步创建信息收集 Agent，在线程中读取存储恢复会话历史，不阻塞事件循环。"""
+    return await AgentTalker.open(
+        INFO_AGENT_NAME,
+        INFO_AGENT_PROMPT,
+        session_store=session_store,
+        session_id=session_id,
+    )
+
+
+def create_info_tools(*, inventory: Optional[HostInventory] = None) -> Tools:
+    """信息收集 Agent 可用的工具集合，扫描结果合并进 inventory（未提供时由工具自行维护）。"""
+    return Tools(NmapTool(inventory=inventory), FetchResultTool())
+
+
+_shared_info_tools: Optional[Tools] = None
+
+
+def get_info_tools() -> Tools:
+    """
+    进程内共享的工具集合，聊天与后台任务共用同一份扫描缓存与并发配额；
+    主机清单由调用方用 inventory_scope 按会话/任务指定。
+    """
+    global _shared_info_tools
+    if _shared_info_tools is None:
+        _shared_info_tools = create_info_tools()
+    return _shared_info_tools
 
 
 async def main() -> None:
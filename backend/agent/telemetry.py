@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+"""轻量遥测：span 计时写入直方图与当前轮次的 trace，指标按 Prometheus 文本格式导出"""
+
+
+# 秒级耗时的默认分桶，覆盖从毫秒级解析到数十分钟的全端口扫描
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+    30.0, 60.0, 120.0, 300.0, 600.0, 1800.0,
+)
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        self._lock = threading.Lock()  # 解析池等线程中也可能上报
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器。"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """累计分桶直方图，每组标签各自维护桶计数、总和与样本数。"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self._buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        # 每组标签：[各桶计数（非累计）..., +Inf 桶计数], 总和
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                key, ([0] * (len(self._buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(
+                (key, list(counts), total[0]) for key, (counts, total) in self._values.items()
+            )
+        lines: List[str] = []
+        bounds = [*self._buckets, math.inf]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """按名称登记指标；同名重复登记返回已有实例，便于各模块在导入时声明自己的指标。"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+            raise ValueError(f"指标 {metric.name} 已以不同的类型或标签登记")
+        return existing
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        """Prometheus 文本格式（0.0.4）。"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda item: item.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+@dataclass
+class SpanRecord:
+    """trace 中的一个 span，start 为相对所在轮次开始的秒数。"""
+
+    name: str
+    start: float
+    duration: float
+    labels: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class TurnTrace:
+    """一轮对话内记录的全部 span（并发的工具调用各自记录，互相重叠）。"""
+
+    agent: str
+    kind: str
+    started: float = field(default_factory=time.perf_counter)
+    duration: Optional[float] = None
+    spans: List[SpanRecord] = field(default_factory=list)
+
+    def breakdown(self) -> Dict[str, Tuple[int, float]]:
+        """按 span 名称汇总次数与累计耗时。"""
+        totals: Dict[str, Tuple[int, float]] = {}
+        for item in self.spans:
+            count, total = totals.get(item.name, (0, 0.0))
+            totals[item.name] = (count + 1, total + item.duration)
+        return totals
+
+    def summary(self) -> str:
+        parts = [
+            f"{name} x{count} {total:.3f}s"
+            for name, (count, total) in sorted(self.breakdown().items())
+        ]
+        duration = self.duration if self.duration is not None else 0.0
+        return f"{self.agent}/{self.kind} {duration:.3f}s: " + ", ".join(parts)
+
+
+_trace: ContextVar[Optional[TurnTrace]] = ContextVar("turn_trace", default=None)
+
+TURN_SECONDS = registry.histogram(
+    "agent_turn_seconds", "单轮对话（含全部模型请求与工具调用）耗时", ("agent", "kind", "outcome")
+)
+
+
+def _outcome(exc_type: Optional[type]) -> str:
+    if exc_type is None:
+        return "ok"
+    if issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    return "error"
+
+
+@contextmanager
+def turn_trace(agent: str, kind: str) -> Iterator[TurnTrace]:
+    """
+    记录一轮对话：期间（含其创建的子任务中）的 span 都归入同一 trace，
+    结束时写入 agent_turn_seconds 并在 DEBUG 日志中输出耗时分解。
+    """
+    trace = TurnTrace(agent=agent, kind=kind)
+    token = _trace.set(trace)
+    exc_type: Optional[type] = None
+    try:
+        yield trace
+    except BaseException as exc:
+        exc_type = type(exc)
+        raise
+    finally:
+        trace.duration = time.perf_counter() - trace.started
+        _trace.reset(token)
+        TURN_SECONDS.observe(trace.duration, agent=agent, kind=kind, outcome=_outcome(exc_type))
+        logger.debug("turn trace %s", trace.summary())
+
+
+def current_trace() -> Optional[TurnTrace]:
+    return _trace.get()
+
+
+def record_span(
+    name: str,
+    duration: float,
+    *,
+    started: Optional[float] = None,
+    labels: Optional[Dict[str, str]] = None,
+) -> None:
+    """把已经测得的耗时记入当前 trace（started 为 perf_counter 时刻，缺省按刚结束计算）。"""
+    trace = _trace.get()
+    if trace is None:
+        return
+    if started is None:
+        started = time.perf_counter() - duration
+    trace.spans.append(
+        SpanRecord(
+            name=name,
+            start=started - trace.started,
+            duration=duration,
+            labels=dict(labels or {}),
+        )
+    )
+
+
+@contextmanager
+def span(
+    name: str, histogram: Optional[Histogram] = None, **labels: str
+) -> Iterator[Dict[str, str]]:
+    """
+    计时一段代码：耗时记入当前 trace，并按标签写入 histogram。
+    产出的标签字典可在代码块内补充；直方图带 outcome 标签而调用方未设置时，
+    按是否抛出异常自动填写 ok/error/cancelled。
+    """
+    started = time.perf_counter()
+    exc_type: Optional[type] = None
+    try:
+        yield labels
+    except BaseException as exc:
+        exc_type = type(exc)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        if histogram is not None:
+            if "outcome" in histogram.labelnames and "outcome" not in labels:
+                labels["outcome"] = _outcome(exc_type)
+            histogram.observe(duration, **labels)
+        record_span(name, duration, started=started, labels=labels)
@@ -1,13 +1,139 @@
 from __future__ import annotations
 
+import asyncio
 import copy
+import functools
 import json
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Sequence
+import logging
+import time
+import uuid
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from openai import AsyncOpenAI, BadRequestError
+from agent import telemetry
+from agent.agent_tool_list import ToolError, ToolProgress, Tools, progress_reporter
+from agent.memory.session_store import SessionSnapshot, SessionStore
+from . import basic_tool, client_pool, rate_limit
+
+
+# 各模型可用的上下文 token 预算，未列出的模型使用 DEFAULT_CONTEXT_BUDGET
+MODEL_CONTEXT_BUDGETS: Dict[str, int] = {
+    "deepseek-chat": 64000,
+    "deepseek-reasoner": 64000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+DEFAULT_CONTEXT_BUDGET = 32000
+MESSAGE_TOKEN_OVERHEAD = 4  # 每条消息的角色/分隔符开销
+SUMMARY_INPUT_CHAR_LIMIT = 2000  # 送去摘要时单条消息保留的最大字符数
+BACKGROUND_COMPACT_LEAD = 0.8  # 达到压缩阈值的该比例时即在后台提前开始摘要
+COMPLETION_TOKEN_RESERVE = 1024  # 未指定 max_tokens 时，限流为输出预留的 token 数
+HISTORY_METADATA_MAX_CHARS = 200  # 写入历史的工具结果元信息中单个字符串字段的最大长度
+
+logger = logging.getLogger(__name__)
+
+MODEL_REQUEST_SECONDS = telemetry.registry.histogram(
+    "agent_model_request_seconds",
+    "模型请求耗时（含限流等待与重试，流式请求计到流结束）",
+    ("model", "stream", "outcome"),
+)
+MODEL_TOKENS = telemetry.registry.counter(
+    "agent_model_tokens_total", "模型响应中 usage 报告的 token 用量", ("model", "type")
+)
+CONTEXT_COMPRESS_SECONDS = telemetry.registry.histogram(
+    "agent_context_compress_seconds", "请求前规划历史压缩与截取消息窗口的耗时", ("agent",)
+)
+HISTORY_SUMMARY_SECONDS = telemetry.registry.histogram(
+    "agent_history_summary_seconds", "后台增量摘要耗时", ("agent", "outcome")
+)
+TOOL_BATCH_SECONDS = telemetry.registry.histogram(
+    "agent_tool_batch_seconds", "同一轮全部工具调用（并发执行）的总耗时", ("agent", "outcome")
+)
+TOOL_CALL_SECONDS = telemetry.registry.histogram(
+    "agent_tool_call_seconds", "单个工具调用耗时", ("tool", "outcome")
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本 token 数：CJK 字符约 1 token，其余字符约 4 个 1 token。"""
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+# ChatMessage 角色到 OpenAI 角色的映射
+_OPENAI_ROLE_MAP: Dict[str, str] = {
+    "system": "system",
+    "user": "user",
+    "agent": "assistant",
+    "tool_call": "assistant",
+    "tool_result": "assistant",
+}
+
+
+def _usage_tokens(raw_response: Any) -> Optional[int]:
+    """读取非流式响应的实际 token 用量，服务端未返回时为 None。"""
+    usage = getattr(raw_response.parse(), "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+def _record_usage(model: str, usage: Any) -> None:
+    """把响应中的 usage 累加到 token 计数器，服务端未返回 usage 时忽略。"""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            MODEL_TOKENS.inc(value, model=model, type=kind[: -len("_tokens")])
+
+
+def _history_metadata(metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    工具结果写入历史时只保留标量字段（如 result_handle、target、mode、error），
+    结构化的大字段留在 ToolResult.data 与结果存储中，避免随每条消息拷贝与持久化。
+    """
+    if not metadata:
+        return None
+    compact: Dict[str, Any] = {}
+    for key, value in metadata.items():
+        if isinstance(value, str):
+            compact[key] = value[:HISTORY_METADATA_MAX_CHARS]
+        elif value is None or isinstance(value, (bool, int, float)):
+            compact[key] = value
+    return compact or None
+
+
+def _traced_turn(kind: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """把一次对话方法的调用记录为一轮 turn trace。"""
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(func)
+        async def wrapper(self: "AgentTalker", *args: Any, **kwargs: Any) -> Any:
+            with telemetry.turn_trace(self._agent_name, kind):
+                return await func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
 
-from openai import AsyncOpenAI
-from agent.agent_tool_list import Tools, ToolError
-from . import basic_tool
+def _traced_stream(kind: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """_traced_turn 的流式版本：trace 覆盖整个异步生成器的迭代过程。"""
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(func)
+        async def wrapper(
+            self: "AgentTalker", *args: Any, **kwargs: Any
+        ) -> AsyncIterator[Dict[str, Any]]:
+            with telemetry.turn_trace(self._agent_name, kind):
+                async with aclosing(func(self, *args, **kwargs)) as events:
+                    async for event in events:
+                        yield event
+
+        return wrapper
+
+    return decorator
 
 
 def _validate_agent_name(name: str) -> None:
@@ -15,39 +141,48 @@ def _validate_agent_name(name: str) -> None:
         raise ValueError("agent_name 必须以 'agent' 开头")
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ChatMessage:
-    """定义消息格式:完成存储、clone、格式转换"""
+    """定义消息格式:完成存储、格式转换;消息不可变,读取时直接共享同一对象"""
     role: str  # 消息角色（system/user/agent/tool_call/tool_result）
     content: str
     name: Optional[str] = None  # 消息名称（如agent_main）
-    metadata: Optional[Dict[str, Any]] = None  # 元信息(保存额外的识别信息)
+    metadata: Optional[Dict[str, Any]] = None  # 元信息(保存额外的识别信息,写入后视为只读)
+    # 惰性计算并缓存的 openai 格式与 token 估算，消息不可变因此只需计算一次
+    _payload: Optional[Dict[str, Any]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _tokens: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+    # 在会话存储中的序号，由所属 ChatHistory 写入后分配
+    _seq: Optional[int] = field(default=None, init=False, repr=False, compare=False)
 
     def clone(self) -> "ChatMessage":
-        """深拷贝本消息对象"""
-        return ChatMessage(
-            role = self.role,
-            content = self.content,
-            name = self.name,
-            metadata = copy.deepcopy(self.metadata) if self.metadata else None,
-        )
+        """消息不可变,直接返回自身;保留该方法以兼容旧调用"""
+        return self
 
     def to_openai_payload(self) -> Dict[str, Any]:
-        """把本消息对象转为openai可用格式"""
-        role_map = {
-            "system": "system",
-            "user": "user",
-            "agent": "assistant",
-            "tool_call": "assistant",
-            "tool_result": "assistant",
-        }
-        payload: Dict[str, Any] = {
-            "role": role_map.get(self.role, "user"),
-            "content": self.content,
-        }
-        if self.name:
-            payload["name"] = self.name
-        return payload
+        """把本消息对象转为openai可用格式(结果被缓存共享,调用方不要修改)"""
+        if self._payload is None:
+            payload: Dict[str, Any] = {
+                "role": _OPENAI_ROLE_MAP.get(self.role, "user"),
+                "content": self.content,
+            }
+            if self.name:
+                payload["name"] = self.name
+            object.__setattr__(self, "_payload", payload)
+        return self._payload  # type: ignore[return-value]
+
+    @property
+    def token_count(self) -> int:
+        """估算的 token 数（含消息开销），首次访问后缓存"""
+        if self._tokens is None:
+            object.__setattr__(
+                self, "_tokens", estimate_tokens(self.content) + MESSAGE_TOKEN_OVERHEAD
+            )
+        return self._tokens  # type: ignore[return-value]
+
+
+_NOT_LOADED: Any = object()  # ChatHistory 未传入快照时的标记，与“会话不存在”（None）区分
 
 
 class ChatHistory:
@@ -59,20 +194,170 @@ class ChatHistory:
         agent_name: str,  # 使用本次消息列表的agent的名字
         system_prompt: str,
         initial_messages: Optional[Sequence[Dict[str, Any]]] = None,
+        store: Optional[SessionStore] = None,
+        session_id: Optional[str] = None,
+        resume_tail: int = 200,
+        snapshot: Any = _NOT_LOADED,
     ) -> None:
+        """
+        Args:
+            store: 可选的会话存储，提供时每条消息写入后增量持久化。
+            session_id: 会话 ID；存储中已存在该会话时从中恢复（摘要 + 最近 resume_tail 条消息）。
+            resume_tail: 恢复会话时加载的尾部消息条数上限。
+            snapshot: 已读取的会话快照（None 表示会话不存在）；未提供时在构造函数中同步读取存储，
+                会阻塞调用线程，在事件循环中请先在线程中读取（见 AgentTalker.open）。
+        """
         _validate_agent_name(agent_name)
         self._agent_name = agent_name
         self._system_prompt = system_prompt
         self._messages: List[ChatMessage] = []
-        self._add_message(role="system", content=system_prompt, name=self._agent_name)
+        # 按角色、按 (角色, 名称) 的索引，保证筛选与取最新消息无需线性扫描
+        self._by_role: Dict[str, List[ChatMessage]] = {}
+        self._by_role_name: Dict[Tuple[str, Optional[str]], List[ChatMessage]] = {}
+        self._version = 0  # 除追加以外的任何修改都会递增，用于判断后台压缩结果是否仍然有效
+        # 持久化：存储序号记录在消息的 _seq 上，_stored_pos 为存储中存活消息的位置（seq -> pos）
+        self._store = store
+        self._session_id = session_id or (uuid.uuid4().hex if store else None)
+        self._next_seq = 0
+        self._next_pos = 0
+        self._stored_pos: Dict[int, int] = {}
+        if snapshot is _NOT_LOADED:
+            snapshot = self._load_snapshot(resume_tail)
+        if not self._resume(snapshot):
+            if self._store is not None and self._session_id is not None:
+                self._store.ensure_session(
+                    self._session_id,
+                    agent_name=self._agent_name,
+                    system_prompt=self._system_prompt,
+                )
+            self._add_message(
+                role="system", content=system_prompt, name=self._agent_name
+            )
         if initial_messages:
             self._extend_from_raw(initial_messages)
     # ---- 基础操作 ----
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def session_id(self) -> Optional[str]:
+        return self._session_id
+
+    def _load_snapshot(self, tail: int) -> Optional[SessionSnapshot]:
+        if self._store is None or self._session_id is None:
+            return None
+        return self._store.load_session(self._session_id, tail=tail)
+
+    def _resume(self, snapshot: Optional[SessionSnapshot]) -> bool:
+        """从快照恢复会话，只包含 system、最新摘要与尾部消息；会话不存在时返回 False。"""
+        if self._store is None or self._session_id is None or snapshot is None:
+            return False
+
+        self._next_seq = snapshot.max_seq + 1
+        self._next_pos = snapshot.max_pos + 1
+        stored = [snapshot.summary, *snapshot.messages]
+        # system_prompt 永远以入参为准，内容变化时作为新消息写入，旧 system 随后标记为已删除
+        system = snapshot.system
+        if system is not None and system.content == self._system_prompt:
+            stored.insert(0, system)
+        else:
+            if system is not None:
+                self._stored_pos[system.seq] = system.pos
+            self._messages.append(
+                ChatMessage(role="system", content=self._system_prompt, name=self._agent_name)
+            )
+        for item in stored:
+            if item is None:
+                continue
+            message = ChatMessage(
+                role=item.role, content=item.content, name=item.name, metadata=item.metadata
+            )
+            object.__setattr__(message, "_seq", item.seq)
+            self._stored_pos[item.seq] = item.pos
+            self._messages.append(message)
+        # 只同步已加载的消息，未加载的更早消息保持原样
+        self._reindex()
+        return True
+
+    def _sync_store(self) -> None:
+        """
+        把非追加类修改同步到存储，只发送变化：新消息、位置变化的消息与移出历史的消息。
+        位置只需保持递增，原位置仍有序时沿用，否则顺延到前一条之后。
+        """
+        if self._store is None or self._session_id is None:
+            return
+        inserts = []
+        moves = []
+        positions: Dict[int, int] = {}
+        prev = -1
+        for index, message in enumerate(self._messages):
+            seq = message._seq
+            if seq is not None and seq not in self._stored_pos:
+                # 来自其他会话的消息对象：复制一份再分配本会话的序号，不改动原对象
+                message = ChatMessage(
+                    role=message.role,
+                    content=message.content,
+                    name=message.name,
+                    metadata=message.metadata,
+                )
+                self._messages[index] = message
+                seq = None
+            old = self._stored_pos.get(seq) if seq is not None else None
+            pos = old if old is not None and old > prev else prev + 1
+            if seq is None:
+                seq = self._next_seq
+                self._next_seq += 1
+                object.__setattr__(message, "_seq", seq)
+                inserts.append(
+                    (seq, pos, message.role, message.name, message.content, message.metadata)
+                )
+            elif pos != old:
+                moves.append((seq, pos))
+            positions[seq] = pos
+            prev = pos
+        deleted = [seq for seq in self._stored_pos if seq not in positions]
+        self._stored_pos = positions
+        self._next_pos = max(self._next_pos, prev + 1)
+        self._store.sync(self._session_id, inserts=inserts, moves=moves, deleted=deleted)
+
     async def get_messages(self) -> List[ChatMessage]:
-        return [msg.clone() for msg in self._messages]
+        """返回消息列表的浅拷贝,消息对象本身不可变,无需逐条克隆"""
+        return list(self._messages)
 
     async def overwrite(self, new_messages: Sequence[ChatMessage]) -> None:
-        self._messages = [msg.clone() for msg in new_messages]
+        self._messages = list(new_messages)
+        self._reindex()
+
+    async def replace_range(
+        self,
+        start: int,
+        stop: int,
+        replacement: Sequence[ChatMessage],
+        *,
+        expected_version: int,
+    ) -> bool:
+        """把 [start, stop) 区间替换为 replacement；期间历史被改写过（version 变化）时放弃并返回 False。"""
+        if expected_version != self._version or stop > len(self._messages):
+            return False
+        self._messages[start:stop] = list(replacement)
+        self._reindex()
+        return True
+
+    def _index_message(self, message: ChatMessage) -> None:
+        self._by_role.setdefault(message.role, []).append(message)
+        self._by_role_name.setdefault((message.role, message.name), []).append(
+            message
+        )
+
+    def _reindex(self) -> None:
+        """非追加类修改（删除/替换）后重建索引并递增版本号"""
+        self._sync_store()  # 可能替换来自其他会话的消息对象，需先于建索引
+        self._by_role = {}
+        self._by_role_name = {}
+        for message in self._messages:
+            self._index_message(message)
+        self._version += 1
 
     def _extend_from_raw(self, raw_messages: Sequence[Dict[str, Any]]) -> None:
         """初始化或覆盖时载入历史消息,仅采纳消息部分,system_prompt 永远以入参为准"""
@@ -112,8 +397,30 @@ class ChatHistory:
         name: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
     ) -> ChatMessage:
-        message = ChatMessage(role=role, content=content, name=name, metadata=metadata)
+        # 写入时拷贝一次元信息，之后的读取全部共享
+        message = ChatMessage(
+            role=role,
+            content=content,
+            name=name,
+            metadata=copy.deepcopy(metadata) if metadata else None,
+        )
         self._messages.append(message)
+        self._index_message(message)
+        if self._store is not None and self._session_id is not None:
+            seq, pos = self._next_seq, self._next_pos
+            self._next_seq += 1
+            self._next_pos += 1
+            object.__setattr__(message, "_seq", seq)
+            self._stored_pos[seq] = pos
+            self._store.append(
+                self._session_id,
+                seq,
+                pos=pos,
+                role=role,
+                content=content,
+                name=name,
+                metadata=message.metadata,
+            )
         return message
 
     def _filter_messages(
@@ -122,13 +429,17 @@ class ChatHistory:
         role: str,
         name: Optional[str] = None,
     ) -> List[ChatMessage]:
-        return [
-            msg.clone()
-            for msg in self._messages
-            if msg.role == role and (name is None or msg.name == name)
-        ]
+        if name is None:
+            return list(self._by_role.get(role, ()))
+        return list(self._by_role_name.get((role, name), ()))
 
     def _delete_messages(self, *, role: str, name: Optional[str] = None) -> None:
+        try:
+            self._remove_messages(role=role, name=name)
+        finally:
+            self._reindex()
+
+    def _remove_messages(self, *, role: str, name: Optional[str] = None) -> None:
         if role == "system":
             # 保证至少存在初始 system 消息
             self._messages = [
@@ -159,13 +470,11 @@ class ChatHistory:
         role: str,
         name: Optional[str] = None,
     ) -> Optional[ChatMessage]:
-        for msg in reversed(self._messages):
-            if msg.role != role:
-                continue
-            if name is not None and msg.name != name:
-                continue
-            return msg.clone()
-        return None
+        if name is None:
+            bucket = self._by_role.get(role)
+        else:
+            bucket = self._by_role_name.get((role, name))
+        return bucket[-1] if bucket else None
 
     # ---- system ----
     async def update_system_msg(self, content: str) -> ChatMessage:
@@ -177,6 +486,7 @@ class ChatHistory:
                     content=content,
                     name=self._agent_name,
                 )
+                self._reindex()
                 return self._messages[idx]
 
         return self._add_message(
@@ -274,6 +584,7 @@ class ChatHistory:
         self._messages = [
             msg for msg in self._messages if msg.role == "system"
         ]
+        self._reindex()
 
     async def replace_with_external(
         self, raw_messages: Sequence[Dict[str, Any]]
@@ -285,6 +596,7 @@ class ChatHistory:
                 name=self._agent_name,
             )
         ]
+        self._reindex()
         self._extend_from_raw(raw_messages)
 
     async def total_count(self) -> int:
@@ -301,6 +613,14 @@ class AgentTalker:
         system_prompt: str,
         chat_history: Optional[List[Dict[str, str]]] = None,
         max_chat_len: int = 30,
+        max_parallel_tool_calls: int = 4,
+        tool_call_timeout: Optional[float] = None,
+        context_budget: Optional[int] = None,
+        compact_ratio: float = 0.75,
+        keep_recent: int = 6,
+        session_store: Optional[SessionStore] = None,
+        session_id: Optional[str] = None,
+        session_snapshot: Any = _NOT_LOADED,
     ) -> None:
         """
         初始化配置参数
@@ -310,65 +630,181 @@ class AgentTalker:
             system_prompt: 必填，作为整个会话的第一条 system 消息。
             chat_history: 可选的历史消息列表（不包含 system 消息），会被追加在 system 消息之后。
             max_chat_len: 触发历史压缩的最大消息条数。
+            context_budget: 上下文 token 预算，None 时按模型从 MODEL_CONTEXT_BUDGETS 选取。
+            compact_ratio: 估算 token 超过预算的该比例时触发压缩。
+            keep_recent: 压缩时原样保留的最近消息条数（含最近的工具结果）。
+            session_store: 可选的会话存储，提供时聊天历史增量持久化。
+            session_id: 会话 ID，存储中已有该会话时自动恢复历史。
+            session_snapshot: 已读取的会话快照，未提供时同步读取存储（在事件循环中请使用 AgentTalker.open）。
+            max_parallel_tool_calls: 同一轮中并发执行的工具调用上限。
+            tool_call_timeout: 单个工具调用的超时时间（秒），None 表示不限制。
         """
+        if max_parallel_tool_calls < 1:
+            raise ValueError("max_parallel_tool_calls 必须大于 0")
         self._client: Optional[AsyncOpenAI] = None
-        self._config: Optional[basic_tool.AgentConfig] = None
-        self._refresh()  # 加载配置
+        self._client_key: Optional[Tuple[str, str]] = None  # 在 client_pool 中持有引用的配置
+        self._stream_usage_supported = True  # 服务端拒绝 stream_options 后置为 False
+        self._config: Optional[basic_tool.AgentConfig] = None  # 首次调用时由 _ensure_ready 加载
         _validate_agent_name(agent_name)
         self._agent_name = agent_name
         self._system_prompt = system_prompt
         self._max_chat_len = max_chat_len
+        self._context_budget = context_budget
+        self._compact_ratio = compact_ratio
+        self._keep_recent = max(1, keep_recent)
+        self._compaction_task: Optional[asyncio.Task[None]] = None
+        self._max_parallel_tool_calls = max_parallel_tool_calls
+        self._tool_call_timeout = tool_call_timeout
         self._chat_history = ChatHistory(
             agent_name=self._agent_name,
             system_prompt=self._system_prompt,
             initial_messages=chat_history,
+            store=session_store,
+            session_id=session_id,
+            snapshot=session_snapshot,
+        )
+
+    @classmethod
+    async def open(
+        cls,
+        agent_name: str,
+        system_prompt: str,
+        *,
+        session_store: Optional[SessionStore] = None,
+        session_id: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "AgentTalker":
+        """在线程中读取会话快照后再构造，供异步路由恢复会话使用。"""
+        snapshot: Optional[SessionSnapshot] = None
+        if session_store is not None and session_id is not None:
+            snapshot = await asyncio.to_thread(session_store.load_session, session_id)
+        return cls(
+            agent_name,
+            system_prompt,
+            session_store=session_store,
+            session_id=session_id,
+            session_snapshot=snapshot,
+            **kwargs,
         )
 
 
     async def _refresh(self) -> None:
-        """重新加载配置并实例化客户端"""
-        self._config = await basic_tool.load_config()
-        self._client = AsyncOpenAI(
-            api_key = self._config.api_key,
-            base_url = self._config.base_url,
+        """强制重新读取配置并切换客户端"""
+        basic_tool.config_service.invalidate()
+        await self._apply_config(await basic_tool.get_config())
+
+    async def _apply_config(self, config: basic_tool.AgentConfig) -> None:
+        """配置发生变化时一次性替换配置与客户端"""
+        client = client_pool.acquire_client(config.base_url, config.api_key)
+        rate_limit.get_limiter(config.base_url, config.model_name).configure(
+            requests_per_minute=config.requests_per_minute,
+            tokens_per_minute=config.tokens_per_minute,
         )
-
-    async def _compress_if_needed(
-        self, messages: List[ChatMessage]
-    ) -> List[ChatMessage]:
+        previous = self._client_key
+        self._client, self._config = client, config
+        self._client_key = (config.base_url, config.api_key)
+        # 交还旧配置的引用；其他实例或在途请求仍在使用时，客户端要等最后一个引用释放才关闭
+        if previous is not None:
+            await client_pool.release_client(*previous)
+
+    @property
+    def session_id(self) -> Optional[str]:
+        return self._chat_history.session_id
+
+    @property
+    def _summary_name(self) -> str:
+        return f"{self._agent_name}_history_summary"
+
+    def _budget_tokens(self) -> int:
+        if self._context_budget is not None:
+            return self._context_budget
+        model_name = self._config.model_name if self._config is not None else ""
+        return MODEL_CONTEXT_BUDGETS.get(model_name, DEFAULT_CONTEXT_BUDGET)
+
+    @staticmethod
+    def _message_tokens(message: ChatMessage) -> int:
+        return message.token_count
+
+    def _trigger_tokens(self) -> int:
+        return int(self._budget_tokens() * self._compact_ratio)
+
+    def _plan_compaction(
+        self, messages: List[ChatMessage], *, lead: float = 1.0
+    ) -> Optional[Tuple[Optional[ChatMessage], List[ChatMessage], List[ChatMessage]]]:
         """
-        当消息长度超过阈值时，压缩中间历史，仅保留：
-        - 第一条 system 消息（system_prompt）
-        - 最后一条消息（本次 query，或最后一条消息）
-        中间内容通过大模型做摘要，替换为一条简短的总结消息。
+        按 token 预算规划压缩，返回 (已有摘要, 需要淘汰的消息, 原样保留的消息)，无需压缩时返回 None。
+        - lead < 1 时在接近阈值（阈值 * lead）时就给出计划，供后台提前摘要
+        - 第一条 system 消息与最近 keep_recent 条消息（含成对的工具调用/结果）永远保留
+        - 从最旧的消息开始淘汰，直到估算 token 回落到触发阈值的一半以下
         """
-        max_len = self._max_chat_len
-        if len(messages) <= max_len:
-            return messages
-
+        trigger = self._trigger_tokens()
+        costs = [self._message_tokens(m) for m in messages]
+        total = sum(costs)
+        if total <= trigger * lead and len(messages) <= self._max_chat_len * lead:
+            return None
+
+        body_start = 1
+        previous_summary: Optional[ChatMessage] = None
+        if len(messages) > 1 and messages[1].name == self._summary_name:
+            previous_summary = messages[1]
+            body_start = 2
+        body = messages[body_start:]
+        body_costs = costs[body_start:]
+
+        # 最近的消息原样保留，且不把工具结果与其调用拆开
+        tail_start = max(0, len(body) - self._keep_recent)
+        while tail_start > 0 and body[tail_start].role == "tool_result":
+            tail_start -= 1
+
+        target_tokens = trigger // 2
+        target_len = max(self._keep_recent + 2, self._max_chat_len // 2)
+        remaining = total
+        evict_end = 0
+        while evict_end < tail_start and (
+            remaining > target_tokens or len(messages) - evict_end > target_len
+        ):
+            remaining -= body_costs[evict_end]
+            evict_end += 1
+        while evict_end < tail_start and body[evict_end].role == "tool_result":
+            evict_end += 1
+
+        if evict_end == 0:
+            return None
+        return previous_summary, body[:evict_end], body[evict_end:]
+
+    async def _summarize_messages(
+        self,
+        evicted: Sequence[ChatMessage],
+        previous_summary: Optional[ChatMessage],
+    ) -> ChatMessage:
+        """增量摘要：只把新淘汰的消息合并进已有摘要，而不是重新总结全部历史。"""
         assert self._config is not None and self._client is not None
 
-        # 保留首尾
-        first_msg = messages[0]
-        last_msg = messages[-1]
-        middle_msgs = messages[1:-1]
-
-        # 将中间消息整理成可供总结的纯文本
-        middle_text_parts: List[str] = []
-        for m in middle_msgs:
+        # 将被淘汰的消息整理成可供总结的纯文本，超长内容截断
+        evicted_text_parts: List[str] = []
+        for m in evicted:
             role = m.role
             name = m.name or ""
             prefix = f"{role}({name})" if name else role
-            middle_text_parts.append(f"{prefix}: {m.content}")
-        middle_text = "\n".join(middle_text_parts)
+            content = m.content
+            if len(content) > SUMMARY_INPUT_CHAR_LIMIT:
+                content = content[:SUMMARY_INPUT_CHAR_LIMIT] + "…（已截断）"
+            evicted_text_parts.append(f"{prefix}: {content}")
+        evicted_text = "\n".join(evicted_text_parts)
+
+        previous_text = ""
+        if previous_summary is not None:
+            previous_text = f"已有的历史总结：\n{previous_summary.content}\n\n"
 
         # 构造摘要任务提示
         summary_user_prompt = (
-            "你是一个对话总结助手。请阅读以下对话历史，并用简洁的中文总结对话要点、"
-            "已达成的结论和对后续回答有用的关键信息，尽量短且信息密集。\n\n"
-            "对话历史：\n"
-            f"{middle_text}\n\n"
-            "请只输出总结内容，不要添加额外说明。"
+            "你是一个对话总结助手。请把已有的历史总结与以下新增对话合并，"
+            "用简洁的中文总结对话要点、已达成的结论和对后续回答有用的关键信息"
+            "（如目标、存活主机、开放端口与服务），尽量短且信息密集。\n\n"
+            f"{previous_text}"
+            "新增对话：\n"
+            f"{evicted_text}\n\n"
+            "请只输出合并后的总结内容，不要添加额外说明。"
         )
 
         summary_payload: Dict[str, Any] = {
@@ -383,27 +819,97 @@ class AgentTalker:
             "temperature": 0.2,
         }
 
-        summary_resp = await self._client.chat.completions.create(**summary_payload)
-        summary_msg = summary_resp.choices[0].message
-        summary_content = summary_msg.content or ""
+        summary_resp = await self._create_completion(summary_payload)
+        summary_content = summary_resp.choices[0].message.content or ""
+        if summary_content.startswith("对话历史总结："):
+            summary_content = summary_content[len("对话历史总结："):]
+        return ChatMessage(
+            role="agent",
+            name=self._summary_name,
+            content=f"对话历史总结：{summary_content}",
+        )
 
-        # 用一条总结消息替换全部中间历史
-        compressed_messages: List[ChatMessage] = [
-            first_msg,
-            ChatMessage(
-                role="agent",
-                name=f"{self._agent_name}_history_summary",
-                content=f"对话历史总结：{summary_content}",
-            ),
-            last_msg,
-        ]
-        return compressed_messages
+    async def _compress_if_needed(
+        self, messages: List[ChatMessage]
+    ) -> List[ChatMessage]:
+        """
+        返回本次请求使用的消息窗口，压缩本身不阻塞前台请求：
+        - 历史接近阈值时在后台启动增量摘要，完成后再替换进 ChatHistory
+        - 摘要尚未就绪且已超过阈值时，本次请求先使用截断窗口
+          （system + 已有摘要 + 预算内最新的消息）
+        """
+        with telemetry.span(
+            "context_compress", CONTEXT_COMPRESS_SECONDS, agent=self._agent_name
+        ):
+            self._schedule_compaction(messages)
+            return self._fit_window(messages)
+
+    def _schedule_compaction(self, messages: List[ChatMessage]) -> None:
+        if self._compaction_task is not None and not self._compaction_task.done():
+            return
+        plan = self._plan_compaction(messages, lead=BACKGROUND_COMPACT_LEAD)
+        if plan is None:
+            return
+        self._compaction_task = asyncio.create_task(
+            self._background_compact(plan, self._chat_history.version)
+        )
+
+    async def _background_compact(
+        self,
+        plan: Tuple[Optional[ChatMessage], List[ChatMessage], List[ChatMessage]],
+        version: int,
+    ) -> None:
+        previous_summary, evicted, _ = plan
+        try:
+            with telemetry.span(
+                "history_summary", HISTORY_SUMMARY_SECONDS, agent=self._agent_name
+            ):
+                summary_msg = await self._summarize_messages(evicted, previous_summary)
+        except Exception:  # 摘要失败不影响对话，下一轮会重新尝试
+            logger.exception("后台历史摘要失败")
+            return
+        # [system, (旧摘要), 被淘汰的消息...] 整体替换为 [system, 新摘要]
+        stop = 1 + (1 if previous_summary is not None else 0) + len(evicted)
+        applied = await self._chat_history.replace_range(
+            1, stop, [summary_msg], expected_version=version
+        )
+        if not applied:
+            logger.info("历史在摘要期间被改写，丢弃本次摘要结果")
+
+    async def wait_compaction(self) -> None:
+        """等待正在进行的后台摘要完成（测试、基准或退出前使用）。"""
+        if self._compaction_task is not None:
+            await asyncio.gather(self._compaction_task, return_exceptions=True)
+
+    def _fit_window(self, messages: List[ChatMessage]) -> List[ChatMessage]:
+        """超过阈值时只保留 system、已有摘要与预算内最新的消息，不修改历史本身。"""
+        trigger = self._trigger_tokens()
+        costs = [self._message_tokens(m) for m in messages]
+        if sum(costs) <= trigger or len(messages) <= 2:
+            return messages
+
+        head_len = 2 if messages[1].name == self._summary_name else 1
+        remaining = trigger - sum(costs[:head_len])
+        start = len(messages) - 1  # 至少保留最后一条消息
+        remaining -= costs[start]
+        while start - 1 >= head_len and costs[start - 1] <= remaining:
+            start -= 1
+            remaining -= costs[start]
+        # 窗口不以孤立的工具结果开头
+        while start < len(messages) - 1 and messages[start].role == "tool_result":
+            start += 1
+        return [*messages[:head_len], *messages[start:]]
 
     async def _ensure_ready(self, force_reload: bool = False) -> None:
-        """检查配置是否ready,可配置强制重加载参数"""
-        if self._client is None or self._config is None or force_reload:
+        """检查配置是否ready,配置文件变化时自动切换,可配置强制重加载参数"""
+        if force_reload:
             await self._refresh()
+            return
+        config = await basic_tool.get_config()
+        if self._client is None or config is not self._config:
+            await self._apply_config(config)
 
+    @_traced_turn("chat")
     async def run_no_tool_chat(
         self,
         query: str,  # 最新的问题
@@ -442,10 +948,8 @@ class AgentTalker:
         # 深拷贝获取构造好的历史消息
         messages = await self._chat_history.get_messages()  
 
-        # 发送给大模型前，必要时压缩历史，保持 system_prompt 和当前 query 不变
+        # 发送给大模型前，必要时在后台压缩历史，本次请求使用预算内的消息窗口
         messages = await self._compress_if_needed(messages)
-        # 压缩后的结果作为新的内部历史缓存
-        await self._chat_history.overwrite(messages)
 
         # 构造给openai的请求参数       
         payload: Dict[str, Any] = {
@@ -461,7 +965,7 @@ class AgentTalker:
 
         """和大模型交互"""
         # 获取返回
-        response = await self._client.chat.completions.create(**payload)
+        response = await self._create_completion(payload)
         # 获取第一条回复，并加入历史
         first_message = response.choices[0].message
         content = first_message.content or ""
@@ -469,6 +973,7 @@ class AgentTalker:
         await self._chat_history.add_agent_msg(self._agent_name, content)
         return content
 
+    @_traced_turn("tool_chat")
     async def run_tool_chat(
         self,
         query: str,
@@ -514,7 +1019,6 @@ class AgentTalker:
             # 获取历史（压缩如果需要）
             messages = await self._chat_history.get_messages()
             messages = await self._compress_if_needed(messages)
-            await self._chat_history.overwrite(messages)
             
             # 组装给模型的消息
             payload = self._build_payload(
@@ -529,7 +1033,7 @@ class AgentTalker:
             payload["tool_choice"] = tool_choice  # 工具选择方式
 
             # 和大模型交互
-            response = await self._client.chat.completions.create(**payload)
+            response = await self._create_completion(payload)
             # 获取第一条回复
             assistant_message = response.choices[0].message
             assistant_content = assistant_message.content or ""
@@ -558,6 +1062,266 @@ class AgentTalker:
             raise RuntimeError("在达到最大工具调用次数后仍未获得模型回复")
         return final_response
 
+    @_traced_stream("stream_chat")
+    async def stream_no_tool_chat(
+        self,
+        query: str,
+        *,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        extra_params: Optional[Dict[str, Any]] = None,
+        force_reload: bool = False,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        run_no_tool_chat 的流式版本，逐段产出事件字典：
+            {"type": "delta", "content": ...}  模型输出的增量文本
+            {"type": "done", "content": ...}   本轮完整回复
+        参数含义与 run_no_tool_chat 相同。
+        """
+        await self._ensure_ready(force_reload)
+        assert self._config is not None and self._client is not None
+
+        if chat_history is not None:
+            await self._chat_history.replace_with_external(chat_history)
+        await self._chat_history.add_user_msg(query)
+
+        messages = await self._chat_history.get_messages()
+        messages = await self._compress_if_needed(messages)
+
+        payload = self._build_payload(
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            extra_params=extra_params,
+        )
+        content_parts: List[str] = []
+        async for event in self._stream_completion(payload, tool_calls_acc=None):
+            content_parts.append(event["content"])
+            yield event
+
+        content = "".join(content_parts)
+        await self._chat_history.add_agent_msg(self._agent_name, content)
+        yield {"type": "done", "content": content}
+
+    @_traced_stream("stream_tool_chat")
+    async def stream_tool_chat(
+        self,
+        query: str,
+        *,
+        tools_list: Sequence[Tools],
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        extra_params: Optional[Dict[str, Any]] = None,
+        force_reload: bool = False,
+        tool_choice: str = "auto",
+        max_tool_iterations: int = 3,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        run_tool_chat 的流式版本，除 delta/done 外还会产出工具事件：
+            {"type": "tool_call", "tool_call_id", "tool_name", "arguments"}  模型发起工具调用
+            {"type": "tool_progress", "tool_call_id", "task", "percent", ...}  工具执行中的进度（如 nmap 扫描百分比）
+            {"type": "tool_result", "tool_call_id", "name", "content"}      单个工具执行完成
+        参数含义与 run_tool_chat 相同。
+        """
+        if not tools_list:
+            raise ValueError("tools_list 不能为空")
+        if tool_choice not in {"auto", "required"}:
+            raise ValueError("tool_choice 仅支持 'auto' 或 'required'")
+
+        await self._ensure_ready(force_reload)
+        assert self._config is not None and self._client is not None
+
+        merged_tools = Tools.merge(tools_list)
+        if not merged_tools.has_tools():
+            raise ValueError("tools_list 中没有可用工具")
+
+        if chat_history is not None:
+            await self._chat_history.replace_with_external(chat_history)
+        await self._chat_history.add_user_msg(query)
+
+        for _ in range(max_tool_iterations):
+            messages = await self._chat_history.get_messages()
+            messages = await self._compress_if_needed(messages)
+
+            payload = self._build_payload(
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                extra_params=extra_params,
+            )
+            payload["tools"] = merged_tools.as_openai_tools()
+            payload["tool_choice"] = tool_choice
+
+            content_parts: List[str] = []
+            tool_calls_acc: Dict[int, Dict[str, str]] = {}
+            async for event in self._stream_completion(
+                payload, tool_calls_acc=tool_calls_acc
+            ):
+                content_parts.append(event["content"])
+                yield event
+            assistant_content = "".join(content_parts)
+
+            if tool_calls_acc:
+                if assistant_content:
+                    await self._chat_history.add_agent_msg(
+                        self._agent_name, assistant_content
+                    )
+                calls = [
+                    self._make_call_metadata(
+                        acc["id"], acc["name"] or None, acc["arguments"]
+                    )
+                    for _, acc in sorted(tool_calls_acc.items())
+                ]
+                async for event in self._stream_tool_calls(calls, merged_tools):
+                    yield event
+                continue
+
+            await self._chat_history.add_agent_msg(self._agent_name, assistant_content)
+            yield {"type": "done", "content": assistant_content}
+            return
+
+        raise RuntimeError("在达到最大工具调用次数后仍未获得模型回复")
+
+    async def _stream_completion(
+        self,
+        payload: Dict[str, Any],
+        *,
+        tool_calls_acc: Optional[Dict[int, Dict[str, str]]],
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """以流式方式请求模型，产出文本增量；工具调用分片按 index 累积到 tool_calls_acc。"""
+        assert self._config is not None
+        model = self._config.model_name
+        with telemetry.span(
+            "model_request", MODEL_REQUEST_SECONDS, model=model, stream="true"
+        ):
+            output: List[str] = []
+            # 读完整个流之前一直占用限流器的并发名额
+            async with self._open_stream(payload) as lease:
+                async for chunk in lease.result.parse():
+                    # 服务端开启 usage 统计时，最后一个分片只带 usage 不带 choices
+                    usage = getattr(chunk, "usage", None)
+                    if usage is not None:
+                        _record_usage(model, usage)
+                        lease.settle(getattr(usage, "total_tokens", None))
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta is None:
+                        continue
+                    if tool_calls_acc is not None:
+                        for item in getattr(delta, "tool_calls", None) or []:
+                            acc = tool_calls_acc.setdefault(
+                                item.index, {"id": "", "name": "", "arguments": ""}
+                            )
+                            if item.id:
+                                acc["id"] = item.id
+                            if item.function is not None:
+                                acc["name"] += item.function.name or ""
+                                acc["arguments"] += item.function.arguments or ""
+                                output.append(item.function.arguments or "")
+                    if delta.content:
+                        output.append(delta.content)
+                        yield {"type": "delta", "content": delta.content}
+                # 服务端不返回 usage 时按输入与已收到的输出估算，已按 usage 修正过则不再生效
+                lease.settle(
+                    self._estimate_prompt_tokens(payload) + estimate_tokens("".join(output))
+                )
+
+    @asynccontextmanager
+    async def _client_in_use(self) -> AsyncIterator[None]:
+        """请求期间持有当前客户端的引用，配置中途切换也不会关闭在途请求使用的连接池。"""
+        key = self._client_key
+        retained = key is not None and client_pool.retain_client(*key)
+        try:
+            yield
+        finally:
+            if retained:
+                await client_pool.release_client(*key)  # type: ignore[misc]
+
+    def _stream_sender(self, payload: Dict[str, Any]) -> Any:
+        """
+        流式版本的 _raw_sender：请求最后一个分片附带 usage（stream_options.include_usage），
+        服务端以 400 拒绝该参数时去掉它重发，并在本实例后续请求中不再携带。
+        """
+        assert self._client is not None
+        client = self._client
+        request = {**payload, "stream": True}
+
+        async def _send() -> Any:
+            if not self._stream_usage_supported or "stream_options" in request:
+                return await client.chat.completions.with_raw_response.create(**request)
+            try:
+                return await client.chat.completions.with_raw_response.create(
+                    **request, stream_options={"include_usage": True}
+                )
+            except BadRequestError as exc:
+                if "stream_options" not in str(exc):
+                    raise
+                logger.info("模型服务不支持 stream_options，流式请求改为估算用量")
+                self._stream_usage_supported = False
+                return await client.chat.completions.with_raw_response.create(**request)
+
+        return _send
+
+    def _raw_sender(self, request: Dict[str, Any]) -> Any:
+        """返回发起一次请求的无参协程函数；使用原始响应以读取 x-ratelimit-* 响应头。"""
+        assert self._client is not None
+        client = self._client
+
+        async def _send() -> Any:
+            return await client.chat.completions.with_raw_response.create(**request)
+
+        return _send
+
+    async def _create_completion(self, payload: Dict[str, Any]) -> Any:
+        """所有非流式模型请求的统一出口：经过共享限流器，429/5xx/连接错误按抖动退避重试。"""
+        assert self._config is not None
+        limiter = rate_limit.get_limiter(self._config.base_url, self._config.model_name)
+        model = self._config.model_name
+        async with self._client_in_use():
+            with telemetry.span(
+                "model_request", MODEL_REQUEST_SECONDS, model=model, stream="false"
+            ):
+                raw = await limiter.call(
+                    self._raw_sender(payload),
+                    tokens=self._estimate_request_tokens(payload),
+                    headers_of=lambda response: response.headers,
+                    usage_of=_usage_tokens,
+                )
+            response = raw.parse()
+        _record_usage(model, getattr(response, "usage", None))
+        return response
+
+    @asynccontextmanager
+    async def _open_stream(
+        self, payload: Dict[str, Any]
+    ) -> AsyncIterator["rate_limit.Lease[Any]"]:
+        """发起流式请求，并发名额占用到退出 async with；耗时与 usage 由 _stream_completion 记录。"""
+        assert self._config is not None
+        limiter = rate_limit.get_limiter(self._config.base_url, self._config.model_name)
+        async with self._client_in_use(), limiter.lease(
+            self._stream_sender(payload),
+            tokens=self._estimate_request_tokens(payload),
+            headers_of=lambda response: response.headers,
+        ) as lease:
+            yield lease
+
+    @staticmethod
+    def _estimate_prompt_tokens(payload: Dict[str, Any]) -> int:
+        """估算一次请求输入消息的 token 数。"""
+        return sum(
+            estimate_tokens(str(message.get("content") or "")) + MESSAGE_TOKEN_OVERHEAD
+            for message in payload.get("messages", ())
+        )
+
+    @classmethod
+    def _estimate_request_tokens(cls, payload: Dict[str, Any]) -> int:
+        """估算一次请求的 token 消耗（输入消息 + 预留输出），用于预扣限流配额。"""
+        prompt = cls._estimate_prompt_tokens(payload)
+        return prompt + int(payload.get("max_tokens") or COMPLETION_TOKEN_RESERVE)
+
     def _build_payload(
         self,
         *,
@@ -581,48 +1345,150 @@ class AgentTalker:
     async def _handle_tool_calls(
         self, tool_calls: Sequence[Any], tools: Tools
     ) -> None:
-        for tool_call in tool_calls:
-            function_name = getattr(tool_call.function, "name", None)
-            arguments_str = getattr(tool_call.function, "arguments", "") or "{}"
-            try:
-                arguments = json.loads(arguments_str)
-            except json.JSONDecodeError:
-                arguments = {}
-
-            call_metadata = {
-                "tool_call_id": getattr(tool_call, "id", ""),
-                "tool_name": function_name,
-                "arguments": arguments,
-            }
-            await self._chat_history.add_tool_call_msg(
-                content=json.dumps(call_metadata, ensure_ascii=False),
-                name=function_name,
-                metadata=call_metadata,
+        """并发执行同一轮的全部工具调用，完成后按原始顺序写入历史。"""
+        calls = [
+            self._make_call_metadata(
+                getattr(tool_call, "id", ""),
+                getattr(tool_call.function, "name", None),
+                getattr(tool_call.function, "arguments", ""),
             )
+            for tool_call in tool_calls
+        ]
+        async for _ in self._stream_tool_calls(calls, tools):
+            pass
 
-            if not function_name:
-                error_payload = {
-                    "error": "tool_call 缺少 function.name，无法执行"
-                }
-                await self._chat_history.add_tool_result_msg(
-                    name="unknown_tool",
-                    content=json.dumps(error_payload, ensure_ascii=False),
-                    metadata=error_payload,
-                )
-                continue
+    @staticmethod
+    def _make_call_metadata(
+        call_id: str, function_name: Optional[str], arguments_str: Optional[str]
+    ) -> Dict[str, Any]:
+        try:
+            arguments = json.loads(arguments_str or "{}")
+        except json.JSONDecodeError:
+            arguments = {}
+        return {
+            "tool_call_id": call_id or "",
+            "tool_name": function_name,
+            "arguments": arguments,
+        }
+
+    async def _stream_tool_calls(
+        self, calls: Sequence[Dict[str, Any]], tools: Tools
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        并发执行工具调用，先产出全部 tool_call 事件，再按到达先后产出 tool_progress
+        （执行中的进度）与 tool_result 事件；全部完成后按原始顺序把 tool_call/tool_result 写入历史。
+        """
+        for call_metadata in calls:
+            yield {"type": "tool_call", **call_metadata}
+
+        batch_started = time.perf_counter()
+        batch_outcome = "error"
+        semaphore = asyncio.Semaphore(self._max_parallel_tool_calls)
+        # 工具结果与执行中上报的进度汇入同一队列，按到达顺序产出
+        events: asyncio.Queue[Tuple[str, Any]] = asyncio.Queue()
+
+        async def _limited(idx: int, call_metadata: Dict[str, Any]) -> None:
+            def _on_progress(progress: ToolProgress) -> None:
+                events.put_nowait(("progress", (idx, progress)))
 
             try:
-                tool_result = await tools.run(function_name, arguments)
-                tool_payload = tool_result.to_chat_message_payload()
-            except ToolError as exc:
-                tool_payload = {
-                    "role": "tool_result",
-                    "name": function_name,
-                    "content": json.dumps({"error": str(exc)}, ensure_ascii=False),
-                    "metadata": {"error": str(exc)},
+                async with semaphore:
+                    with progress_reporter(_on_progress):
+                        payload = await self._execute_tool_call(call_metadata, tools)
+            except Exception as exc:
+                events.put_nowait(("error", exc))
+            else:
+                events.put_nowait(("result", (idx, payload)))
+
+        tasks = [
+            asyncio.create_task(_limited(idx, call_metadata))
+            for idx, call_metadata in enumerate(calls)
+        ]
+        tool_payloads: List[Dict[str, Any]] = [{} for _ in calls]
+        try:
+            pending = len(tasks)
+            while pending:
+                kind, item = await events.get()
+                if kind == "error":
+                    raise item
+                idx, value = item
+                if kind == "progress":
+                    yield {
+                        "type": "tool_progress",
+                        "tool_call_id": calls[idx]["tool_call_id"],
+                        **value.to_dict(),
+                    }
+                    continue
+                pending -= 1
+                tool_payloads[idx] = value
+                yield {
+                    "type": "tool_result",
+                    "tool_call_id": calls[idx]["tool_call_id"],
+                    "name": value.get("name"),
+                    "content": value["content"],
                 }
+            batch_outcome = "ok"
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 生成器跨越多次 yield，不用 span 上下文管理器而是直接记录
+            duration = time.perf_counter() - batch_started
+            TOOL_BATCH_SECONDS.observe(
+                duration, agent=self._agent_name, outcome=batch_outcome
+            )
+            telemetry.record_span(
+                "tool_calls", duration, started=batch_started, labels={"calls": str(len(calls))}
+            )
+
+        for call_metadata, tool_payload in zip(calls, tool_payloads):
+            await self._chat_history.add_tool_call_msg(
+                content=json.dumps(call_metadata, ensure_ascii=False),
+                name=call_metadata["tool_name"],
+                metadata=call_metadata,
+            )
             await self._chat_history.add_tool_result_msg(
                 name=tool_payload.get("name"),
                 content=tool_payload["content"],
-                metadata=tool_payload.get("metadata"),
+                metadata=_history_metadata(tool_payload.get("metadata")),
             )
+
+    async def _execute_tool_call(
+        self, call_metadata: Dict[str, Any], tools: Tools
+    ) -> Dict[str, Any]:
+        """执行单个工具调用，返回 tool_result 消息格式的字典。"""
+        function_name = call_metadata["tool_name"]
+        if not function_name:
+            error_payload = {"error": "tool_call 缺少 function.name，无法执行"}
+            return {
+                "role": "tool_result",
+                "name": "unknown_tool",
+                "content": json.dumps(error_payload, ensure_ascii=False),
+                "metadata": error_payload,
+            }
+
+        # 模型给出的未注册工具名统一记为 unknown，避免指标标签无限增长
+        tool_label = function_name if function_name in tools.list_names() else "unknown"
+        with telemetry.span("tool_call", TOOL_CALL_SECONDS, tool=tool_label) as labels:
+            try:
+                tool_result = await asyncio.wait_for(
+                    tools.run(function_name, call_metadata["arguments"]),
+                    self._tool_call_timeout,
+                )
+                return tool_result.to_chat_message_payload()
+            except asyncio.TimeoutError:
+                labels["outcome"] = "timeout"
+                error = f"工具 {function_name} 执行超时（{self._tool_call_timeout}s）"
+            except ToolError as exc:
+                labels["outcome"] = "error"
+                error = str(exc)
+            except Exception as exc:  # 参数不合法等意外异常只影响本次调用，不中断同批其他调用
+                logger.exception("工具 %s 执行异常", function_name)
+                labels["outcome"] = "error"
+                error = f"工具 {function_name} 执行异常：{type(exc).__name__}: {exc}"
+        return {
+            "role": "tool_result",
+            "name": function_name,
+            "content": json.dumps({"error": error}, ensure_ascii=False),
+            "metadata": {"error": error},
+        }
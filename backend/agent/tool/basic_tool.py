@@ -1,18 +1,81 @@
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional, Tuple
+import asyncio
+import os
+import time
 import aiofiles
 import json
 
-@dataclass
+CONFIG_PATH = Path(__file__).resolve().parents[2] / "config.json"
+
+
+@dataclass(frozen=True)
 class AgentConfig:
     base_url: str
     model_name: str
     api_key: str
+    requests_per_minute: Optional[int] = None  # 供应商的每分钟请求数配额，None 时从响应头学习
+    tokens_per_minute: Optional[int] = None  # 供应商的每分钟 token 配额，None 时从响应头学习
 
 async def load_config() -> AgentConfig:
     """加载配置文件"""
-    config_path = Path(__file__).resolve().parents[2] / "config.json"
-    async with aiofiles.open(config_path, "r", encoding="utf-8") as f:
+    async with aiofiles.open(CONFIG_PATH, "r", encoding="utf-8") as f:
         raw = await f.read()
     data = json.loads(raw)
-    return AgentConfig(**data)  # 解包
\ No newline at end of file
+    return AgentConfig(**data)  # 解包
+
+
+class ConfigService:
+    """缓存已解析的配置，仅在文件 mtime/inode 变化或收到通知时重新读取"""
+
+    def __init__(self, path: Path = CONFIG_PATH, check_interval: float = 1.0) -> None:
+        """
+        Args:
+            path: 配置文件路径。
+            check_interval: 两次 stat 检查之间的最小间隔（秒），间隔内直接返回缓存。
+        """
+        self._path = path
+        self._check_interval = check_interval
+        self._config: Optional[AgentConfig] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._checked_at = 0.0
+        self._dirty = True
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> AgentConfig:
+        """返回当前配置；内容未变化时始终返回同一个对象。"""
+        now = time.monotonic()
+        if (
+            self._config is not None
+            and not self._dirty
+            and now - self._checked_at < self._check_interval
+        ):
+            return self._config
+
+        async with self._lock:
+            stat = os.stat(self._path)
+            signature = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+            if self._config is None or self._dirty or signature != self._signature:
+                async with aiofiles.open(self._path, "r", encoding="utf-8") as f:
+                    raw = await f.read()
+                config = AgentConfig(**json.loads(raw))
+                if config != self._config:
+                    self._config = config
+                self._signature = signature
+                self._dirty = False
+            self._checked_at = time.monotonic()
+        assert self._config is not None
+        return self._config
+
+    def invalidate(self) -> None:
+        """标记缓存失效，下次 get 时强制重新读取（如配置接口写入新文件后）。"""
+        self._dirty = True
+
+
+config_service = ConfigService()
+
+
+async def get_config() -> AgentConfig:
+    """获取缓存的配置，热路径上使用，避免每次调用都读文件"""
+    return await config_service.get()
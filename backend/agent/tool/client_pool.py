@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import Dict, Tuple
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+"""进程级共享的 AsyncOpenAI 客户端注册表，按 (base_url, api_key) 复用连接池"""
+
+try:  # HTTP/2 依赖 h2，未安装时回退到 HTTP/1.1
+    import h2  # type: ignore  # noqa: F401
+
+    HTTP2_ENABLED = True
+except ImportError:  # pragma: no cover - 取决于运行环境
+    HTTP2_ENABLED = False
+
+
+MAX_CONNECTIONS = 100  # 单个客户端的最大并发连接数
+MAX_KEEPALIVE_CONNECTIONS = 20  # 保持空闲复用的连接数
+KEEPALIVE_EXPIRY = 60.0  # 空闲连接保留时间（秒）
+
+_clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+# 每个客户端的引用计数：AgentTalker 切换到该配置时持有一份，每次在途请求再各持有一份
+_refs: Dict[Tuple[str, str], int] = {}
+
+
+def acquire_client(base_url: str, api_key: str) -> AsyncOpenAI:
+    """获取（必要时创建）共享客户端并增加引用计数，相同 base_url 与 api_key 的调用方复用同一连接池。"""
+    key = (base_url, api_key)
+    client = _clients.get(key)
+    if client is None:
+        http_client = DefaultAsyncHttpxClient(
+            http2=HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+        )
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=0,  # 重试由 rate_limit 统一处理，避免 SDK 重试绕开共享限流
+        )
+        _clients[key] = client
+    _refs[key] = _refs.get(key, 0) + 1
+    return client
+
+
+def retain_client(base_url: str, api_key: str) -> bool:
+    """为已在注册表中的客户端增加一次引用（如在途请求），不存在时返回 False 且不做任何事。"""
+    key = (base_url, api_key)
+    if key not in _clients:
+        return False
+    _refs[key] += 1
+    return True
+
+
+async def release_client(base_url: str, api_key: str) -> None:
+    """释放一次引用，最后一个引用释放时关闭并移除客户端（例如配置更换 api_key 之后）。"""
+    key = (base_url, api_key)
+    refs = _refs.get(key, 0) - 1
+    if refs > 0:
+        _refs[key] = refs
+        return
+    _refs.pop(key, None)
+    client = _clients.pop(key, None)
+    if client is not None:
+        await client.close()
+
+
+async def aclose_all() -> None:
+    """关闭全部共享客户端，供应用退出时调用。"""
+    clients = list(_clients.values())
+    _clients.clear()
+    _refs.clear()
+    for client in clients:
+        await client.close()
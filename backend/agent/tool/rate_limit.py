@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+import openai
+
+"""模型 API 限流与重试：按 (base_url, model) 共享请求数/令牌数配额，依据响应头自适应退避"""
+
+
+DEFAULT_MAX_CONCURRENCY = 16  # 同一 (base_url, model) 同时在途的请求上限
+DEFAULT_MAX_RETRIES = 4  # 429/5xx/连接错误的最大重试次数
+BACKOFF_BASE = 0.5  # 指数退避的基数（秒）
+BACKOFF_CAP = 30.0  # 单次退避的上限（秒）
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """解析 "1s"、"6m0s"、"20ms" 或纯数字形式的时长，返回秒数。"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """从 retry-after-ms / retry-after 响应头读取服务端要求的等待时间。"""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+
+class _Bucket:
+    """按分钟配额匀速补充的令牌桶，limit 为 None 时不限制。"""
+
+    def __init__(self, limit: Optional[float]) -> None:
+        self.limit = limit
+        self.level = limit or 0.0
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        if self.limit is None:
+            return
+        self.level = min(self.limit, self.level + (now - self._updated) * self.limit / 60)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """距离桶中攒够 amount 还需等待的秒数。"""
+        if self.limit is None or self.level >= amount:
+            return 0.0
+        # 超过桶容量的单次请求只需等到桶满，避免永远拿不到配额
+        needed = min(amount, self.limit) - self.level
+        return needed * 60 / self.limit
+
+    def take(self, amount: float) -> None:
+        if self.limit is not None:
+            self.level -= amount
+
+    def set_limit(self, limit: Optional[float]) -> None:
+        if limit == self.limit:
+            return
+        if limit is not None and self.limit is None:
+            self.level = limit
+        elif limit is not None:
+            self.level = min(self.level, limit)
+        self.limit = limit
+
+
+class Lease(Generic[T]):
+    """一次已发出的请求：持有期间占用限流器的并发名额，拿到实际用量后调用 settle 修正令牌桶。"""
+
+    def __init__(self, limiter: "RateLimiter", result: T, reserved: int) -> None:
+        self.result = result
+        self._limiter = limiter
+        self._reserved = reserved
+        self._settled = False
+
+    def settle(self, used: Optional[int]) -> None:
+        """按实际用量多退少补，只生效一次；used 为 None 时忽略。"""
+        if used is None or self._settled:
+            return
+        self._settled = True
+        self._limiter.settle(self._reserved, used)
+
+
+class RateLimiter:
+    """
+    单个 (base_url, model) 的共享限流器：请求数/令牌数两个令牌桶 + 并发上限。
+    配额既可以手动配置，也会根据响应头 x-ratelimit-* 自动学习与校准；
+    收到 429 时所有调用方一起暂停到服务端给出的恢复时间。
+    """
+
+    def __init__(
+        self,
+        *,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency 必须大于 0")
+        self._requests = _Bucket(requests_per_minute)
+        self._tokens = _Bucket(tokens_per_minute)
+        self._configured: Tuple[Optional[float], Optional[float]] = (
+            requests_per_minute,
+            tokens_per_minute,
+        )
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()  # 排队等待配额，保证先到先得
+        self._paused_until = 0.0
+
+    @property
+    def limits(self) -> Dict[str, Optional[float]]:
+        return {
+            "requests_per_minute": self._requests.limit,
+            "tokens_per_minute": self._tokens.limit,
+        }
+
+    def configure(
+        self,
+        *,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ) -> None:
+        """设置手动配额；与上次配置相同时不做改动，避免覆盖从响应头学到的值。"""
+        configured = (requests_per_minute, tokens_per_minute)
+        if configured == self._configured:
+            return
+        self._configured = configured
+        self._requests.set_limit(requests_per_minute)
+        self._tokens.set_limit(tokens_per_minute)
+
+    async def acquire(self, tokens: int) -> None:
+        """等待直到配额允许发出一个预计消耗 tokens 的请求，并预先扣除配额。"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._requests.refill(now)
+                self._tokens.refill(now)
+                delay = max(
+                    self._paused_until - now,
+                    self._requests.wait_time(1),
+                    self._tokens.wait_time(tokens),
+                )
+                if delay <= 0:
+                    self._requests.take(1)
+                    self._tokens.take(tokens)
+                    return
+                await asyncio.sleep(delay)
+
+    def settle(self, reserved: int, used: Optional[int]) -> None:
+        """请求完成后按实际用量修正令牌桶（多退少补）。"""
+        if used is None:
+            return
+        self._tokens.refill(time.monotonic())
+        self._tokens.take(used - reserved)
+
+    def observe(self, headers: Optional[Mapping[str, str]]) -> None:
+        """根据响应头学习配额上限，并用剩余量校准本地令牌桶。"""
+        if not headers:
+            return
+        now = time.monotonic()
+        for bucket, suffix in ((self._requests, "requests"), (self._tokens, "tokens")):
+            limit = _as_float(headers.get(f"x-ratelimit-limit-{suffix}"))
+            if limit is not None and limit > 0:
+                bucket.refill(now)
+                bucket.set_limit(limit)
+            remaining = _as_float(headers.get(f"x-ratelimit-remaining-{suffix}"))
+            if remaining is None or bucket.limit is None:
+                continue
+            bucket.refill(now)
+            bucket.level = min(bucket.level, remaining)
+            if remaining <= 0:
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{suffix}"))
+                if reset:
+                    self.pause(reset)
+
+    def pause(self, seconds: float) -> None:
+        """让所有调用方至少暂停 seconds 秒（例如收到 429 之后）。"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable[T]],
+        *,
+        tokens: int,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        headers_of: Optional[Callable[[T], Optional[Mapping[str, str]]]] = None,
+        usage_of: Optional[Callable[[T], Optional[int]]] = None,
+    ) -> T:
+        """
+        在限流与重试保护下执行一次模型调用，返回后即释放并发名额。
+
+        Args:
+            func: 发起请求的无参协程函数，每次重试都会重新调用。
+            tokens: 预计消耗的令牌数（输入 + 预留输出）。
+            max_retries: 可重试错误的最大重试次数。
+            headers_of: 从返回值中取响应头，用于自适应校准配额。
+            usage_of: 从返回值中取实际消耗的令牌数。
+        """
+        async with self.lease(
+            func, tokens=tokens, max_retries=max_retries, headers_of=headers_of
+        ) as lease:
+            if usage_of is not None:
+                lease.settle(usage_of(lease.result))
+            return lease.result
+
+    @asynccontextmanager
+    async def lease(
+        self,
+        func: Callable[[], Awaitable[T]],
+        *,
+        tokens: int,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        headers_of: Optional[Callable[[T], Optional[Mapping[str, str]]]] = None,
+    ) -> AsyncIterator[Lease[T]]:
+        """
+        与 call 相同的限流与重试，但并发名额一直占用到退出 async with；
+        流式响应在收到响应头后才开始读取正文，需在读完整个流之后再释放。
+        """
+        attempt = 0
+        while True:
+            await self.acquire(tokens)
+            await self._slots.acquire()
+            try:
+                result = await func()
+            except BaseException as exc:
+                self._slots.release()
+                delay = self._retry_delay(exc, attempt, max_retries)
+                if delay is None:
+                    raise
+            else:
+                break
+            attempt += 1
+            logger.warning("模型请求失败，%.2fs 后进行第 %d 次重试", delay, attempt)
+            await asyncio.sleep(delay)
+        try:
+            if headers_of is not None:
+                self.observe(headers_of(result))
+            yield Lease(self, result, tokens)
+        finally:
+            self._slots.release()
+
+    def _retry_delay(
+        self, exc: BaseException, attempt: int, max_retries: int
+    ) -> Optional[float]:
+        """可重试的错误返回退避秒数（429 时同时暂停所有调用方），否则返回 None。"""
+        if isinstance(exc, openai.APIStatusError):
+            headers = exc.response.headers if exc.response is not None else None
+            self.observe(headers)
+            if exc.status_code not in RETRYABLE_STATUS or attempt >= max_retries:
+                return None
+            delay = self._backoff(attempt, retry_after_seconds(headers))
+            if exc.status_code == 429:
+                self.pause(delay)
+            return delay
+        if isinstance(exc, openai.APIConnectionError) and attempt < max_retries:
+            return self._backoff(attempt, None)
+        return None
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[float]) -> float:
+        # full jitter 指数退避，避免并发调用方同时重试；服务端给出等待时间时以其为下限
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+def _as_float(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+
+
+def get_limiter(base_url: str, model: str) -> RateLimiter:
+    """获取（必要时创建）共享限流器，同一 base_url 与模型的所有 Agent 共用配额。"""
+    key = (base_url.rstrip("/"), model)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = RateLimiter()
+        _limiters[key] = limiter
+    return limiter
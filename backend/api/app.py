@@ -1,12 +1,35 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .routes import register_routes
+from agent.agent_tool_list.nmap import get_parse_pool
+from agent.memory.session_store import SessionStore
+from agent.tool import client_pool
+
+from .jobs import job_manager
+from .routes import chat, register_routes
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """应用生命周期：打开会话存储并启动任务工作池；退出时停止任务、关闭共享的模型客户端连接池与解析池并提交未写完的会话记录。"""
+    store = await asyncio.to_thread(SessionStore)
+    chat.session_store = store
+    await job_manager.start()
+    yield
+    await job_manager.stop()
+    await client_pool.aclose_all()
+    get_parse_pool().shutdown(wait=False)
+    chat.session_store = None
+    await asyncio.to_thread(store.close)
 
 
 def create_app() -> FastAPI:
     """Factory for FastAPI app so后续可以灵活扩展。"""
-    app = FastAPI(title="AgentSrc Backend")
+    app = FastAPI(title="AgentSrc Backend", lifespan=lifespan)
     register_routes(app)
 
     app.add_middleware(
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from agent.agent_tool_list import ToolError, ToolProgress, progress_reporter
+from agent.agent_tool_list.nmap import HostInventory, inventory_scope
+from agent.sub_agent.info_agent import create_info_agent, get_info_tools
+
+"""后台侦察任务：有界工作池从队列中取任务执行，支持进度查询与取消"""
+
+
+JOB_AGENT_TYPES = ("nmap", "info_agent")
+MAX_PROGRESS_EVENTS = 200  # 每个任务保留的最近进度事件数
+MAX_FINISHED_JOBS = 500  # 内存中保留的已结束任务数
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    """一个侦察任务及其运行状态。"""
+
+    id: str
+    agent_type: str
+    target: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    status: str = "queued"  # queued/running/succeeded/failed/cancelled
+    progress: Deque[Dict[str, Any]] = field(
+        default_factory=lambda: deque(maxlen=MAX_PROGRESS_EVENTS)
+    )
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    task: Optional["asyncio.Task[None]"] = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def add_progress(self, kind: str, message: str, **extra: Any) -> None:
+        self.progress.append(
+            {"time": time.time(), "type": kind, "message": message, **extra}
+        )
+
+    def to_dict(self, *, with_result: bool = True) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "id": self.id,
+            "agent_type": self.agent_type,
+            "target": self.target,
+            "params": self.params,
+            "status": self.status,
+            "progress": list(self.progress),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if with_result:
+            payload["result"] = self.result
+        return payload
+
+
+class JobManager:
+    """任务队列 + 固定数量的工作协程，限制同时运行的侦察任务数。"""
+
+    def __init__(self, max_workers: int = 4) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers 必须大于 0")
+        self._max_workers = max_workers
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._workers: List["asyncio.Task[None]"] = []
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._workers = [
+            asyncio.create_task(self._worker(idx)) for idx in range(self._max_workers)
+        ]
+
+    async def stop(self) -> None:
+        """停止工作协程并取消仍在运行的任务。"""
+        for job in self._jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(
+        self, agent_type: str, target: str, params: Optional[Dict[str, Any]] = None
+    ) -> Job:
+        if agent_type not in JOB_AGENT_TYPES:
+            raise ValueError(f"不支持的任务类型：{agent_type}")
+        job = Job(
+            id=uuid.uuid4().hex,
+            agent_type=agent_type,
+            target=target,
+            params=dict(params or {}),
+        )
+        self._jobs[job.id] = job
+        self._trim_finished()
+        job.add_progress("queued", "任务已进入队列")
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Job]:
+        return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """取消任务：排队中的直接标记取消，运行中的取消其协程（会结束 nmap 子进程）。"""
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return job
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            self._finish(job, "cancelled", error="任务已取消")
+        return job
+
+    def _trim_finished(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _finish(
+        self,
+        job: Job,
+        status: str,
+        *,
+        result: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.add_progress(status, error or "任务结束")
+
+    async def _worker(self, idx: int) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.done:  # 排队期间已被取消
+                    continue
+                job.status = "running"
+                job.started_at = time.time()
+                job.add_progress("running", f"由 worker-{idx} 开始执行")
+                job.task = asyncio.create_task(self._execute(job))
+                try:
+                    result = await asyncio.shield(job.task)
+                except asyncio.CancelledError:
+                    if not job.task.cancelled():
+                        # worker 自身被取消（应用退出），连同任务一起结束
+                        job.task.cancel()
+                        raise
+                    self._finish(job, "cancelled", error="任务已取消")
+                except (ToolError, ValueError, RuntimeError) as exc:
+                    self._finish(job, "failed", error=str(exc))
+                except Exception as exc:  # 任务异常不能让 worker 退出
+                    logger.exception("任务 %s 执行异常", job.id)
+                    self._finish(job, "failed", error=f"{type(exc).__name__}: {exc}")
+                else:
+                    self._finish(job, "succeeded", result=result)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job: Job) -> str:
+        # 每个任务使用独立的主机清单，增量探测不受其他任务或聊天会话的扫描历史影响
+        with inventory_scope(HostInventory()):
+            if job.agent_type == "nmap":
+                return await self._run_nmap(job)
+            return await self._run_info_agent(job)
+
+    async def _run_nmap(self, job: Job) -> str:
+        tool = get_info_tools().get("nmap")
+        mode = job.params.get("mode", "fast_scan")
+        job.add_progress("tool_call", f"nmap {mode} {job.target}", tool_name="nmap")
+        arguments = {
+            key: value
+            for key, value in job.params.items()
+            if key in ("top_ports", "extra_args", "refresh", "engine")
+        }
+
+        def _on_progress(progress: ToolProgress) -> None:
+            detail = progress.to_dict()
+            job.add_progress("tool_progress", _describe_progress(detail), **detail)
+
+        with progress_reporter(_on_progress):
+            tool_result = await tool.run(target=job.target, mode=mode, **arguments)
+        job.add_progress("tool_result", "nmap 扫描完成", tool_name="nmap")
+        return tool_result.content
+
+    async def _run_info_agent(self, job: Job) -> str:
+        talker = create_info_agent()
+        query = job.params.get("query") or f"请对目标 {job.target} 进行信息收集。"
+        final = ""
+        async for event in talker.stream_tool_chat(
+            query, tools_list=[get_info_tools()]
+        ):
+            kind = event["type"]
+            if kind == "tool_call":
+                job.add_progress(
+                    kind,
+                    f"调用工具 {event.get('tool_name')}",
+                    tool_name=event.get("tool_name"),
+                    arguments=event.get("arguments"),
+                )
+            elif kind == "tool_progress":
+                detail = {key: value for key, value in event.items() if key != "type"}
+                job.add_progress(kind, _describe_progress(detail), **detail)
+            elif kind == "tool_result":
+                job.add_progress(
+                    kind, f"工具 {event.get('name')} 完成", tool_name=event.get("name")
+                )
+            elif kind == "done":
+                final = event["content"]
+        return final
+
+
+def _describe_progress(detail: Dict[str, Any]) -> str:
+    text = f"{detail.get('tool')} {detail.get('target')} {detail.get('task')}"
+    if detail.get("percent") is not None:
+        text += f" {detail['percent']:.1f}%"
+    if detail.get("remaining"):
+        text += f"，预计剩余 {detail['remaining']:.0f}s"
+    return text
+
+
+job_manager = JobManager()
@@ -1,11 +1,17 @@
 from fastapi import FastAPI
 
+from .chat import router as chat_router
 from .config import router as config_router
+from .jobs import router as jobs_router
+from .metrics import router as metrics_router
 
 
 def register_routes(app: FastAPI) -> None:
     """将所有路由注册到app"""
     app.include_router(config_router)
+    app.include_router(chat_router)
+    app.include_router(jobs_router)
+    app.include_router(metrics_router)
 
 
 
@@ -0,0 +1,127 @@
+import asyncio
+import json
+from collections import OrderedDict
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from agent.agent_tool_list.nmap import inventory_scope
+from agent.memory.session_store import SessionStore
+from agent.memory.state import State
+from agent.sub_agent.info_agent import get_info_tools, open_info_agent
+from agent.tool.agent_talk import AgentTalker
+
+
+class ChatPayload(BaseModel):
+    session_id: str
+    query: str
+    use_tools: bool = True
+    temperature: Optional[float] = None
+
+
+@dataclass
+class ChatSession:
+    """内存中的一个会话：Agent、串行化多轮请求的锁，以及会话自己的状态（含主机清单）。"""
+
+    talker: AgentTalker
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    state: State = field(default_factory=State)
+
+
+router = APIRouter(prefix="/api", tags=["chat"])
+
+MAX_SESSIONS = 64  # 内存中最多保留的会话数，超出后淘汰（可从存储中恢复）
+_sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+# 会话持久化，后端重启后可按 session_id 恢复；由应用 lifespan 创建，未创建时不持久化
+session_store: Optional[SessionStore] = None
+_END = object()  # 事件流正常结束的标记
+
+
+async def _load_session(session_id: str) -> ChatSession:
+    talker = await open_info_agent(session_store=session_store, session_id=session_id)
+    state = State()
+    if session_store is not None:
+        data = await asyncio.to_thread(session_store.load_state, session_id)
+        if data:
+            state = State.from_dict(data)
+    return ChatSession(talker=talker, state=state)
+
+
+async def _get_session(session_id: str) -> ChatSession:
+    session = _sessions.get(session_id)
+    if session is None:
+        loaded = await _load_session(session_id)
+        # 读取存储期间同一会话的其他请求可能已经创建了会话
+        session = _sessions.setdefault(session_id, loaded)
+    _sessions.move_to_end(session_id)
+    while len(_sessions) > MAX_SESSIONS:
+        _sessions.popitem(last=False)
+    return session
+
+
+async def _pump(
+    events: AsyncIterator[Dict[str, Any]], session: ChatSession, queue: "asyncio.Queue[Any]"
+) -> None:
+    """在独立任务中消费事件流：清单作用域与事件流的关闭都在该任务自己的上下文中进行。"""
+    try:
+        async with aclosing(events):
+            with inventory_scope(session.state.inventory):
+                async for event in events:
+                    await queue.put(event)
+    except Exception as exc:
+        await queue.put(exc)
+    else:
+        await queue.put(_END)
+
+
+async def _to_sse(
+    events: AsyncIterator[Dict[str, Any]], session: ChatSession
+) -> AsyncIterator[str]:
+    """
+    把 AgentTalker 的事件流转换为 SSE 文本帧，同一会话的多轮请求串行执行；
+    期间的扫描结果合并进该会话自己的主机清单，结束后保存会话状态。
+    客户端断开时取消消费任务，由它关闭事件流并取消在途的工具调用，不依赖 GC 回收生成器。
+    """
+    async with session.lock:
+        queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=1)
+        pump = asyncio.create_task(_pump(events, session, queue))
+        try:
+            while (item := await queue.get()) is not _END:
+                if isinstance(item, Exception):  # 出错时通知前端，而不是直接断开连接
+                    data = json.dumps({"type": "error", "error": str(item)}, ensure_ascii=False)
+                    yield f"event: error\ndata: {data}\n\n"
+                    break
+                data = json.dumps(item, ensure_ascii=False)
+                yield f"event: {item['type']}\ndata: {data}\n\n"
+        finally:
+            pump.cancel()
+            await asyncio.gather(pump, return_exceptions=True)
+            session_id = session.talker.session_id
+            if session_store is not None and session_id is not None:
+                session_store.save_state(session_id, session.state.to_dict())
+
+
+@router.post("/chat/stream")
+async def chat_stream(payload: ChatPayload):
+    """以 SSE 流式返回一轮对话的增量文本、工具调用与工具结果。"""
+    session = await _get_session(payload.session_id)
+    talker = session.talker
+    if payload.use_tools:
+        events = talker.stream_tool_chat(
+            payload.query,
+            tools_list=[get_info_tools()],
+            temperature=payload.temperature,
+        )
+    else:
+        events = talker.stream_no_tool_chat(
+            payload.query, temperature=payload.temperature
+        )
+    return StreamingResponse(
+        _to_sse(events, session),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,15 +1,20 @@
 import json
 from pathlib import Path
+from typing import Optional
 
 import aiofiles
 from fastapi import APIRouter
 from pydantic import BaseModel  # 数据校验
 
+from agent.tool import basic_tool
+
 
 class ConfigPayload(BaseModel):
     base_url: str
     model_name: str
     api_key: str
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
 
 
 router = APIRouter(prefix="/api", tags=["config"])
@@ -22,9 +27,11 @@ async def update_config(payload: ConfigPayload):
     """接收前端传来的配置并写入 backend/config.json。"""
     CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-    serialized = json.dumps(payload.model_dump(), indent=2, ensure_ascii=False)
+    serialized = json.dumps(payload.model_dump(exclude_none=True), indent=2, ensure_ascii=False)
     async with aiofiles.open(CONFIG_PATH, "w", encoding="utf-8") as f:
         await f.write(serialized)
+    # 通知配置服务，下一次模型调用前重新加载
+    basic_tool.config_service.invalidate()
 
     return {"success": True}
 
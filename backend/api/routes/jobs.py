@@ -0,0 +1,56 @@
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from ..jobs import job_manager
+
+
+class JobPayload(BaseModel):
+    agent_type: str  # nmap / info_agent
+    target: str
+    mode: Optional[str] = None  # nmap 任务的扫描模式
+    query: Optional[str] = None  # info_agent 任务的自定义指令
+    top_ports: Optional[int] = None
+    extra_args: Optional[List[str]] = None
+    refresh: Optional[bool] = None
+    engine: Optional[str] = None  # nmap 任务的扫描引擎：auto/nmap/connect
+
+
+router = APIRouter(prefix="/api", tags=["jobs"])
+
+
+@router.post("/jobs")
+async def submit_job(payload: JobPayload):
+    """提交侦察任务，立即返回任务 ID，任务在后台工作池中执行。"""
+    params: Dict[str, Any] = payload.model_dump(
+        exclude={"agent_type", "target"}, exclude_none=True
+    )
+    try:
+        job = job_manager.submit(payload.agent_type, payload.target, params)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"success": True, "job_id": job.id}
+
+
+@router.get("/jobs")
+async def list_jobs():
+    """列出任务及进度（不含结果正文），供 ProgressPanel 轮询。"""
+    return {"jobs": [job.to_dict(with_result=False) for job in job_manager.list_jobs()]}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job.to_dict()
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """取消排队中或运行中的任务。"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {"success": True, "status": job.status}
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from agent import telemetry
+
+
+router = APIRouter(tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """以 Prometheus 文本格式导出模型请求、工具调用与 nmap 扫描的耗时直方图和 token 用量。"""
+    return PlainTextResponse(telemetry.registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
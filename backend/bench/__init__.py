@@ -0,0 +1 @@
+"""离线基准测试工具：模拟模型服务、模拟 nmap 与基准运行入口"""
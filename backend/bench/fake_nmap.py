@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+模拟 nmap：按参数输出固定格式的 XML，供基准测试在无网络环境下驱动 NmapTool。
+
+通过环境变量控制输出规模与耗时：
+    FAKE_NMAP_HOSTS      每次扫描输出的主机数（默认 4）
+    FAKE_NMAP_PORTS      每台主机的开放端口数（默认 20，传入 -p 时以其端口为准）
+    FAKE_NMAP_DURATION   模拟扫描总耗时（秒，默认 0.2），期间按 --stats-every 输出进度
+"""
+
+import os
+import sys
+import time
+
+
+def _port_list(args: list) -> list:
+    if "-p" in args:
+        spec = args[args.index("-p") + 1]
+        ports = []
+        for part in spec.split(","):
+            if "-" in part:
+                start, end = part.split("-", 1)
+                ports.extend(range(int(start or 1), int(end or 65535) + 1))
+            elif part:
+                ports.append(int(part))
+        return ports
+    count = int(os.environ.get("FAKE_NMAP_PORTS", "20"))
+    return [1000 + idx for idx in range(count)]
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    hosts = int(os.environ.get("FAKE_NMAP_HOSTS", "4"))
+    duration = float(os.environ.get("FAKE_NMAP_DURATION", "0.2"))
+    ports = [] if "-sn" in args else _port_list(args)
+    with_version = "-sV" in args
+    out = sys.stdout
+
+    out.write('<?xml version="1.0"?>\n<nmaprun scanner="nmap" args="%s">\n' % " ".join(args))
+    steps = 4
+    for step in range(1, steps + 1):
+        time.sleep(duration / (steps + 1))
+        out.write(
+            '<taskprogress task="SYN Stealth Scan" time="%d" percent="%.2f" remaining="%d" etc="%d"/>\n'
+            % (time.time(), step * 100 / (steps + 1), duration, time.time() + duration)
+        )
+        out.flush()
+
+    for idx in range(hosts):
+        out.write(
+            '<host><status state="up"/><address addr="10.%d.%d.%d" addrtype="ipv4"/>'
+            '<hostnames><hostname name="host%d.bench.local"/></hostnames><ports>'
+            % ((idx >> 16) & 255, (idx >> 8) & 255, idx & 255, idx)
+        )
+        for port in ports:
+            service = '<service name="svc%d"%s/>' % (
+                port % 7,
+                ' product="bench" version="%d.%d"' % (port % 3, port % 10) if with_version else "",
+            )
+            out.write(
+                '<port protocol="tcp" portid="%d"><state state="open"/>%s</port>' % (port, service)
+            )
+        out.write("</ports></host>\n")
+    out.write('<runstats><finished time="%d"/></runstats>\n</nmaprun>\n' % time.time())
+    time.sleep(duration / (steps + 1))
+    out.flush()
+
+
+if __name__ == "__main__":
+    main()
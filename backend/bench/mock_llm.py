@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+"""OpenAI 兼容的本地模拟模型服务：按脚本返回工具调用，可配置首包延迟与逐 token 延迟"""
+
+
+@dataclass
+class ScriptedCall:
+    """脚本中的一次工具调用。"""
+
+    name: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class MockLLMScript:
+    """
+    每轮用户提问的应答脚本：steps[k] 为第 k 次模型调用要发起的（并发）工具调用，
+    脚本走完或请求不带 tools 时返回文本回复（摘要请求同样走文本分支）。
+    """
+
+    steps: List[List[ScriptedCall]] = field(default_factory=list)
+    final_text: str = "扫描完成：已汇总存活主机与开放端口。"
+    summary_text: str = "目标已完成主机发现与端口扫描，关键服务已记录。"
+    latency: float = 0.05  # 首包延迟（秒）
+    token_delay: float = 0.0  # 流式输出时每个分片之间的延迟（秒）
+    chunk_chars: int = 8  # 流式输出时每个分片的字符数
+
+
+class MockLLMServer:
+    """在后台线程中运行的模拟服务，以 with 使用，base_url 指向 /v1。"""
+
+    def __init__(self, script: MockLLMScript, *, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.script = script
+        self._host = host
+        self._port = port or _free_port(host)
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self.requests = 0
+        self.summary_requests = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self._host}:{self._port}/v1"
+
+    def __enter__(self) -> "MockLLMServer":
+        # loop="asyncio" 避免 uvicorn 全局切换事件循环策略，影响被测代码所在的循环
+        config = uvicorn.Config(
+            self._build_app(),
+            host=self._host,
+            port=self._port,
+            loop="asyncio",
+            log_level="warning",
+        )
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("模拟模型服务启动失败")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request) -> Any:
+            body = await request.json()
+            self.requests += 1
+            await asyncio.sleep(self.script.latency)
+            calls = self._next_calls(body)
+            if calls is None and not body.get("tools"):
+                self.summary_requests += 1
+            if calls:
+                content = ""
+            elif body.get("tools"):
+                content = self.script.final_text
+            else:
+                content = self.script.summary_text
+            if body.get("stream"):
+                return StreamingResponse(
+                    self._stream(body, content, calls), media_type="text/event-stream"
+                )
+            return JSONResponse(self._completion(body, content, calls))
+
+        return app
+
+    def _next_calls(self, body: Dict[str, Any]) -> Optional[List[ScriptedCall]]:
+        """按本轮已完成的工具调用数定位脚本位置，带 tools 的请求才会返回工具调用。"""
+        if not body.get("tools"):
+            return None
+        messages: Sequence[Dict[str, Any]] = body.get("messages") or []
+        last_user = max(
+            (idx for idx, m in enumerate(messages) if m.get("role") == "user"), default=0
+        )
+        tool_names = {tool["function"]["name"] for tool in body["tools"]}
+        # 每次工具调用在历史中对应 tool_call 与 tool_result 两条同名 assistant 消息
+        done = sum(
+            1
+            for m in messages[last_user + 1 :]
+            if m.get("role") == "assistant" and m.get("name") in tool_names
+        ) // 2
+        for step in self.script.steps:
+            if done <= 0:
+                return step or None
+            done -= len(step)
+        return None
+
+    @staticmethod
+    def _usage(body: Dict[str, Any], content: str) -> Dict[str, int]:
+        prompt = sum(len(str(m.get("content") or "")) for m in body.get("messages") or []) // 4
+        completion = max(1, len(content) // 4)
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+        }
+
+    @staticmethod
+    def _tool_calls(calls: List[ScriptedCall]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {
+                    "name": call.name,
+                    "arguments": json.dumps(call.arguments, ensure_ascii=False),
+                },
+            }
+            for call in calls
+        ]
+
+    def _completion(
+        self, body: Dict[str, Any], content: str, calls: Optional[List[ScriptedCall]]
+    ) -> Dict[str, Any]:
+        message: Dict[str, Any] = {"role": "assistant", "content": content or None}
+        if calls:
+            message["tool_calls"] = self._tool_calls(calls)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if calls else "stop",
+                }
+            ],
+            "usage": self._usage(body, content),
+        }
+
+    async def _stream(
+        self, body: Dict[str, Any], content: str, calls: Optional[List[ScriptedCall]]
+    ) -> AsyncIterator[str]:
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+        }
+
+        def chunk(delta: Dict[str, Any], finish: Optional[str] = None) -> str:
+            data = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        step = max(1, self.script.chunk_chars)
+        for start in range(0, len(content), step):
+            if self.script.token_delay:
+                await asyncio.sleep(self.script.token_delay)
+            yield chunk({"content": content[start : start + step]})
+        for index, call in enumerate(self._tool_calls(calls or [])):
+            yield chunk({"tool_calls": [{"index": index, **call}]})
+        yield chunk({}, "tool_calls" if calls else "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            # 与 OpenAI 一致：最后一个分片 choices 为空，只带 usage
+            usage = {**base, "choices": [], "usage": self._usage(body, content)}
+            yield f"data: {json.dumps(usage, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+
+
+def _free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
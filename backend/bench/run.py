@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+# 确保可以在任意目录执行此脚本
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from agent.agent_tool_list import FetchResultTool, ToolResult, Tools  # noqa: E402
+from agent.agent_tool_list.nmap import NmapTool  # noqa: E402
+from agent.tool import basic_tool  # noqa: E402
+from agent.tool.agent_talk import AgentTalker  # noqa: E402
+from bench.mock_llm import MockLLMScript, MockLLMServer, ScriptedCall  # noqa: E402
+
+"""
+离线基准测试：本地模拟模型服务 + 模拟 nmap，测量 run_tool_chat/stream_tool_chat 的
+单轮耗时、工具耗时、历史压缩耗时、内存峰值与事件循环延迟，不访问真实模型与网络。
+
+用法（在 backend 目录下）：
+    python -m bench.run --turns 20 --hosts 16 --ports 200 --stream
+"""
+
+
+FAKE_NMAP = Path(__file__).resolve().parent / "fake_nmap.py"
+BENCH_TARGET = "192.0.2.10"  # RFC 5737 文档地址：IP 字面量不会触发真实 DNS 查询
+LAG_PROBE_INTERVAL = 0.01  # 事件循环延迟探针的睡眠间隔（秒）
+
+
+class TimedNmapTool(NmapTool):
+    """记录每次 run 耗时的 NmapTool。"""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.durations: List[float] = []
+
+    async def run(self, **kwargs: Any) -> ToolResult:
+        started = time.perf_counter()
+        try:
+            return await super().run(**kwargs)
+        finally:
+            self.durations.append(time.perf_counter() - started)
+
+
+class LoopLagProbe:
+    """周期性睡眠固定间隔，实际唤醒时间超出的部分即事件循环被阻塞的时长。"""
+
+    def __init__(self, interval: float = LAG_PROBE_INTERVAL) -> None:
+        self._interval = interval
+        self._task: Optional[asyncio.Task[None]] = None
+        self.samples: List[float] = []
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._probe())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _probe(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self._interval)
+            self.samples.append(max(0.0, loop.time() - started - self._interval))
+
+
+def build_script(args: argparse.Namespace) -> MockLLMScript:
+    """每轮：先并发做主机发现与快速扫描，再做服务版本探测，最后给出文本结论。"""
+    return MockLLMScript(
+        steps=[
+            [
+                ScriptedCall("nmap", {"target": BENCH_TARGET, "mode": "host_discovery"}),
+                ScriptedCall("nmap", {"target": BENCH_TARGET, "mode": "fast_scan"}),
+            ],
+            [
+                ScriptedCall(
+                    "nmap",
+                    {
+                        "target": BENCH_TARGET,
+                        "mode": "service_version",
+                        "only_new_ports": False,
+                    },
+                )
+            ],
+        ],
+        latency=args.latency,
+        token_delay=args.token_delay,
+    )
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, Any]:
+    """返回样本数与 p50/p95/max/mean（毫秒）。"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+    }
+
+
+async def run_bench(args: argparse.Namespace, base_url: str) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="agent-bench-") as tmp:
+        config_path = Path(tmp) / "config.json"
+        config_path.write_text(
+            json.dumps(
+                {"base_url": base_url, "model_name": "mock-model", "api_key": "sk-bench"}
+            ),
+            encoding="utf-8",
+        )
+        basic_tool.config_service = basic_tool.ConfigService(path=config_path)
+
+        nmap_tool = TimedNmapTool(
+            nmap_path=str(FAKE_NMAP), enable_cache=False, stats_every=1.0, engine="nmap"
+        )
+        tools = Tools(nmap_tool, FetchResultTool())
+        talker = AgentTalker(
+            "agent_bench",
+            "你是一名信息收集 Agent，负责对授权目标进行资产与端口探测。",
+            context_budget=args.context_budget,
+        )
+
+        # 包装实例上的摘要方法以统计压缩耗时（在后台任务中执行）
+        compaction: List[float] = []
+        summarize_messages = talker._summarize_messages
+
+        async def timed_summarize(*a: Any, **kw: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return await summarize_messages(*a, **kw)
+            finally:
+                compaction.append(time.perf_counter() - started)
+
+        talker._summarize_messages = timed_summarize  # type: ignore[method-assign]
+
+        probe = LoopLagProbe()
+        probe.start()
+        turns: List[float] = []
+        first_delta: List[float] = []
+        started_all = time.perf_counter()
+        for turn in range(args.turns):
+            query = f"第 {turn + 1} 轮：请对 {BENCH_TARGET} 做资产探测并汇总开放端口。"
+            started = time.perf_counter()
+            if args.stream:
+                seen_delta = False
+                async for event in talker.stream_tool_chat(
+                    query, tools_list=[tools], max_tool_iterations=4
+                ):
+                    if event["type"] == "delta" and event["content"] and not seen_delta:
+                        seen_delta = True
+                        first_delta.append(time.perf_counter() - started)
+            else:
+                await talker.run_tool_chat(query, tools_list=[tools], max_tool_iterations=4)
+            turns.append(time.perf_counter() - started)
+        await talker.wait_compaction()
+        total = time.perf_counter() - started_all
+        await probe.stop()
+
+    report: Dict[str, Any] = {
+        "turns": summarize(turns),
+        "tool_calls": summarize(nmap_tool.durations),
+        "compaction": summarize(compaction),
+        "event_loop_lag": summarize(probe.samples),
+        "wall_time_s": round(total, 3),
+    }
+    if args.stream:
+        report["first_delta"] = summarize(first_delta)
+    return report
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="AgentSrc 离线基准测试")
+    parser.add_argument("--turns", type=int, default=10, help="用户提问轮数")
+    parser.add_argument("--hosts", type=int, default=8, help="模拟 nmap 每次输出的主机数")
+    parser.add_argument("--ports", type=int, default=50, help="模拟 nmap 每台主机的开放端口数")
+    parser.add_argument("--nmap-duration", type=float, default=0.2, help="模拟 nmap 单次耗时（秒）")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟模型首包延迟（秒）")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="流式分片间延迟（秒）")
+    parser.add_argument("--context-budget", type=int, default=4000, help="上下文 token 预算，较小时更频繁触发压缩")
+    parser.add_argument("--stream", action="store_true", help="使用 stream_tool_chat")
+    parser.add_argument("--trace-memory", action="store_true", help="用 tracemalloc 统计 Python 内存峰值（会拖慢运行）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出报告")
+    args = parser.parse_args(argv)
+
+    os.environ["FAKE_NMAP_HOSTS"] = str(args.hosts)
+    os.environ["FAKE_NMAP_PORTS"] = str(args.ports)
+    os.environ["FAKE_NMAP_DURATION"] = str(args.nmap_duration)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    with MockLLMServer(build_script(args)) as server:
+        report = asyncio.run(run_bench(args, server.base_url))
+        report["model_requests"] = server.requests
+        report["summary_requests"] = server.summary_requests
+    if args.trace_memory:
+        report["tracemalloc_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    # Linux 上 ru_maxrss 单位为 KB，包含模拟服务线程；子进程的 RUSAGE_CHILDREN 会计入 fork 时的父进程内存，不作参考
+    report["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    for key, value in report.items():
+        if isinstance(value, dict):
+            stats = "  ".join(f"{k}={v}" for k, v in value.items())
+            print(f"{key:<16} {stats}")
+        else:
+            print(f"{key:<16} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from agent.agent_tool_list import Tools
+from agent.agent_tool_list.base import BaseTool, ToolResult
+from agent.tool.agent_talk import AgentTalker
+
+
+class _EchoTool(BaseTool):
+    name = "echo"
+    description = "原样返回 text"
+    parameters = {"type": "object", "properties": {"text": {"type": "string"}}}
+
+    async def run(self, text: str) -> ToolResult:
+        await asyncio.sleep(0.01)
+        return ToolResult(name=self.name, content=text)
+
+
+def test_tool_exception_does_not_abort_batch():
+    """参数不合法导致的 TypeError 只作为该调用的错误结果，同批其他调用的结果照常写入历史。"""
+    talker = AgentTalker("agent_test", "sys")
+    tools = Tools()
+    tools.register(_EchoTool())
+    calls: list[dict[str, Any]] = [
+        {"tool_call_id": "1", "tool_name": "echo", "arguments": {"wrong": 1}},
+        {"tool_call_id": "2", "tool_name": "echo", "arguments": {"text": "hello"}},
+    ]
+
+    async def run() -> list[dict[str, Any]]:
+        return [event async for event in talker._stream_tool_calls(calls, tools)]
+
+    events = asyncio.run(run())
+    results = {
+        event["tool_call_id"]: event["content"]
+        for event in events
+        if event["type"] == "tool_result"
+    }
+    assert "TypeError" in results["1"]
+    assert results["2"] == "hello"
+
+    history = asyncio.run(talker._chat_history.get_messages())
+    assert [message.role for message in history[1:]] == [
+        "tool_call",
+        "tool_result",
+        "tool_call",
+        "tool_result",
+    ]
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import asyncio
+
+from agent.tool import client_pool
+
+
+def test_shared_client_closes_only_after_last_release():
+    """共享客户端按引用计数关闭：仍有 AgentTalker 或在途请求持有时不关闭，最后一个引用释放后关闭并移除。"""
+
+    async def run() -> None:
+        key = ("http://mock/v1", "sk-test")
+        first = client_pool.acquire_client(*key)
+        second = client_pool.acquire_client(*key)
+        assert first is second
+        assert client_pool.retain_client(*key)  # 在途请求
+
+        await client_pool.release_client(*key)
+        await client_pool.release_client(*key)
+        assert not first.is_closed()
+
+        await client_pool.release_client(*key)
+        assert first.is_closed()
+        assert not client_pool.retain_client(*key)
+        assert client_pool.acquire_client(*key) is not first
+        await client_pool.aclose_all()
+
+    asyncio.run(run())
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from agent.agent_tool_list.nmap.inventory import HostInventory
+from agent.agent_tool_list.nmap.result import HostRecord, PortRecord, ScanResult
+
+
+def _result(mode: str, ports: dict[int, str], *, target: str = "example.test") -> ScanResult:
+    return ScanResult(
+        mode=mode,
+        targets=[target],
+        hosts=[
+            HostRecord(
+                ip="192.0.2.10",
+                alive=True,
+                hostnames=["www.example.test"],
+                ports=[PortRecord(port=port, state=state) for port, state in ports.items()],
+            )
+        ],
+    )
+
+
+def test_merge_reports_new_hosts_and_port_changes():
+    """merge 返回新主机、新开放端口与关闭的端口；重复合并同样结果不产生变化。"""
+    inventory = HostInventory()
+    delta = inventory.merge(_result("fast_scan", {22: "open", 80: "open"}), now=1.0)
+    assert delta.new_hosts == ["192.0.2.10"]
+    assert delta.opened == {"192.0.2.10": [22, 80]}
+    assert delta.closed == {}
+
+    assert inventory.merge(_result("fast_scan", {22: "open", 80: "open"}), now=2.0).empty
+
+    delta = inventory.merge(_result("fast_scan", {80: "closed", 443: "open"}), now=3.0)
+    assert delta.new_hosts == []
+    assert delta.opened == {"192.0.2.10": [443]}
+    assert delta.closed == {"192.0.2.10": [80]}
+
+    host = inventory.get("192.0.2.10")
+    assert host is not None
+    assert host.open_ports() == [22, 443]
+    assert host.first_seen == 1.0 and host.last_seen == 3.0
+
+
+def test_ports_without_tracks_which_ports_a_mode_has_probed():
+    """ports_without：无端口信息时为 None，之后返回未被该模式探测的开放端口，探测后为空。"""
+    inventory = HostInventory()
+    assert inventory.ports_without("example.test", "service_version") is None
+
+    inventory.merge(_result("fast_scan", {22: "open", 80: "open", 443: "closed"}))
+    assert inventory.ports_without("example.test", "service_version") == [22, 80]
+    # 按 IP、主机名查询命中同一主机
+    assert inventory.ports_without("192.0.2.10", "service_version") == [22, 80]
+    assert inventory.ports_without("WWW.example.test", "service_version") == [22, 80]
+
+    inventory.merge(_result("service_version", {22: "open"}, target="192.0.2.10"))
+    assert inventory.ports_without("example.test", "service_version") == [80]
+    assert inventory.known_ports("example.test", "service_version") == {"192.0.2.10": [22]}
+
+    inventory.merge(_result("service_version", {80: "open"}))
+    assert inventory.ports_without("example.test", "service_version") == []
+
+
+def test_inventory_round_trips_through_dict():
+    """to_dict/from_dict 往返后目标与主机名索引仍可用。"""
+    inventory = HostInventory()
+    inventory.merge(_result("fast_scan", {22: "open"}))
+    restored = HostInventory.from_dict(inventory.to_dict())
+    assert restored.to_dict() == inventory.to_dict()
+    assert [host.ip for host in restored.hosts_for("www.example.test")] == ["192.0.2.10"]
+    assert restored.ports_without("example.test", "fast_scan") == []
+    assert restored.to_scan_result("example.test").open_ports("192.0.2.10") == [22]
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from agent.agent_tool_list.nmap.parser import NmapStreamParser
+from agent.agent_tool_list.nmap.result import ScanResult
+
+_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<nmaprun scanner="nmap" args="nmap -sV 192.0.2.10">
+<taskprogress task="Service scan" time="1" percent="50.00" remaining="3" etc="4"/>
+<host><status state="up" reason="syn-ack"/>
+<address addr="192.0.2.10" addrtype="ipv4"/>
+<hostnames><hostname name="www.example.test" type="PTR"/></hostnames>
+<ports>
+<port protocol="tcp" portid="22"><state state="open"/><service name="ssh" product="OpenSSH" version="9.6"/></port>
+<port protocol="tcp" portid="80"><state state="open"/><service name="http" product="nginx"/></port>
+<port protocol="tcp" portid="443"><state state="closed"/></port>
+</ports>
+</host>
+<host><status state="down" reason="no-response"/>
+<address addr="192.0.2.11" addrtype="ipv4"/>
+</host>
+<runstats><finished time="5"/></runstats>
+</nmaprun>
+"""
+
+
+def _parse(chunk_size: int) -> tuple[NmapStreamParser, ScanResult]:
+    parser = NmapStreamParser()
+    result = ScanResult(mode="service_version", targets=["192.0.2.10"])
+    for offset in range(0, len(_XML), chunk_size):
+        for host in parser.feed(_XML[offset : offset + chunk_size]):
+            result.add_host(host)
+    for host in parser.close():
+        result.add_host(host)
+    return parser, result
+
+
+def test_stream_parser_builds_scan_result_from_small_chunks():
+    """按很小的分片喂入时结果与一次性喂入一致，端口、服务版本与主机状态都被保留。"""
+    parser, result = _parse(7)
+    assert not parser.broken
+    assert [host.ip for host in result] == ["192.0.2.10", "192.0.2.11"]
+    assert [host.ip for host in result.alive_hosts()] == ["192.0.2.10"]
+    assert result.open_ports("192.0.2.10") == [22, 80]
+
+    host = result.get("192.0.2.10")
+    assert host is not None
+    assert host.hostnames == ["www.example.test"]
+    assert host.ports[0].service == "ssh"
+    assert host.ports[0].version == "OpenSSH 9.6"
+    assert host.ports[2].state == "closed"
+
+    assert _parse(len(_XML))[1].to_dict() == result.to_dict()
+    progress = parser.pop_progress()
+    assert progress and progress[0]["percent"] == 50.0
+    assert parser.pop_progress() == []
+
+
+def test_scan_result_round_trips_through_dict():
+    """to_dict/from_dict 往返后内容不变，索引也随之重建。"""
+    _, result = _parse(64)
+    restored = ScanResult.from_dict(result.to_dict())
+    assert restored.to_dict() == result.to_dict()
+    assert restored.open_ports("192.0.2.10") == [22, 80]
+    assert "192.0.2.11" in restored
+
+
+def test_stream_parser_marks_malformed_output_as_broken():
+    """XML 格式错误后标记为 broken，已闭合的主机仍然返回，之后的数据被忽略。"""
+    parser = NmapStreamParser()
+    head, _, _ = _XML.partition(b"<host><status state=\"down\"")
+    hosts = parser.feed(head)
+    assert [host.ip for host in hosts] == ["192.0.2.10"]
+    assert parser.feed(b"<host></ports>") == []
+    assert parser.broken
+    assert parser.feed(b"<host/>") == []
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import httpx
+import openai
+
+from agent.tool.rate_limit import (
+    RateLimiter,
+    _Bucket,
+    parse_duration,
+    retry_after_seconds,
+)
+
+
+def _status_error(status: int, headers: dict[str, str] | None = None) -> openai.APIStatusError:
+    response = httpx.Response(
+        status, request=httpx.Request("POST", "http://mock/v1"), headers=headers or {}
+    )
+    if status == 429:
+        return openai.RateLimitError("rate limited", response=response, body=None)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+def test_bucket_refills_per_minute_and_caps_at_limit():
+    """令牌桶按每分钟配额匀速补充，不会超过上限；wait_time 按缺口折算等待秒数。"""
+    bucket = _Bucket(60)
+    start = bucket._updated
+    bucket.take(60)
+    assert bucket.level == 0
+    assert bucket.wait_time(30) == 30.0
+
+    bucket.refill(start + 10)
+    assert bucket.level == 10
+    assert bucket.wait_time(10) == 0.0
+
+    bucket.refill(start + 600)
+    assert bucket.level == 60
+    # 超过容量的单次请求只需等到桶满
+    bucket.take(60)
+    assert bucket.wait_time(1000) == 60.0
+
+
+def test_unlimited_bucket_never_waits():
+    """limit 为 None 时不限制。"""
+    bucket = _Bucket(None)
+    bucket.take(10_000)
+    assert bucket.wait_time(10_000) == 0.0
+
+
+def test_acquire_and_settle_adjust_token_level():
+    """acquire 预扣请求数与令牌数，settle 按实际用量多退少补。"""
+    limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=6000)
+    asyncio.run(limiter.acquire(1000))
+    assert 8.9 < limiter._requests.level < 9.1
+    assert 4999 < limiter._tokens.level < 5010
+
+    limiter.settle(1000, 400)
+    assert 5599 < limiter._tokens.level < 5610
+    limiter.settle(1000, None)
+    assert limiter._tokens.level < 5610
+
+
+def test_acquire_waits_for_request_quota():
+    """请求数配额耗尽时 acquire 会等待补充而不是直接放行。"""
+    limiter = RateLimiter(requests_per_minute=600)
+    limiter._requests.level = 0
+
+    async def run() -> float:
+        started = time.monotonic()
+        await limiter.acquire(0)
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_retry_delay_on_429_pauses_and_honours_retry_after():
+    """429 的退避不短于 retry-after，并让所有调用方一起暂停。"""
+    limiter = RateLimiter()
+    delay = limiter._retry_delay(_status_error(429, {"retry-after": "2"}), 0, 3)
+    assert delay is not None and delay >= 2
+    assert limiter._paused_until >= time.monotonic() + 1.5
+
+
+def test_retry_delay_gives_up_on_non_retryable_or_exhausted():
+    """不可重试的状态码与重试次数用尽时返回 None。"""
+    limiter = RateLimiter()
+    assert limiter._retry_delay(_status_error(400), 0, 3) is None
+    assert limiter._retry_delay(_status_error(503), 3, 3) is None
+    assert limiter._retry_delay(ValueError("boom"), 0, 3) is None
+    delay = limiter._retry_delay(_status_error(503), 1, 3)
+    assert delay is not None and 0 <= delay <= 1.0
+
+
+def test_retry_delay_learns_limits_from_headers():
+    """错误响应里的 x-ratelimit-* 头同样用于校准配额。"""
+    limiter = RateLimiter()
+    limiter._retry_delay(
+        _status_error(
+            429,
+            {
+                "x-ratelimit-limit-tokens": "1000",
+                "x-ratelimit-remaining-tokens": "100",
+                "retry-after-ms": "10",
+            },
+        ),
+        0,
+        3,
+    )
+    assert limiter.limits["tokens_per_minute"] == 1000
+    assert limiter._tokens.level <= 101
+
+
+def test_lease_retries_and_holds_slot_until_exit():
+    """lease 在可重试错误后重新发起请求，并发名额一直占用到退出 async with。"""
+    limiter = RateLimiter(max_concurrency=1)
+    attempts = []
+
+    async def send() -> str:
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise _status_error(503, {"retry-after-ms": "1"})
+        return "ok"
+
+    async def run() -> None:
+        async with limiter.lease(send, tokens=10) as lease:
+            assert lease.result == "ok"
+            assert limiter._slots.locked()
+        assert not limiter._slots.locked()
+
+    asyncio.run(run())
+    assert len(attempts) == 2
+
+
+def test_parse_duration_and_retry_after():
+    """时长与 retry-after 响应头解析，retry-after-ms 优先。"""
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("20ms") == 0.02
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration("soon") is None
+    assert retry_after_seconds({"retry-after-ms": "250", "retry-after": "9"}) == 0.25
+    assert retry_after_seconds({"retry-after": "3"}) == 3
+    assert retry_after_seconds(None) is None
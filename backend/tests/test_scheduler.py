@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import asyncio
+
+from agent.agent_tool_list import ToolError
+from agent.agent_tool_list.nmap.result import ScanResult
+from agent.agent_tool_list.nmap.scheduler import ScanScheduler
+
+
+async def _collect(scheduler: ScanScheduler, targets, scan):
+    return [outcome async for outcome in scheduler.iter_scan(targets, scan)]
+
+
+def test_iter_scan_reports_unexpected_exceptions():
+    """扫描函数抛出非 ToolError 的异常时，iter_scan 仍为每个目标产出结果而不是挂起。"""
+
+    async def scan(target: str) -> ScanResult:
+        if target == "bad":
+            raise ValueError("boom")
+        if target == "tool":
+            raise ToolError("nmap 失败")
+        return ScanResult(mode="fast_scan", targets=[target])
+
+    outcomes = asyncio.run(
+        asyncio.wait_for(_collect(ScanScheduler(), ["ok", "bad", "tool"], scan), 5)
+    )
+    by_target = {outcome.target: outcome for outcome in outcomes}
+    assert by_target["ok"].ok
+    assert by_target["bad"].error == "ValueError: boom"
+    assert by_target["tool"].error == "nmap 失败"
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from agent.memory.session_store import SUMMARY_NAME_SUFFIX, SessionStore
+from agent.tool.agent_talk import ChatHistory, ChatMessage
+
+
+def _live_rows(path: Path, session_id: str) -> list[tuple[int, str, str]]:
+    """存储中未删除的消息 (seq, role, content)，按位置排序。"""
+    with closing(sqlite3.connect(path)) as conn:
+        return conn.execute(
+            "SELECT seq, role, content FROM messages"
+            " WHERE session_id = ? AND deleted = 0 ORDER BY pos",
+            (session_id,),
+        ).fetchall()
+
+
+def _contents(history: ChatHistory) -> list[str]:
+    return [message.content for message in asyncio.run(history.get_messages())]
+
+
+def _history(store: SessionStore, **kwargs) -> ChatHistory:
+    return ChatHistory(agent_name="agent_test", system_prompt="sys", store=store, **kwargs)
+
+
+def test_append_and_resume(tmp_path: Path):
+    """追加的消息逐条持久化，同一 session_id 重新打开时按顺序恢复，之后的追加接在末尾。"""
+    path = tmp_path / "sessions.db"
+    store = SessionStore(path)
+    try:
+        history = _history(store, session_id="s1")
+        asyncio.run(history.add_user_msg("hello"))
+        asyncio.run(history.add_agent_msg("agent_test", "hi"))
+        asyncio.run(history.add_tool_result_msg("result", metadata={"handle": "h1"}))
+
+        resumed = _history(store, session_id="s1")
+        assert _contents(resumed) == ["sys", "hello", "hi", "result"]
+        assert asyncio.run(resumed.get_messages())[-1].metadata == {"handle": "h1"}
+
+        asyncio.run(resumed.add_user_msg("again"))
+        store.flush()
+        assert [row[2] for row in _live_rows(path, "s1")] == [
+            "sys",
+            "hello",
+            "hi",
+            "result",
+            "again",
+        ]
+    finally:
+        store.close()
+
+
+def test_compaction_syncs_only_changes(tmp_path: Path):
+    """压缩把区间替换为摘要后，被替换的消息标记删除、摘要写入原位置，未变化的行保持原样。"""
+    path = tmp_path / "sessions.db"
+    store = SessionStore(path)
+    try:
+        history = _history(store, session_id="s1")
+        for index in range(4):
+            asyncio.run(history.add_user_msg(f"m{index}"))
+        store.flush()
+        before = {row[2]: row[0] for row in _live_rows(path, "s1")}
+
+        summary = ChatMessage(
+            role="agent", content="summary", name=f"agent_test{SUMMARY_NAME_SUFFIX}"
+        )
+        assert asyncio.run(
+            history.replace_range(1, 3, [summary], expected_version=history.version)
+        )
+        store.flush()
+        rows = _live_rows(path, "s1")
+        assert [row[2] for row in rows] == ["sys", "summary", "m2", "m3"]
+        # 未变化的消息沿用原序号
+        assert {row[2]: row[0] for row in rows if row[2] != "summary"} == {
+            key: before[key] for key in ("sys", "m2", "m3")
+        }
+
+        resumed = _history(store, session_id="s1")
+        assert _contents(resumed) == ["sys", "summary", "m2", "m3"]
+    finally:
+        store.close()
+
+
+def test_resume_tail_keeps_unloaded_rows(tmp_path: Path):
+    """只加载尾部消息时，对已加载部分的改写不会删除或改动未加载的更早消息。"""
+    path = tmp_path / "sessions.db"
+    store = SessionStore(path)
+    try:
+        history = _history(store, session_id="s1")
+        for index in range(5):
+            asyncio.run(history.add_user_msg(f"m{index}"))
+
+        resumed = _history(store, session_id="s1", resume_tail=2)
+        assert _contents(resumed) == ["sys", "m3", "m4"]
+        asyncio.run(resumed.delete_user_msgs())
+        asyncio.run(resumed.add_user_msg("m5"))
+        store.flush()
+        assert [row[2] for row in _live_rows(path, "s1")] == [
+            "sys",
+            "m0",
+            "m1",
+            "m2",
+            "m5",
+        ]
+    finally:
+        store.close()
+
+
+def test_changed_system_prompt_retires_old_system(tmp_path: Path):
+    """恢复时 system_prompt 变化：以入参为准写入新 system，旧 system 标记删除。"""
+    path = tmp_path / "sessions.db"
+    store = SessionStore(path)
+    try:
+        history = _history(store, session_id="s1")
+        asyncio.run(history.add_user_msg("hello"))
+
+        resumed = ChatHistory(
+            agent_name="agent_test", system_prompt="sys v2", store=store, session_id="s1"
+        )
+        assert _contents(resumed) == ["sys v2", "hello"]
+        store.flush()
+        assert [row[2] for row in _live_rows(path, "s1")] == ["sys v2", "hello"]
+    finally:
+        store.close()